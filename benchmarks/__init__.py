@@ -0,0 +1,116 @@
+"""
+Бенчмарки проекта YaNote.
+
+Каждый бенчмарк запускается как модуль: ``python -m benchmarks.<имя>``
+и работает на отдельной временной базе SQLite, не затрагивая db.sqlite3.
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def set_database_names(databases, db_name):
+    """База default и её зеркала — в db_name, остальные базы — рядом."""
+    stem, suffix = os.path.splitext(db_name)
+    for alias, database in databases.items():
+        mirror = database.get('TEST', {}).get('MIRROR')
+        database['NAME'] = (
+            db_name if alias == 'default' or mirror
+            else f'{stem}-{alias}{suffix}'
+        )
+
+
+def setup_django(db_name=None,
+                 settings_module='yanote.settings_production',
+                 options=None, configure=None):
+    """
+    Настраивает Django на временную базу и применяет миграции.
+
+    Ограничение частоты изменений выключено: бенчмарки сами создают
+    нагрузку. configure(settings) вызывается до django.setup(), чтобы
+    бенчмарк мог поменять настройки. Миграции применяются к каждому
+    шарду из NOTES_SHARDS.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if db_name is None:
+        directory = tempfile.mkdtemp(prefix='yanote-bench-')
+        db_name = os.path.join(directory, 'bench.sqlite3')
+    settings.NOTES_RATE_LIMITS = {}
+    if configure is not None:
+        configure(settings)
+    set_database_names(settings.DATABASES, db_name)
+    if options:
+        for database in settings.DATABASES.values():
+            database.setdefault('OPTIONS', {}).update(options)
+    django.setup()
+    for alias in settings.NOTES_SHARDS:
+        call_command('migrate', database=alias, verbosity=0)
+    return db_name
+
+
+def percentile(samples, fraction):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Сводка по замерам в миллисекундах."""
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+
+def timed(func, repeat):
+    """Вызывает func repeat раз и возвращает длительности вызовов."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class TimedClient:
+    """Обёртка над тестовым клиентом, замеряющая время каждого ответа."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def get(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = self.client.get(*args, **kwargs)
+        response.elapsed = time.perf_counter() - started
+        return response
+
+    def post(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = self.client.post(*args, **kwargs)
+        response.elapsed = time.perf_counter() - started
+        return response
+
+
+def report(name, results):
+    """Печатает результаты в JSON, чтобы их можно было сравнивать."""
+    json.dump(
+        {'benchmark': name, 'results': results},
+        sys.stdout,
+        ensure_ascii=False,
+        indent=2,
+    )
+    sys.stdout.write('\n')
@@ -0,0 +1,158 @@
+"""
+Нагрузочное сравнение WSGI- и ASGI-развёртывания JSON API заметок.
+
+Поднимает gunicorn (gthread) с yanote.wsgi и uvicorn с yanote.asgi на
+одной временной базе и нагружает /api/notes/ и /api/notes/<slug>/
+постоянными keep-alive соединениями из asyncio-клиента. Для каждого
+развёртывания выводятся запросы в секунду и перцентили задержки.
+
+Нужны пакеты gunicorn и uvicorn:
+
+    pip install gunicorn uvicorn
+    python -m benchmarks.asgi_vs_wsgi --connections 200 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks import report, setup_django, summarize
+
+SERVERS = {
+    'wsgi': [
+        sys.executable, '-m', 'gunicorn', 'yanote.wsgi:application',
+        '--worker-class', 'gthread', '--workers', '1', '--threads', '16',
+        '--bind', '127.0.0.1:{port}', '--log-level', 'warning',
+    ],
+    'asgi': [
+        sys.executable, '-m', 'uvicorn', 'yanote.asgi:application',
+        '--workers', '1', '--host', '127.0.0.1', '--port', '{port}',
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Сервер на порту {port} не запустился.')
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def keep_alive_client(port, paths, cookie, deadline, samples, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    index = 0
+    try:
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: localhost\r\n'
+                f'Cookie: sessionid={cookie}\r\n'
+                f'Connection: keep-alive\r\n\r\n'.encode()
+            )
+            status = await read_response(reader)
+            if status == 200:
+                samples.append(time.perf_counter() - started)
+            else:
+                errors.append(status)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors.append('connection')
+    finally:
+        writer.close()
+
+
+async def load(port, paths, cookie, connections, duration):
+    samples, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        keep_alive_client(port, paths, cookie, deadline, samples, errors)
+        for _ in range(connections)
+    ))
+    return samples, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--servers', nargs='+', default=tuple(SERVERS))
+    args = parser.parse_args()
+    db_name = setup_django()
+
+    from django.test import Client
+    from django.urls import reverse
+
+    from benchmarks.data import create_notes, create_users
+    from notes.models import Note
+
+    (author,) = create_users(1)
+    create_notes([author], args.notes)
+    client = Client()
+    client.force_login(author)
+    cookie = client.cookies['sessionid'].value
+    slugs = Note.objects.values_list('slug', flat=True)[:50]
+    paths = [reverse('notes:api-list')] + [
+        reverse('notes:api-detail', args=(slug,)) for slug in slugs
+    ]
+
+    environment = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'YANOTE_BENCH_DB': db_name,
+    }
+    results = {}
+    for name in args.servers:
+        port = free_port()
+        command = [part.format(port=port) for part in SERVERS[name]]
+        server = subprocess.Popen(command, env=environment)
+        try:
+            wait_for_port(port)
+            samples, errors = asyncio.run(load(
+                port, paths, cookie, args.connections, args.duration
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+        results[name] = {
+            'requests_per_second': round(len(samples) / args.duration, 1),
+            'errors': len(errors),
+            **summarize(samples or [0]),
+        }
+    report('asgi_vs_wsgi', {'connections': args.connections, **results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Задержка автодополнения заголовков у автора с большим числом заметок.
+
+У каждого из --users авторов --notes заметок. Ключи строятся так же,
+как rebuild_note_keys. Запросы — начала слов заголовков длиной от
+одной буквы до целого слова, кириллицей и латиницей, и запросы без
+совпадений. Для сравнения — прежний способ, icontains по заголовку.
+
+- complete — autocomplete.complete() напрямую;
+- api — GET /api/autocomplete/ через тестовый клиент, с сессией;
+- icontains — Note.objects.filter(title__icontains=...)[:limit].
+
+    python -m benchmarks.autocomplete --notes 100000 --queries 1000
+"""
+import argparse
+import random
+import time
+
+from benchmarks import report, setup_django, summarize, timed
+
+TARGET_P99_MS = 10
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--notes', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    from benchmarks.data import create_notes, create_users
+    from notes import autocomplete
+    from notes.models import Note
+
+    authors = create_users(args.users)
+    create_notes(authors, args.notes, text_words=5)
+    started = time.perf_counter()
+    for _ in autocomplete.rebuild(5000):
+        pass
+    index_seconds = time.perf_counter() - started
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    author = authors[0]
+    limit = settings.NOTES_AUTOCOMPLETE_LIMIT
+    words = [
+        word
+        for title in Note.objects.filter(author=author).values_list(
+            'title', flat=True
+        )[:1000]
+        for word in title.replace(',', ' ').replace(':', ' ').split()
+    ]
+    rng = random.Random(0)
+
+    def query():
+        word = rng.choice(words)
+        kind = rng.randrange(4)
+        if kind == 0:
+            return word[:rng.randint(1, len(word))]
+        if kind == 1:
+            return autocomplete.normalize(word)[:rng.randint(1, 4)]
+        if kind == 2:
+            return word.upper()
+        return word + 'щщ'
+
+    client = Client()
+    client.force_login(author)
+    url = reverse('notes:api-autocomplete')
+    client.get(url, {'q': 'a'})
+    found = []
+
+    def complete():
+        found.append(len(autocomplete.complete(author.pk, query(), limit)))
+
+    def api():
+        response = client.get(url, {'q': query()})
+        assert response.status_code == 200, response.status_code
+
+    def icontains():
+        list(Note.objects.filter(
+            author=author, title__icontains=query()
+        ).values_list('id', 'title', 'slug')[:limit])
+
+    results = {
+        'notes_per_author': args.notes,
+        'authors': args.users,
+        'index_seconds': round(index_seconds, 2),
+        'complete': summarize(timed(complete, args.queries)),
+        'api': summarize(timed(api, args.queries)),
+        'icontains': summarize(timed(icontains, args.queries)),
+        'mean_results': round(sum(found) / len(found), 2),
+        'target_p99_ms': TARGET_P99_MS,
+    }
+    results['target_met'] = all(
+        results[kind]['p99_ms'] < TARGET_P99_MS for kind in ('complete', 'api')
+    )
+    report('autocomplete', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Память и задержка страницы большой заметки.
+
+Для каждого размера из --sizes (в мегабайтах) создаётся заметка и
+сравниваются два профиля:
+
+- inline — текст целиком в строке notes_note, как до NoteBody;
+- out_of_row — текст в NoteBody, страница заметки отдаётся потоком.
+
+Выводятся время сохранения, время до первого куска ответа и до конца
+ответа, пик памяти Python (tracemalloc) на запрос страницы и время
+списка из --notes обычных заметок, среди которых лежит большая.
+
+    python -m benchmarks.bodies --sizes 1 10 50 --requests 5
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks import report, setup_django, summarize
+
+INLINE_LIMIT = 1 << 40
+
+
+def make_large_text(rng, megabytes):
+    from benchmarks.data import make_text
+
+    lines = []
+    size = 0
+    while size < megabytes * 1024 * 1024:
+        line = make_text(rng, 12) + '\n'
+        lines.append(line)
+        size += len(line.encode())
+    return ''.join(lines)
+
+
+def fetch(client, url):
+    """Время до первого куска и до конца ответа."""
+    started = time.perf_counter()
+    response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    if response.streaming:
+        size = 0
+        first = None
+        for chunk in response.streaming_content:
+            if first is None:
+                first = time.perf_counter() - started
+            size += len(chunk)
+        response.close()
+    else:
+        first = time.perf_counter() - started
+        size = len(response.content)
+    return first, time.perf_counter() - started, size
+
+
+def peak_memory(client, url):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fetch(client, url)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(client, author, text, slug, args):
+    from django.urls import reverse
+
+    from notes import cache
+    from notes.models import Note
+
+    started = time.perf_counter()
+    note = Note.objects.create(
+        title='Большая заметка', text=text, slug=slug, author=author
+    )
+    save = time.perf_counter() - started
+    url = reverse('notes:detail', args=(note.slug,))
+    fetch(client, url)
+    first, total = [], []
+    for _ in range(args.requests):
+        first_chunk, whole, size = fetch(client, url)
+        first.append(first_chunk)
+        total.append(whole)
+    memory = peak_memory(client, url)
+    list_url = reverse('notes:list')
+    list_samples = []
+    for _ in range(args.requests):
+        cache.bump_generation(author.pk)
+        list_samples.append(fetch(client, list_url)[1])
+    note.delete()
+    return {
+        'save_ms': round(save * 1000, 1),
+        'response_bytes': size,
+        'first_chunk': summarize(first),
+        'response': summarize(total),
+        'peak_memory_mb': round(memory / 1024 / 1024, 1),
+        'list': summarize(list_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1, 5, 10, 25, 50]
+    )
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--notes', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    from benchmarks.data import create_notes, create_users
+
+    author, = create_users(1)
+    create_notes([author], args.notes)
+    client = Client()
+    client.force_login(author)
+    rng = random.Random(args.seed)
+    profiles = {
+        'inline': INLINE_LIMIT,
+        'out_of_row': settings.NOTES_BODY_INLINE_LIMIT,
+    }
+    results = {}
+    for megabytes in args.sizes:
+        text = make_large_text(rng, megabytes)
+        results[f'{megabytes}MB'] = {}
+        for name, limit in profiles.items():
+            with override_settings(NOTES_BODY_INLINE_LIMIT=limit):
+                results[f'{megabytes}MB'][name] = run(
+                    client, author, text, f'big-{megabytes}-{name}', args
+                )
+    report('bodies', {
+        'notes': args.notes,
+        'inline_limit': settings.NOTES_BODY_INLINE_LIMIT,
+        'chunk_size': settings.NOTES_BODY_CHUNK_SIZE,
+        'sizes': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
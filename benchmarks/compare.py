@@ -0,0 +1,59 @@
+"""
+Сравнение двух прогонов benchmarks.routes.
+
+Печатает сценарии, где медиана или p95 задержки выросли больше чем на
+--threshold процентов, выросло число SQL-запросов на ответ или
+изменились коды ответов. Код возврата 1, если регрессии есть.
+
+    python -m benchmarks.compare baseline.json current.json
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)['results']['scenarios']
+
+
+def regressions(baseline, current, threshold):
+    for name, new in sorted(current.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for key in LATENCY_KEYS:
+            if old[key] and new[key] > old[key] * (1 + threshold / 100):
+                growth = (new[key] / old[key] - 1) * 100
+                yield name, key, old[key], new[key], f'+{growth:.0f}%'
+        if new['queries_per_request'] > old['queries_per_request']:
+            yield (name, 'queries_per_request', old['queries_per_request'],
+                   new['queries_per_request'], '')
+        if new['statuses'] != old['statuses']:
+            yield name, 'statuses', old['statuses'], new['statuses'], ''
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=20,
+                        help='Допустимый рост задержки, проценты.')
+    args = parser.parse_args()
+    found = list(regressions(
+        load(args.baseline), load(args.current), args.threshold
+    ))
+    for name, key, old, new, note in found:
+        print(f'{name}: {key} {old} -> {new} {note}'.rstrip())
+    if not found:
+        print('Регрессий не найдено.')
+    sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Генератор правдоподобных русскоязычных заметок."""
+import random
+
+WORDS = (
+    'заметка', 'встреча', 'проект', 'задача', 'список', 'покупки', 'молоко',
+    'хлеб', 'поезд', 'вокзал', 'билеты', 'отпуск', 'море', 'книга', 'глава',
+    'идея', 'план', 'неделя', 'понедельник', 'пятница', 'отчёт', 'сроки',
+    'клиент', 'звонок', 'письмо', 'договор', 'оплата', 'счёт', 'врач',
+    'лекарство', 'тренировка', 'бег', 'рецепт', 'борщ', 'пирог', 'гости',
+    'подарок', 'день', 'рождения', 'ремонт', 'кухня', 'краска', 'обои',
+    'машина', 'шины', 'сервис', 'дача', 'огород', 'рассада', 'погода',
+    'дождь', 'снег', 'зонт', 'фильм', 'сериал', 'музыка', 'концерт',
+    'важный', 'срочный', 'новый', 'старый', 'большой', 'маленький',
+    'купить', 'позвонить', 'написать', 'проверить', 'забрать', 'отправить',
+    'прочитать', 'посмотреть', 'обсудить', 'подготовить', 'запомнить',
+)
+
+
+VERBS = (
+    'купить', 'позвонить', 'написать', 'проверить', 'забрать', 'отправить',
+    'прочитать', 'посмотреть', 'обсудить', 'подготовить', 'запомнить',
+)
+NOUNS = (
+    'молоко', 'хлеб', 'билеты', 'подарок', 'отчёт', 'договор', 'письмо',
+    'лекарство', 'краску', 'шины', 'рассаду', 'книгу', 'фильм', 'рецепт',
+)
+ADJECTIVES = ('важный', 'срочный', 'новый', 'старый', 'большой')
+DAYS = ('понедельник', 'вторник', 'среду', 'четверг', 'пятницу', 'выходные')
+TITLE_TEMPLATES = (
+    '{verb} {noun}',
+    '{verb} {noun} в {day}',
+    'Не забыть {verb} {noun}',
+    '{adjective} план на {day}',
+    'Список: {noun}, {noun2}',
+    'Идея {number}',
+)
+
+
+def make_title(rng, words=None):
+    """Заголовок по шаблону или, если задано words, из случайных слов."""
+    if words:
+        return ' '.join(rng.choices(WORDS, k=words)).capitalize()[:100]
+    title = rng.choice(TITLE_TEMPLATES).format(
+        verb=rng.choice(VERBS),
+        noun=rng.choice(NOUNS),
+        noun2=rng.choice(NOUNS),
+        adjective=rng.choice(ADJECTIVES),
+        day=rng.choice(DAYS),
+        number=rng.randint(1, 999),
+    )
+    return title[0].upper() + title[1:100]
+
+
+def text_length(rng, median=40):
+    """Длина текста в словах: короткие заметки часты, длинные редки."""
+    return max(3, int(rng.lognormvariate(0, 1) * median))
+
+
+def make_text(rng, words=60):
+    if words is None:
+        words = text_length(rng)
+    sentences = []
+    while words > 0:
+        length = min(words, rng.randint(5, 12))
+        sentences.append(' '.join(rng.choices(WORDS, k=length)).capitalize())
+        words -= length
+    return '. '.join(sentences) + '.'
+
+
+def make_notes(author, count, seed=0, start=0, text_words=60):
+    """Заметки для bulk_create с уникальными slug."""
+    from notes.models import Note
+
+    rng = random.Random(f'{seed}-{author.pk}-{start}')
+    for index in range(start, start + count):
+        yield Note(
+            title=make_title(rng),
+            text=make_text(rng, text_words),
+            slug=f'u{author.pk}-n{index}',
+            author=author,
+        )
+
+
+def create_users(count, prefix='bench'):
+    from django.contrib.auth import get_user_model
+
+    from notes.models import NotesVersion
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(username=f'{prefix}-{index}') for index in range(count)
+    )
+    users = list(
+        User.objects.filter(username__startswith=f'{prefix}-').order_by('id')
+    )
+    NotesVersion.objects.bulk_create(
+        NotesVersion(user=user) for user in users
+    )
+    return users
+
+
+def create_notes(authors, per_author, batch_size=5000, seed=0, start=0,
+                 text_words=60):
+    """Создаёт per_author заметок каждому автору порциями bulk_create."""
+    from django.db import transaction
+
+    from notes.models import Note
+
+    for author in authors:
+        notes = make_notes(author, per_author, seed, start, text_words)
+        batch = []
+        for note in notes:
+            batch.append(note)
+            if len(batch) == batch_size:
+                with transaction.atomic():
+                    Note.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                Note.objects.bulk_create(batch)
@@ -0,0 +1,143 @@
+"""
+Пропускная способность входа и задержка заметок во время волны входов.
+
+Профили хеширования паролей:
+
+- pbkdf2_inline — PBKDF2 из Django в рабочем потоке, как до
+  notes.hashers;
+- scrypt_inline — scrypt в рабочем потоке;
+- scrypt_pool — scrypt в пуле NOTES_PASSWORD_HASH_WORKERS процессов.
+
+Для каждого профиля сначала замеряется список заметок без нагрузки,
+затем --logins потоков входят по кругу --seconds секунд, а основной
+поток открывает список заметок. Кеш страниц сбрасывается перед каждым
+запросом списка, чтобы он строился заново.
+
+    python -m benchmarks.login --logins 8 --seconds 10 --requests 200
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+from benchmarks import TimedClient, report, setup_django, summarize
+
+PASSWORD = 'Пароль-для-замера-1'
+PROFILES = {
+    'pbkdf2_inline': {
+        'PASSWORD_HASHERS': [
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        ],
+        'NOTES_PASSWORD_HASH_WORKERS': 0,
+    },
+    'scrypt_inline': {'NOTES_PASSWORD_HASH_WORKERS': 0},
+    'scrypt_pool': {},
+}
+
+
+def login_worker(username, stop, statuses, lock):
+    from django.db import connections
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client(raise_request_exception=False)
+    url = reverse('users:login')
+    data = {'username': username, 'password': PASSWORD}
+    counts = Counter()
+    while not stop.is_set():
+        counts[client.post(url, data=data).status_code] += 1
+    connections.close_all()
+    with lock:
+        statuses.update(counts)
+
+
+def list_latency(client, author, requests):
+    from django.urls import reverse
+
+    from notes import cache
+
+    url = reverse('notes:list')
+    samples = []
+    for _ in range(requests):
+        cache.bump_generation(author.pk)
+        samples.append(client.get(url).elapsed)
+    return samples
+
+
+def run(users, author_client, author, args):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    user_model = get_user_model()
+    for user in users:
+        user_model.objects.filter(pk=user.pk).update(
+            password=make_password(PASSWORD)
+        )
+    idle = list_latency(author_client, author, args.requests)
+    stop = threading.Event()
+    statuses = Counter()
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=login_worker, args=(user.username, stop, statuses, lock)
+        )
+        for user in users
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    loaded = list_latency(author_client, author, args.requests)
+    remaining = args.seconds - (time.monotonic() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {
+        'logins_per_second': round(statuses[302] / elapsed, 1),
+        'login_statuses': {
+            str(code): count for code, count in statuses.items()
+        },
+        'list_idle': summarize(idle),
+        'list_under_login_load': summarize(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--logins', type=int, default=8,
+                        help='Потоков, которые входят по кругу.')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--notes', type=int, default=50)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.conf import settings
+    from django.test import Client, override_settings
+
+    from benchmarks.data import create_notes, create_users
+
+    author, *users = create_users(args.logins + 1)
+    create_notes([author], args.notes)
+    author_client = TimedClient(Client())
+    author_client.force_login(author)
+    results = {}
+    for name, overrides in PROFILES.items():
+        with override_settings(**overrides):
+            results[name] = run(users, author_client, author, args)
+    report('login', {
+        'logins': args.logins,
+        'workers': settings.NOTES_PASSWORD_HASH_WORKERS,
+        'nice': settings.NOTES_PASSWORD_HASH_NICE,
+        'profiles': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Смешанная нагрузка чтения и записи на SQLite в двух профилях базы.
+
+baseline — стандартный django.db.backends.sqlite3 без WAL и без
+маршрутизатора, tuned — профиль yanote.settings_production (WAL, PRAGMA,
+BEGIN IMMEDIATE, постоянные соединения, чтение через reader).
+Потоки-читатели открывают список и заметки, потоки-писатели
+редактируют заметки. Кеш заметок отключён, чтобы каждое чтение шло
+в базу. Каждый профиль запускается отдельным процессом.
+
+    python -m benchmarks.mixed_load --readers 6 --writers 2 --seconds 10
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+from benchmarks import report, setup_django, summarize
+
+PROFILES = ('baseline', 'tuned')
+
+
+def use_profile(settings, profile):
+    """Меняет настройки базы до django.setup()."""
+    settings.CACHES['notes'] = {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }
+    settings.NOTES_CACHE_ALIAS = 'notes'
+    if profile == 'baseline':
+        settings.DATABASES = {'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': settings.DATABASES['default']['NAME'],
+        }}
+        settings.DATABASE_ROUTERS = []
+
+
+def worker(role, author, slugs, deadline, results, lock, seed):
+    from django.db import connections
+    from django.test import Client
+    from django.urls import reverse
+
+    from benchmarks import TimedClient
+
+    rng = random.Random(seed)
+    client = TimedClient(Client(raise_request_exception=False))
+    client.force_login(author)
+    samples, statuses = [], Counter()
+    while time.monotonic() < deadline:
+        slug = rng.choice(slugs)
+        if role == 'write':
+            response = client.post(
+                reverse('notes:edit', args=(slug,)),
+                data={'title': f'Заметка {slug}', 'slug': slug,
+                      'text': f'Правка {rng.random()}'},
+            )
+        elif rng.random() < 0.5:
+            response = client.get(reverse('notes:list'))
+        else:
+            response = client.get(reverse('notes:detail', args=(slug,)))
+        samples.append(response.elapsed)
+        statuses[response.status_code] += 1
+    connections.close_all()
+    with lock:
+        results[role]['samples'].extend(samples)
+        results[role]['statuses'].update(statuses)
+
+
+def run_profile(args):
+    setup_django(
+        args.db, configure=lambda settings: use_profile(settings, args.profile)
+    )
+
+    from benchmarks.data import create_notes, create_users
+    from notes.models import Note
+
+    roles = ['read'] * args.readers + ['write'] * args.writers
+    authors = create_users(len(roles))
+    create_notes(authors, args.notes, seed=args.seed)
+    results = {
+        role: {'samples': [], 'statuses': Counter()}
+        for role in ('read', 'write')
+    }
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(
+            role, author,
+            list(Note.objects.filter(author=author)
+                 .values_list('slug', flat=True)),
+            deadline, results, lock, args.seed + number,
+        ))
+        for number, (role, author) in enumerate(zip(roles, authors))
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return {
+        role: {
+            'requests_per_second': round(
+                len(data['samples']) / elapsed, 1
+            ),
+            **(summarize(data['samples']) if data['samples'] else {}),
+            'statuses': {
+                str(code): count for code, count in data['statuses'].items()
+            },
+        }
+        for role, data in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--notes', type=int, default=200,
+                        help='Заметок у каждого пользователя.')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', choices=PROFILES, default=None,
+                        help='Запустить один профиль в этом процессе.')
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    if args.profile is not None:
+        json.dump(run_profile(args), sys.stdout)
+        return
+
+    results = {}
+    for profile in PROFILES:
+        command = [sys.executable, '-m', 'benchmarks.mixed_load',
+                   '--profile', profile] + [
+            f'--{name}={getattr(args, name)}'
+            for name in ('readers', 'writers', 'notes', 'seconds', 'seed')
+        ]
+        output = subprocess.run(
+            command, capture_output=True, text=True, check=True
+        ).stdout
+        results[profile] = json.loads(output)
+    report('mixed_load', {
+        'readers': args.readers,
+        'writers': args.writers,
+        'profiles': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
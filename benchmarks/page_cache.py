@@ -0,0 +1,79 @@
+"""
+Задержка и число запросов к базе для страниц заметок с кешем и без.
+
+Кеш выключается подменой NOTES_CACHE_ALIAS на DummyCache. Для каждой
+страницы выводятся перцентили задержки, среднее число SQL-запросов
+на один ответ и счётчики попаданий кеша.
+
+    python -m benchmarks.page_cache --notes 1000 --requests 500
+"""
+import argparse
+import random
+
+from benchmarks import report, setup_django, summarize
+
+
+def measure(client, urls, requests, rng):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    samples, queries = [], 0
+    for _ in range(requests):
+        url = rng.choice(urls)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        samples.append(response.elapsed)
+        queries += len(context.captured_queries)
+    return {**summarize(samples), 'queries_per_request': queries / requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from benchmarks import TimedClient
+    from benchmarks.data import create_notes, create_users
+    from notes import cache
+    from notes.models import Note
+
+    (author,) = create_users(1)
+    create_notes([author], args.notes)
+    client = TimedClient(Client())
+    client.force_login(author)
+    slugs = list(Note.objects.values_list('slug', flat=True)[:100])
+    pages = {
+        'notes:list': [reverse('notes:list')],
+        'notes:detail': [reverse('notes:detail', args=(s,)) for s in slugs],
+    }
+    caches = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'dummy': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
+    }
+    results = {}
+    for mode, alias in (('uncached', 'dummy'), ('cached', 'default')):
+        with override_settings(CACHES=caches, NOTES_CACHE_ALIAS=alias):
+            cache.stats.reset()
+            results[mode] = {
+                name: measure(client, urls, args.requests, random.Random(0))
+                for name, urls in pages.items()
+            }
+            results[mode]['cache_stats'] = cache.stats.snapshot()
+    report('page_cache', results)
+
+
+if __name__ == '__main__':
+    main()
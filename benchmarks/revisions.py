@@ -0,0 +1,103 @@
+"""
+Объём истории версий и время сборки версии.
+
+Для каждого интервала снимков из --every создаётся заметка из
+--lines строк и --edits раз правится несколькими строками, как при
+обычном редактировании большой заметки. Выводятся байты на версию
+против размера полного текста, время сохранения с записью версии и
+время сборки случайной версии. --every 1 — хранение полной копии
+каждой версии (только со сжатием).
+
+    python -m benchmarks.revisions --lines 2000 --edits 200 --every 1 20 50
+"""
+import argparse
+import random
+
+from benchmarks import report, setup_django, summarize, timed
+
+
+def edit(rng, lines):
+    """Заменяет, вставляет или удаляет пару строк."""
+    from benchmarks.data import make_text
+
+    for _ in range(2):
+        position = rng.randrange(len(lines))
+        action = rng.random()
+        if action < 0.6:
+            lines[position] = make_text(rng, 12) + '\n'
+        elif action < 0.8:
+            lines.insert(position, make_text(rng, 12) + '\n')
+        elif len(lines) > 1:
+            del lines[position]
+
+
+def run(author, every, args):
+    from django.db.models import Sum
+    from django.test import override_settings
+
+    from benchmarks.data import make_text
+    from notes import revisions
+    from notes.models import Note, NoteRevision
+
+    rng = random.Random(args.seed)
+    lines = [make_text(rng, 12) + '\n' for _ in range(args.lines)]
+    with override_settings(NOTES_REVISION_SNAPSHOT_EVERY=every):
+        note = Note.objects.create(
+            title='Большая заметка', text=''.join(lines), author=author,
+            slug=f'big-{every}',
+        )
+
+        def save():
+            edit(rng, lines)
+            note.text = ''.join(lines)
+            note.save()
+
+        save_samples = timed(save, args.edits)
+    stored = NoteRevision.objects.filter(note=note)
+    count = stored.count()
+    text_chars = stored.aggregate(total=Sum('size'))['total']
+    stored_bytes = sum(
+        len(data) for data in stored.values_list('data', flat=True)
+    )
+    numbers = [rng.randint(1, count) for _ in range(args.rebuilds)]
+    rebuild_samples = timed(
+        lambda: revisions.rebuild(note.pk, numbers.pop()), args.rebuilds
+    )
+    return {
+        'revisions': count,
+        'text_bytes': len(note.text.encode()),
+        'stored_bytes_per_revision': round(stored_bytes / count),
+        'text_chars_per_revision': round(text_chars / count),
+        'save': summarize(save_samples),
+        'rebuild': summarize(rebuild_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--lines', type=int, default=2000)
+    parser.add_argument('--edits', type=int, default=200)
+    parser.add_argument('--rebuilds', type=int, default=200)
+    parser.add_argument('--every', type=int, nargs='+', default=[1, 20, 50])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from benchmarks.data import create_users
+
+    author, = create_users(1)
+    report('revisions', {
+        'lines': args.lines,
+        'edits': args.edits,
+        'snapshot_every': {
+            str(every): run(author, every, args) for every in args.every
+        },
+    })
+
+
+if __name__ == '__main__':
+    main()
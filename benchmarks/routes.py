@@ -0,0 +1,294 @@
+"""
+Сквозной бенчмарк всех маршрутов notes.urls и users:signup/users:login.
+
+Генерирует --users пользователей по --notes заметок с русскими
+заголовками и текстами, затем для каждого сценария выполняет
+--requests запросов одним клиентом и замеряет запросы в секунду,
+перцентили задержки, SQL-запросы на ответ и пик выделенной памяти
+(tracemalloc, отдельный проход). Результат печатается в JSON; два
+прогона сравнивает ``python -m benchmarks.compare old.json new.json``.
+
+    python -m benchmarks.routes --users 20 --notes 500 > run.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import resource
+import subprocess
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from benchmarks import report, setup_django, summarize
+
+MEMORY_REQUESTS = 5
+
+
+class Scenario:
+    """Один вид запроса: метод, адрес и данные на каждой итерации."""
+
+    def __init__(self, name, route, method, build, client='author'):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.build = build
+        self.client = client
+
+
+def json_body(data):
+    return {
+        'data': json.dumps(data, ensure_ascii=False),
+        'content_type': 'application/json',
+    }
+
+
+def build_scenarios(context):
+    """Сценарии по всем маршрутам; context хранит данные и счётчики."""
+    from django.urls import reverse
+
+    from benchmarks.data import make_text, make_title
+
+    rng = context['rng']
+    slugs = context['slugs']
+    counter = itertools.count()
+
+    def any_slug():
+        return rng.choice(slugs)
+
+    def note_form():
+        return {'title': make_title(rng), 'text': make_text(rng, None)}
+
+    def fresh_slug():
+        """Заметка под удаление, чтобы не трогать общий набор."""
+        return context['spare_slugs'].pop()
+
+    def static(name, *args):
+        url = reverse(name, args=args)
+        return lambda: (url, {})
+
+    def ndjson(count):
+        lines = '\n'.join(
+            json.dumps(note_form(), ensure_ascii=False) for _ in range(count)
+        )
+        return {'data': lines, 'content_type': 'application/x-ndjson'}
+
+    def edit():
+        slug = any_slug()
+        return reverse('notes:edit', args=(slug,)), {
+            'data': {**note_form(), 'slug': slug}
+        }
+
+    def signup():
+        number = next(counter)
+        password = 'Пароль-для-теста-1'
+        return reverse('users:signup'), {'data': {
+            'username': f'signup-{number}',
+            'password1': password,
+            'password2': password,
+        }}
+
+    return [
+        Scenario('home', 'notes:home', 'get', static('notes:home')),
+        Scenario('list', 'notes:list', 'get', static('notes:list')),
+        Scenario('list_deep', 'notes:list', 'get', lambda: (
+            reverse('notes:list'), {'data': {'cursor': context['cursor']}}
+        )),
+        Scenario('detail', 'notes:detail', 'get', lambda: (
+            reverse('notes:detail', args=(any_slug(),)), {}
+        )),
+        Scenario('add_form', 'notes:add', 'get', static('notes:add')),
+        Scenario('add', 'notes:add', 'post', lambda: (
+            reverse('notes:add'), {'data': note_form()}
+        )),
+        Scenario('edit_form', 'notes:edit', 'get', lambda: (
+            reverse('notes:edit', args=(any_slug(),)), {}
+        )),
+        Scenario('edit', 'notes:edit', 'post', edit),
+        Scenario('delete_form', 'notes:delete', 'get', lambda: (
+            reverse('notes:delete', args=(any_slug(),)), {}
+        )),
+        Scenario('delete', 'notes:delete', 'post', lambda: (
+            reverse('notes:delete', args=(fresh_slug(),)), {}
+        )),
+        Scenario('search', 'notes:search', 'get', lambda: (
+            reverse('notes:search'), {'data': {'q': rng.choice(
+                ('купить', 'список', 'молоко', 'план пятницу', 'идея')
+            )}}
+        )),
+        Scenario('export', 'notes:export', 'get', static('notes:export')),
+        Scenario('import', 'notes:import', 'post', lambda: (
+            reverse('notes:import'), ndjson(20)
+        )),
+        Scenario('api_list', 'notes:api-list', 'get',
+                 static('notes:api-list')),
+        Scenario('api_create', 'notes:api-list', 'post', lambda: (
+            reverse('notes:api-list'), json_body(note_form())
+        )),
+        Scenario('api_detail', 'notes:api-detail', 'get', lambda: (
+            reverse('notes:api-detail', args=(any_slug(),)), {}
+        )),
+        Scenario('api_patch', 'notes:api-detail', 'patch', lambda: (
+            reverse('notes:api-detail', args=(any_slug(),)),
+            json_body({'text': make_text(rng, None)}),
+        )),
+        Scenario('api_delete', 'notes:api-detail', 'delete', lambda: (
+            reverse('notes:api-detail', args=(fresh_slug(),)), {}
+        )),
+        Scenario('metrics', 'notes:metrics', 'get', static('notes:metrics')),
+        Scenario('success', 'notes:success', 'get', static('notes:success')),
+        Scenario('signup_form', 'users:signup', 'get',
+                 static('users:signup'), client='anonymous'),
+        Scenario('signup', 'users:signup', 'post', signup,
+                 client='anonymous'),
+        Scenario('login_form', 'users:login', 'get', static('users:login'),
+                 client='anonymous'),
+        Scenario('login', 'users:login', 'post', lambda: (
+            reverse('users:login'), {'data': {
+                'username': context['author'].username,
+                'password': context['password'],
+            }}
+        ), client='anonymous'),
+    ]
+
+
+def uncovered_routes(scenarios):
+    """Маршруты notes.urls, для которых нет сценария."""
+    from notes.urls import app_name, urlpatterns
+
+    covered = {scenario.route for scenario in scenarios}
+    return sorted(
+        f'{app_name}:{pattern.name}' for pattern in urlpatterns
+        if f'{app_name}:{pattern.name}' not in covered
+    )
+
+
+def run_scenario(scenario, clients, requests):
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    client = clients[scenario.client]
+    request = getattr(client, scenario.method)
+    samples, queries, statuses = [], 0, {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        url, kwargs = scenario.build()
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            ]
+            request_started = time.perf_counter()
+            response = request(url, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            samples.append(time.perf_counter() - request_started)
+        queries += sum(len(context.captured_queries) for context in contexts)
+        status = str(response.status_code)
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _ in range(MEMORY_REQUESTS):
+        url, kwargs = scenario.build()
+        response = request(url, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'route': scenario.route,
+        'method': scenario.method.upper(),
+        'requests_per_second': round(requests / elapsed, 1),
+        **summarize(samples),
+        'queries_per_request': round(queries / requests, 2),
+        'peak_alloc_kb': round(peak / 1024, 1),
+        'statuses': statuses,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--notes', type=int, default=500,
+                        help='Заметок у каждого пользователя.')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', default=None,
+                        help='Имена сценариев для запуска.')
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    import django
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    from benchmarks.data import create_notes, create_users
+    from notes.models import Note
+    from notes.pagination import NEXT, KeysetPaginator
+
+    authors = create_users(args.users)
+    create_notes(authors, args.notes, seed=args.seed, text_words=None)
+    author = authors[0]
+    password = 'Пароль-автора-1'
+    author.set_password(password)
+    author.save()
+    spares = args.requests + MEMORY_REQUESTS
+    create_notes([author], 2 * spares, seed=args.seed, start=args.notes,
+                 text_words=None)
+
+    author_notes = Note.objects.filter(author=author).order_by('id')
+    all_slugs = list(author_notes.values_list('slug', flat=True))
+    middle_id = author_notes.values_list('id', flat=True)[args.notes // 2]
+    context = {
+        'rng': random.Random(args.seed),
+        'author': author,
+        'password': password,
+        'slugs': all_slugs[:args.notes],
+        'spare_slugs': all_slugs[args.notes:],
+        'cursor': KeysetPaginator.encode_cursor(NEXT, middle_id),
+    }
+    author_client = Client()
+    author_client.force_login(author)
+    clients = {'author': author_client, 'anonymous': Client()}
+
+    scenarios = build_scenarios(context)
+    if args.only:
+        scenarios = [s for s in scenarios if s.name in args.only]
+    results = {
+        scenario.name: run_scenario(scenario, clients, args.requests)
+        for scenario in scenarios
+    }
+    report('routes', {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'revision': git_revision(),
+            'users': get_user_model().objects.count(),
+            'notes': Note.objects.count(),
+            'seed': args.seed,
+        },
+        'uncovered_routes': uncovered_routes(build_scenarios(context)),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'scenarios': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
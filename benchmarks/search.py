@@ -0,0 +1,105 @@
+"""
+Задержка полнотекстового поиска в зависимости от размера корпуса.
+
+У измеряемого автора --author-notes заметок, заметки остальных
+--users авторов наращивают корпус до каждого из размеров --sizes.
+После этого выполняются --queries запросов автора двух видов:
+
+* selective - по редкому слову (у каждой заметки свой код), число
+  совпадений постоянно;
+* common - по частым словам словаря, совпадений много, и все они
+  ранжируются.
+
+Автор задан в самом MATCH, и заметки других авторов не ранжируются.
+Задержка selective от корпуса почти не зависит. Задержка common
+растёт с корпусом, хотя и медленнее него: FTS5 читает список
+документов частого слова целиком — чтобы раскрыть префикс основы и
+чтобы bm25 посчитал, в скольких заметках слово встречается.
+latency_growth common показывает эту часть цены.
+
+    python -m benchmarks.search --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+
+from benchmarks import report, setup_django, summarize, timed
+
+
+def create_coded_notes(authors, per_author, start):
+    """Заметки с уникальным кодовым словом в тексте."""
+    from django.db import transaction
+
+    from benchmarks.data import make_notes
+    from notes.models import Note
+
+    for author in authors:
+        notes = list(make_notes(author, per_author, start=start))
+        for index, note in enumerate(notes, start):
+            note.text += f' код{author.pk}x{index}'
+        with transaction.atomic():
+            Note.objects.bulk_create(notes, batch_size=5000)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=(10_000, 100_000, 1_000_000))
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--author-notes', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.conf import settings
+
+    from benchmarks.data import WORDS, create_users
+    from notes.models import Note
+    from notes.search import get_backend
+
+    backend = get_backend()
+    limit = settings.NOTES_SEARCH_LIMIT
+    author, *others = create_users(args.users + 1)
+    create_coded_notes([author], args.author_notes, 0)
+    scope = Note.objects.filter(author=author).only('id', 'title', 'slug')
+    rng = random.Random(0)
+    results = []
+    per_author_total = 0
+    for size in sorted(args.sizes):
+        per_author = max(
+            0, (size - args.author_notes) // len(others) - per_author_total
+        )
+        create_coded_notes(others, per_author, per_author_total)
+        per_author_total += per_author
+
+        def selective():
+            index = rng.randrange(args.author_notes)
+            list(backend.search(
+                scope, f'код{author.pk}x{index}', limit, author.pk
+            ))
+
+        def common():
+            words = ' '.join(rng.choices(WORDS, k=2))
+            list(backend.search(scope, words, limit, author.pk))
+
+        results.append({
+            'notes': args.author_notes + per_author_total * len(others),
+            'author_notes': args.author_notes,
+            'selective': summarize(timed(selective, args.queries)),
+            'common': summarize(timed(common, args.queries)),
+        })
+
+    for smaller, larger in zip(results, results[1:]):
+        larger['corpus_growth'] = round(larger['notes'] / smaller['notes'], 2)
+        for kind in ('selective', 'common'):
+            larger[kind]['latency_growth'] = round(
+                larger[kind]['p50_ms'] / smaller[kind]['p50_ms'], 2
+            )
+    report('search', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""Настройки для серверов, которые бенчмарки запускают подпроцессами."""
+import os
+
+from benchmarks import set_database_names
+from yanote.settings_production import *  # noqa: F401,F403
+from yanote.settings_production import DATABASES
+
+set_database_names(DATABASES, os.environ['YANOTE_BENCH_DB'])
+
+NOTES_RATE_LIMITS = {}
@@ -0,0 +1,138 @@
+"""
+Пропускная способность записи заметок при разном числе шардов.
+
+Для каждого числа шардов из --shards процессы-писатели (--writers, у
+каждого свой автор) --seconds секунд создают заметки через Note.save со
+всеми сигналами: строка заметки, версия истории, запись журнала и
+задача подсчёта слов. Авторы делятся между шардами поровну. Выводятся
+заметки в секунду на все процессы, задержка одного сохранения и число
+ошибок «database is locked».
+
+Процессы, а не потоки: иначе запись упиралась бы в GIL, а не в
+блокировку записи SQLite. Ускорение видно, только если ядер больше
+одного: на одном ядре писатели делят процессор при любом числе шардов.
+
+    python -m benchmarks.shards --shards 1 2 4 --writers 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import time
+
+from benchmarks import report, setup_django, summarize
+
+
+def shard_aliases(count):
+    return ('default', *(f'shard{number}' for number in range(1, count)))
+
+
+def add_shards(settings, count):
+    """Базы shard1..shardN-1 с настройками default."""
+    for alias in shard_aliases(count)[1:]:
+        settings.DATABASES[alias] = {
+            **settings.DATABASES['default'], 'TEST': {},
+        }
+    settings.NOTES_SHARDS = shard_aliases(count)
+
+
+def writer(author_id, alias, deadline, start, results):
+    from django.db import OperationalError, connections
+
+    from notes.models import Note
+    from notes.routers import on_shard
+
+    start.wait()
+    samples, locked, number = [], 0, 0
+    with on_shard(alias):
+        while time.monotonic() < deadline.value:
+            number += 1
+            note = Note(
+                author_id=author_id, title=f'Заметка {number}',
+                text=f'Текст заметки номер {number}',
+            )
+            started = time.perf_counter()
+            try:
+                note.save()
+            except OperationalError:
+                locked += 1
+                continue
+            samples.append(time.perf_counter() - started)
+    connections.close_all()
+    results.put((samples, locked))
+
+
+def run(count, args):
+    from django.conf import settings
+    from django.db import connections
+
+    from benchmarks.data import create_users
+    from notes.models import NotesVersion, ShardPlacement
+    from notes.routers import on_shard
+
+    aliases = shard_aliases(count)
+    settings.NOTES_SHARDS = aliases
+    authors = create_users(args.writers, prefix=f'shards{count}')
+    placed = [
+        (author.pk, aliases[number % count])
+        for number, author in enumerate(authors)
+    ]
+    for author_id, alias in placed:
+        ShardPlacement.objects.update_or_create(
+            user_id=author_id, defaults={'alias': alias}
+        )
+        with on_shard(alias):
+            NotesVersion.objects.get_or_create(user_id=author_id)
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    start = context.Barrier(args.writers + 1)
+    deadline = context.Value('d', 0.0)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=writer, args=(author_id, alias, deadline, start, results)
+        )
+        for author_id, alias in placed
+    ]
+    for process in processes:
+        process.start()
+    deadline.value = time.monotonic() + args.seconds
+    started = time.perf_counter()
+    start.wait()
+    samples, locked = [], 0
+    for _ in processes:
+        process_samples, process_locked = results.get()
+        samples += process_samples
+        locked += process_locked
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return {
+        'notes_per_second': round(len(samples) / elapsed, 1),
+        'locked_errors': locked,
+        'save': summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(
+        args.db,
+        configure=lambda settings: add_shards(settings, max(args.shards)),
+    )
+    report('shards', {
+        'writers': args.writers,
+        'cpus': multiprocessing.cpu_count(),
+        'shards': {str(count): run(count, args) for count in args.shards},
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Параллельное создание заметок с одинаковыми заголовками.
+
+Несколько потоков одновременно отправляют форму создания заметки
+с общим заголовком и пустым slug. Выводится распределение кодов ответа
+(ожидается ни одного 500), число запросов к notes_note на одно
+создание и итоговое число уникальных slug. База работает в режиме WAL,
+чтобы блокировки журнала SQLite не смешивались с гонкой за slug.
+
+    python -m benchmarks.slug_stress --threads 8 --creates 50
+"""
+import argparse
+import threading
+from collections import Counter
+
+from benchmarks import report, setup_django, summarize
+
+
+def worker(author, url, data, creates, statuses, queries, samples, lock):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from benchmarks import TimedClient
+
+    client = TimedClient(Client(raise_request_exception=False))
+    client.force_login(author)
+    for _ in range(creates):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(url, data=data)
+        note_queries = sum(
+            'notes_note' in query['sql']
+            for query in context.captured_queries
+        )
+        with lock:
+            statuses[response.status_code] += 1
+            queries.append(note_queries)
+            samples.append(response.elapsed)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--creates', type=int, default=50)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    from django.db.backends.signals import connection_created
+
+    def enable_wal(sender, connection, **kwargs):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+    connection_created.connect(enable_wal, weak=False)
+    setup_django(args.db, options={'timeout': 30})
+
+    from django.urls import reverse
+
+    from benchmarks.data import create_users
+    from notes.models import Note
+
+    authors = create_users(args.threads)
+    url = reverse('notes:add')
+    data = {'title': 'Список покупок', 'text': 'Молоко, хлеб'}
+    statuses, queries, samples = Counter(), [], []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(author, url, data, args.creates, statuses, queries,
+                  samples, lock),
+        )
+        for author in authors
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    report('slug_stress', {
+        'statuses': {str(code): count for code, count in statuses.items()},
+        'note_queries_per_create': sum(queries) / len(queries),
+        'notes': Note.objects.count(),
+        'unique_slugs': Note.objects.values('slug').distinct().count(),
+        'latency': summarize(samples),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Холодный старт процесса в полном и облегчённом профилях.
+
+Каждый запуск — новый процесс Python, который импортирует настройки,
+выполняет django.setup(), собирает WSGI-приложение и обрабатывает
+первый запрос: GET /api/notes/ от пользователя с сессией. Профили:
+
+- full — yanote.settings_production;
+- api — yanote.settings_api.
+
+Выводятся медианы времени этапов и RSS после первого запроса по
+--runs запускам, а также разбивка времени импорта по пакетам из
+одного запуска с ``-X importtime``.
+
+    python -m benchmarks.startup --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from benchmarks import report, setup_django
+
+PROFILES = {
+    'full': 'yanote.settings_production',
+    'api': 'yanote.settings_api',
+}
+CHILD = '''
+import json, os, resource, sys, time
+started = time.perf_counter()
+import django
+from django.conf import settings
+for database in settings.DATABASES.values():
+    database['NAME'] = os.environ['YANOTE_BENCH_DB']
+django.setup()
+setup = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.perf_counter()
+statuses = []
+
+
+def start_response(status, headers):
+    statuses.append(status)
+
+
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/notes/',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+    'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+    'HTTP_COOKIE': 'sessionid=' + os.environ['YANOTE_BENCH_SESSION'],
+    'wsgi.input': sys.stdin.buffer, 'wsgi.url_scheme': 'http',
+}
+body = b''.join(application(environ, start_response))
+finished = time.perf_counter()
+print(json.dumps({
+    'status': statuses[0],
+    'setup_ms': (setup - started) * 1000,
+    'application_ms': (loaded - setup) * 1000,
+    'first_request_ms': (finished - loaded) * 1000,
+    'total_ms': (finished - started) * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def spawn(settings_module, env, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', CHILD]
+    result = subprocess.run(
+        command, capture_output=True, text=True, check=True,
+        env={**env, 'DJANGO_SETTINGS_MODULE': settings_module},
+        stdin=subprocess.DEVNULL,
+    )
+    return json.loads(result.stdout), result.stderr
+
+
+def package(module):
+    """Пакет для разбивки: django.contrib.* и django.* на уровень глубже."""
+    parts = module.split('.')
+    if parts[0] == 'django':
+        depth = 3 if parts[1:2] == ['contrib'] else 2
+        return '.'.join(parts[:depth])
+    return parts[0]
+
+
+def import_breakdown(stderr, top):
+    """Собственное время импорта модулей, сложенное по пакетам, в мс."""
+    totals = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        totals[package(module.strip())] += int(self_us)
+    return {
+        'total_ms': round(sum(totals.values()) / 1000, 1),
+        'packages_ms': {
+            name: round(us / 1000, 1) for name, us in totals.most_common(top)
+        },
+    }, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    db_name = setup_django(args.db)
+
+    from django.test import Client
+
+    from benchmarks.data import create_notes, create_users
+
+    author, = create_users(1)
+    create_notes([author], 50)
+    client = Client()
+    client.force_login(author)
+    env = {
+        **os.environ,
+        'YANOTE_BENCH_DB': db_name,
+        'YANOTE_BENCH_SESSION': client.cookies['sessionid'].value,
+    }
+    results = {}
+    packages = {}
+    for name, settings_module in PROFILES.items():
+        runs = [spawn(settings_module, env)[0] for _ in range(args.runs)]
+        assert runs[0]['status'].startswith('200'), runs[0]['status']
+        _, stderr = spawn(settings_module, env, importtime=True)
+        breakdown, packages[name] = import_breakdown(stderr, args.top)
+        results[name] = {
+            key: round(statistics.median(run[key] for run in runs), 1)
+            for key in ('setup_ms', 'application_ms', 'first_request_ms',
+                        'total_ms', 'rss_mb', 'modules')
+        }
+        results[name]['imports'] = breakdown
+    saved = packages['full'] - packages['api']
+    report('startup', {
+        'runs': args.runs,
+        'profiles': results,
+        'imports_saved_ms': {
+            name: round(us / 1000, 1)
+            for name, us in saved.most_common(args.top)
+        },
+    })
+
+
+if __name__ == '__main__':
+    main()
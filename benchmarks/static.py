@@ -0,0 +1,116 @@
+"""
+Объём ответов и время до первой отрисовки страницы списка.
+
+У автора --notes заметок, страница списка выводит первые
+NOTES_PAGINATE_BY из них. Статика собирается collectstatic во
+временный STATIC_ROOT и отдаётся StaticFilesMiddleware. Режимы —
+Accept-Encoding клиента: identity, gzip и br. Для каждого выводятся
+время ответа страницы и таблицы стилей и байты, которые уходят клиенту.
+
+Отрисовке нужны HTML и таблица стилей из <head>. Время до неё
+оценивается по модели сети с задержкой --rtt-ms и полосой --mbps:
+запрос страницы, затем запрос таблицы стилей по тому же соединению.
+
+- first_visit — таблицы стилей ещё нет в кеше браузера;
+- repeat_visit — только страница: таблица стилей с хешем в имени
+  лежит в кеше и не перепроверяется;
+- cdn — как до своей статики: HTML без сжатия, таблица стилей в br
+  с jsDelivr, но через новое соединение (DNS, TCP и TLS — ещё три RTT).
+
+    python -m benchmarks.static --notes 1000 --requests 50 --rtt-ms 50
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from benchmarks import report, setup_django, summarize, timed
+
+MODES = {'identity': '', 'gzip': 'gzip', 'br': 'gzip, deflate, br'}
+# DNS, TCP и TLS до стороннего хоста.
+CDN_EXTRA_RTTS = 3
+
+
+def transfer(size, mbps):
+    return size * 8 / (mbps * 1_000_000)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--rtt-ms', type=float, default=50)
+    parser.add_argument('--mbps', type=float, default=10)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    static_root = tempfile.mkdtemp(prefix='yanote-bench-static-')
+
+    def configure(settings):
+        settings.STATIC_ROOT = static_root
+
+    setup_django(args.db, configure=configure)
+
+    from django.core.management import call_command
+    from django.templatetags.static import static
+    from django.test import Client
+    from django.urls import reverse
+
+    from benchmarks.data import create_notes, create_users
+
+    started = time.perf_counter()
+    call_command('collectstatic', interactive=False, verbosity=0)
+    collect_seconds = time.perf_counter() - started
+    author, = create_users(1)
+    create_notes([author], args.notes)
+    client = Client()
+    client.force_login(author)
+    list_url = reverse('notes:list')
+    css_url = static('vendor/bootstrap/css/bootstrap.min.css')
+    rtt = args.rtt_ms / 1000
+
+    def measure(url, accept):
+        sizes = []
+        samples = timed(lambda: sizes.append(len(
+            client.get(url, HTTP_ACCEPT_ENCODING=accept).getvalue()
+        )), args.requests)
+        return samples, sizes[-1]
+
+    modes, pages = {}, {}
+    for mode, accept in MODES.items():
+        page_samples, html_bytes = measure(list_url, accept)
+        css_samples, css_bytes = measure(css_url, accept)
+        pages[mode] = rtt + statistics.median(page_samples)
+        html_done = pages[mode] + transfer(html_bytes, args.mbps)
+        css_done = (
+            rtt + statistics.median(css_samples)
+            + transfer(css_bytes, args.mbps)
+        )
+        modes[mode] = {
+            'page': summarize(page_samples),
+            'stylesheet': summarize(css_samples),
+            'html_bytes': html_bytes,
+            'css_bytes': css_bytes,
+            'first_visit_ms': round((html_done + css_done) * 1000, 1),
+            'repeat_visit_ms': round(html_done * 1000, 1),
+        }
+    html_bytes = modes['identity']['html_bytes']
+    cdn = (
+        pages['identity'] + transfer(html_bytes, args.mbps)
+        + (CDN_EXTRA_RTTS + 1) * rtt
+        + transfer(modes['br']['css_bytes'], args.mbps)
+    )
+    report('static', {
+        'notes': args.notes,
+        'rtt_ms': args.rtt_ms,
+        'mbps': args.mbps,
+        'collectstatic_seconds': round(collect_seconds, 2),
+        'modes': modes,
+        'cdn_first_visit_ms': round(cdn * 1000, 1),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Стоимость синхронизации клиента: полный список или журнал изменений.
+
+У автора --notes заметок, между опросами меняются --changes из них.
+Режимы:
+
+- full_list — клиент обходит все страницы api/notes/ по курсору, как
+  до журнала, чтобы найти изменённые заметки;
+- changes — один запрос api/changes/?since=<номер прошлого опроса>.
+
+Кеш страниц сбрасывается перед каждым опросом: изменения заметок его
+и так сбрасывают. Выводятся перцентили времени опроса, запросы к базе
+и объём ответов на опрос.
+
+    python -m benchmarks.sync --notes 5000 --changes 10 --polls 30
+"""
+import argparse
+
+from benchmarks import report, setup_django, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--notes', type=int, default=5000)
+    parser.add_argument('--changes', type=int, default=10)
+    parser.add_argument('--polls', type=int, default=30)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+
+    from benchmarks.data import create_notes, create_users
+    from notes import cache
+    from notes.models import Note, NotesVersion
+
+    author, = create_users(1)
+    create_notes([author], args.notes)
+    client = Client()
+    client.force_login(author)
+    notes = list(Note.objects.filter(author=author).order_by('id'))
+    edited = 0
+
+    def edit():
+        nonlocal edited
+        for _ in range(args.changes):
+            note = notes[edited % len(notes)]
+            note.title = f'Изменена {edited}'
+            note.save()
+            edited += 1
+
+    def full_list():
+        url = reverse('notes:api-list')
+        cursor, size = None, 0
+        while True:
+            data = {'cursor': cursor} if cursor else {}
+            response = client.get(url, data)
+            size += len(response.content)
+            cursor = response.json()['next']
+            if not cursor:
+                return size
+
+    since = 0
+
+    def changes():
+        nonlocal since
+        response = client.get(
+            reverse('notes:api-changes'), {'since': since}
+        )
+        data = response.json()
+        assert len(data['changes']) == args.changes
+        since = data['next']
+        return len(response.content)
+
+    results = {}
+    for name, poll in (('full_list', full_list), ('changes', changes)):
+        samples, queries, sizes = [], 0, []
+        since = NotesVersion.objects.get(user=author).version
+        for _ in range(args.polls):
+            edit()
+            cache.bump_generation(author.pk)
+            with CaptureQueriesContext(connection) as context:
+                samples += timed(lambda: sizes.append(poll()), 1)
+            queries += len(context.captured_queries)
+        results[name] = {
+            **summarize(samples),
+            'queries_per_poll': queries / args.polls,
+            'bytes_per_poll': sum(sizes) // args.polls,
+        }
+    report('sync', {
+        'notes': args.notes,
+        'changes_per_poll': args.changes,
+        'modes': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Время рендеринга списка из 1000 заметок в разных настройках шаблонов.
+
+Одна страница списка выводит все --notes заметок автора. Сравниваются:
+
+- plain — загрузчики без кеша, фрагменты не кешируются;
+- cached_loader — кеширующий загрузчик, который Django включает при
+  DEBUG = False;
+- fragments — кеширующий загрузчик и прогретые фрагменты
+  {% cache %} шапки и строк списка.
+
+Время рендеринга берётся из метрик MetricsMiddleware, то есть это
+время от process_template_response до конца render().
+
+    python -m benchmarks.templates --notes 1000 --requests 50
+"""
+import argparse
+import copy
+
+from benchmarks import report, setup_django, summarize
+
+DUMMY_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def profiles():
+    from django.conf import settings
+
+    plain_templates = copy.deepcopy(settings.TEMPLATES)
+    plain_templates[0]['APP_DIRS'] = False
+    plain_templates[0]['OPTIONS']['loaders'] = UNCACHED_LOADERS
+    no_fragments = {**settings.CACHES, 'template_fragments': DUMMY_CACHE}
+    return {
+        'plain': {'TEMPLATES': plain_templates, 'CACHES': no_fragments},
+        'cached_loader': {'CACHES': no_fragments},
+        'fragments': {},
+    }
+
+
+def measure(client, url, requests):
+    from notes.metrics import registry
+
+    client.get(url)
+    render, total = [], []
+    for _ in range(requests):
+        registry.reset()
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        view = registry.snapshot()['notes:list']
+        render.append(view['render_duration'])
+        total.append(view['duration'])
+    return {
+        'render': summarize(render),
+        'request': summarize(total),
+        'bytes': len(response.content),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+    setup_django(args.db)
+
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    from benchmarks.data import create_notes, create_users
+
+    author, = create_users(1)
+    create_notes([author], args.notes)
+    client = Client()
+    client.force_login(author)
+    url = reverse('notes:list')
+    results = {}
+    for name, overrides in profiles().items():
+        with override_settings(NOTES_PAGINATE_BY=args.notes, **overrides):
+            results[name] = measure(client, url, args.requests)
+    report('templates', {'notes': args.notes, 'profiles': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Накладные расходы ограничения частоты на разрешённых запросах.
+
+Сначала замеряется один вызов ThrottleMiddleware.process_view:
+
+- safe — GET, лимит не проверяется;
+- unlimited — POST на адрес без лимита;
+- allowed — POST на адрес с лимитом, токен есть.
+
+Затем сравнивается полный POST на notes:edit без промежуточного слоя
+и с ним при лимите, который не срабатывает. Вёдра лежат в кеше
+NOTES_RATE_LIMIT_CACHE: по умолчанию в locmem из yanote.settings, с
+--cache memcached — в memcached рабочего профиля (сервер должен быть
+запущен).
+
+    python -m benchmarks.throttle --calls 100000 --requests 300
+"""
+import argparse
+import time
+
+from benchmarks import report, setup_django, summarize, timed
+
+UNLIMITED = (10 ** 9, 1)
+
+
+def per_call(middleware, request, calls):
+    """Среднее время вызова process_view в микросекундах."""
+    started = time.perf_counter()
+    for _ in range(calls):
+        middleware.process_view(request, None, (), {})
+    return round((time.perf_counter() - started) / calls * 1e6, 3)
+
+
+def micro(author, calls):
+    from django.test import RequestFactory, override_settings
+    from django.urls import resolve
+
+    from notes.middleware import ThrottleMiddleware
+
+    middleware = ThrottleMiddleware(lambda request: None)
+    factory = RequestFactory()
+    requests = {
+        'safe': factory.get('/add/'),
+        'unlimited': factory.post('/add/'),
+        'allowed': factory.post('/add/'),
+    }
+    for request in requests.values():
+        request.user = author
+        request.resolver_match = resolve('/add/')
+    limits = {
+        'safe': {'notes:add': UNLIMITED},
+        'unlimited': {},
+        'allowed': {'notes:add': UNLIMITED},
+    }
+    results = {}
+    for name, request in requests.items():
+        with override_settings(NOTES_RATE_LIMITS=limits[name]):
+            per_call(middleware, request, calls // 10)
+            results[name] = per_call(middleware, request, calls)
+    return results
+
+
+def full_request(author, slug, requests):
+    from django.conf import settings
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    url = reverse('notes:edit', args=(slug,))
+    data = {'title': 'Заметка', 'text': 'Текст', 'slug': slug}
+    without = [
+        name for name in settings.MIDDLEWARE
+        if name != 'notes.middleware.ThrottleMiddleware'
+    ]
+    profiles = {
+        'without_throttle': {'MIDDLEWARE': without},
+        'with_throttle': {'NOTES_RATE_LIMITS': {'notes:edit': UNLIMITED}},
+    }
+    results = {}
+    for name, overrides in profiles.items():
+        with override_settings(**overrides):
+            # Клиент собирает цепочку MIDDLEWARE при первом запросе.
+            client = Client()
+            client.force_login(author)
+            timed(lambda: client.post(url, data=data), requests // 10)
+            results[name] = summarize(
+                timed(lambda: client.post(url, data=data), requests)
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--cache', choices=('locmem', 'memcached'),
+                        default='locmem')
+    parser.add_argument('--db', default=None)
+    args = parser.parse_args()
+
+    def configure(settings):
+        if args.cache == 'locmem':
+            from yanote.settings import CACHES
+
+            settings.CACHES = {
+                **settings.CACHES,
+                'rate_limits': CACHES['rate_limits'],
+            }
+
+    setup_django(args.db, configure=configure)
+
+    from benchmarks.data import create_users
+    from notes.models import Note
+
+    author, = create_users(1)
+    note = Note.objects.create(
+        title='Заметка', text='Текст', slug='note', author=author
+    )
+    report('throttle', {
+        'process_view_us': micro(author, args.calls),
+        'edit_request': full_request(author, note.slug, args.requests),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,185 @@
-from django.contrib import admin
+"""
+Админка заметок для таблицы на миллионы строк.
 
+Список не считает COUNT(*) по всей таблице (EstimatedCountPaginator),
+не читает текст заметок и берёт авторов страницы одним запросом к
+default: в шарде таблицы пользователей нет. Поиск идёт
+по полнотекстовому индексу и диапазону уникального индекса slug,
+фильтры — только по индексированным колонкам. Действия обрабатывают
+выбранные заметки порциями по NOTES_BULK_MAX_NOTES через notes.bulk и
+очередь задач, без загрузки объектов и сигналов на каждую заметку.
+При шардировании (notes.shards) видны заметки шарда вошедшего
+сотрудника.
+"""
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, Q
+from django.utils.html import format_html
+
+from . import bulk
 from .models import Note
+from .pagination import EstimatedCountPaginator
+from .queue import enqueue_many
+from .search import get_backend
+
+User = get_user_model()
+
+LIST_FIELDS = ('id', 'title', 'slug', 'updated', 'author')
+
+
+def chunks(queryset, *fields):
+    """Строки queryset порциями по NOTES_BULK_MAX_NOTES в порядке id."""
+    size = settings.NOTES_BULK_MAX_NOTES
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id)[:size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def slug_prefix(term):
+    """Условие «slug начинается с term» диапазоном по индексу."""
+    return Q(slug__gte=term, slug__lt=term[:-1] + chr(ord(term[-1]) + 1))
+
+
+class AuthorFilter(admin.SimpleListFilter):
+    """Фильтр по автору без списка всех пользователей."""
+    title = 'автор'
+    parameter_name = 'author'
+
+    @staticmethod
+    def parse(value):
+        return int(value) if value and value.isdigit() else None
+
+    def author_id(self):
+        return self.parse(self.value())
+
+    def lookups(self, request, model_admin):
+        """Вариант только один — уже выбранный автор."""
+        author_id = self.author_id()
+        if author_id is None:
+            return ()
+        return User.objects.filter(pk=author_id).values_list(
+            'pk', 'username'
+        )
+
+    def queryset(self, request, queryset):
+        author_id = self.author_id()
+        if author_id is not None:
+            return queryset.filter(author_id=author_id)
+        return queryset
+
+
+class StorageFilter(admin.SimpleListFilter):
+    title = 'хранение текста'
+    parameter_name = 'storage'
+
+    def lookups(self, request, model_admin):
+        return (('inline', 'В строке заметки'), ('body', 'В NoteBody'))
+
+    def queryset(self, request, queryset):
+        if self.value() in ('inline', 'body'):
+            return queryset.filter(body__isnull=self.value() == 'inline')
+        return queryset
+
+
+class NoteChangeList(ChangeList):
+
+    def get_queryset(self, request):
+        """
+        Только выводимые в списке поля, без текста.
+
+        Авторы подгружаются отдельным запросом по id: роутер отправляет
+        его в default, а JOIN с пользователями в шарде пуст.
+        """
+        authors = User.objects.only('id', 'username')
+        return super().get_queryset(request).only(
+            *LIST_FIELDS
+        ).prefetch_related(Prefetch('author', queryset=authors))
+
+
+@admin.register(Note)
+class NoteAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'author_link', 'updated')
+    list_select_related = False
+    list_filter = (AuthorFilter, StorageFilter)
+    search_fields = ('title', 'slug')
+    sortable_by = ()
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    autocomplete_fields = ('author',)
+    readonly_fields = ('created', 'updated', 'word_count')
+    actions = ('delete_in_chunks', 'recount_words')
+
+    def get_changelist(self, request, **kwargs):
+        return NoteChangeList
+
+    def get_actions(self, request):
+        """delete_selected загружает и удаляет заметки по одной."""
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Полнотекстовый индекс и начало slug.
+
+        Находки индекса ограничены NOTES_ADMIN_SEARCH_LIMIT лучших. С
+        фильтром по автору индекс ищет только среди его заметок.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        author_id = AuthorFilter.parse(
+            request.GET.get(AuthorFilter.parameter_name)
+        )
+        ids = list(get_backend().search(
+            queryset, term, settings.NOTES_ADMIN_SEARCH_LIMIT,
+            author_id=author_id,
+        ).values_list('pk', flat=True))
+        return queryset.filter(Q(pk__in=ids) | slug_prefix(term)), False
+
+    @admin.display(description='Автор')
+    def author_link(self, note):
+        """Ссылка на список заметок этого автора."""
+        return format_html(
+            '<a href="?{}={}">{}</a>',
+            AuthorFilter.parameter_name, note.author_id,
+            note.author.username,
+        )
+
+    @admin.action(
+        description='Удалить выбранные заметки порциями',
+        permissions=('delete',),
+    )
+    def delete_in_chunks(self, request, queryset):
+        deleted = 0
+        for rows in chunks(queryset, 'author_id', 'slug'):
+            authors = User.objects.in_bulk({row[1] for row in rows})
+            for author_id, author in authors.items():
+                deleted += bulk.delete_notes(author, [
+                    slug for _, row_author, slug in rows
+                    if row_author == author_id
+                ])['count']
+        self.message_user(
+            request, f'Удалено заметок: {deleted}.', messages.SUCCESS
+        )
 
-admin.site.register(Note)
+    @admin.action(
+        description='Пересчитать число слов', permissions=('change',)
+    )
+    def recount_words(self, request, queryset):
+        queued = 0
+        for rows in chunks(queryset):
+            enqueue_many('word_count', [row[0] for row in rows])
+            queued += len(rows)
+        self.message_user(
+            request, f'Заметок в очереди на пересчёт: {queued}.',
+            messages.SUCCESS,
+        )
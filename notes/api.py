@@ -0,0 +1,268 @@
+"""
+Асинхронный JSON API заметок.
+
+Обработчики выполняются в цикле событий ASGI-сервера. Django 3.2 ещё
+не даёт асинхронного ORM, поэтому вся синхронная работа запроса
+(сессия, пользователь, запросы к базе) собрана в одну функцию и
+выполняется одним переходом через sync_to_async.
+
+Журнал изменений (api/changes/) умеет long-poll: пока изменений нет,
+запрос ждёт в цикле событий и раз в NOTES_CHANGES_POLL_INTERVAL
+заглядывает в журнал, не занимая поток.
+"""
+import asyncio
+import json
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import IntegrityError
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed,
+                         JsonResponse)
+from django.shortcuts import get_object_or_404
+
+from . import autocomplete, cache, changes
+from .forms import NoteForm
+from .models import Note, NoteChange
+from .pagination import KeysetPaginator
+
+LIST_FIELDS = ('id', 'title', 'slug')
+DETAIL_FIELDS = ('id', 'title', 'text', 'slug')
+CHANGE_FIELDS = ('id', 'title', 'slug', 'updated')
+
+
+def serialize(note, fields):
+    return {field: getattr(note, field) for field in fields}
+
+
+def error(status, message, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def user_notes(user):
+    return Note.objects.filter(author=user)
+
+
+def call_handler(request, handler, *args):
+    """Синхронная часть запроса: пользователь из сессии и handler."""
+    user = get_user(request)
+    if not user.is_authenticated:
+        return error(HTTPStatus.UNAUTHORIZED, 'Требуется авторизация.')
+    request.user = user
+    try:
+        return handler(request, user, *args)
+    except Http404:
+        return error(HTTPStatus.NOT_FOUND, 'Заметка не найдена.')
+
+
+async def dispatch(request, handlers, *args):
+    """Выбирает handler по методу и выполняет его одним переходом."""
+    handler = handlers.get(request.method)
+    if handler is None:
+        return HttpResponseNotAllowed(handlers)
+    return await sync_to_async(call_handler)(request, handler, *args)
+
+
+def save_form(request, user, instance=None):
+    data = parse_body(request)
+    if data is None:
+        return None, error(HTTPStatus.BAD_REQUEST, 'Ожидается JSON-объект.')
+    if instance is not None and request.method == 'PATCH':
+        data = {**serialize(instance, ('title', 'text', 'slug')), **data}
+    form = NoteForm(data, instance=instance)
+    if form.is_valid():
+        form.instance.author = user
+        try:
+            return form.save(), None
+        except IntegrityError:
+            form.add_slug_taken_error()
+    return None, error(
+        HTTPStatus.BAD_REQUEST, 'Некорректные данные.', errors=form.errors
+    )
+
+
+def list_notes(request, user):
+    """Ключ кеша — из разобранного курсора, как в NotesList."""
+    page_size = settings.NOTES_PAGINATE_BY
+    cursor = request.GET.get('cursor')
+    paginator = KeysetPaginator(user_notes(user).only(*LIST_FIELDS), page_size)
+    try:
+        direction, pivot = paginator.decode_cursor(cursor)
+    except Http404:
+        return error(HTTPStatus.BAD_REQUEST, 'Некорректный курсор страницы.')
+    page = cache.get_or_set(
+        user.pk, 'list', (page_size, direction, pivot),
+        lambda: paginator.page(cursor),
+    )
+    return JsonResponse({
+        'results': [serialize(note, LIST_FIELDS) for note in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def create_note(request, user):
+    note, response = save_form(request, user)
+    if response is not None:
+        return response
+    return JsonResponse(
+        serialize(note, DETAIL_FIELDS), status=HTTPStatus.CREATED
+    )
+
+
+def read_note(request, user, slug):
+    note = cache.get_or_set(
+        user.pk, 'detail', (slug,),
+        lambda: get_object_or_404(user_notes(user), slug=slug),
+    )
+    return JsonResponse(serialize(note, DETAIL_FIELDS))
+
+
+def update_note(request, user, slug):
+    note = get_object_or_404(user_notes(user), slug=slug)
+    note, response = save_form(request, user, note)
+    if response is not None:
+        return response
+    return JsonResponse(serialize(note, DETAIL_FIELDS))
+
+
+def delete_note(request, user, slug):
+    get_object_or_404(user_notes(user), slug=slug).delete()
+    return HttpResponse(status=HTTPStatus.NO_CONTENT)
+
+
+def changes_query(request):
+    """
+    since, floor, limit и wait из строки запроса или None.
+
+    floor — граница сжатия из прошлого ответа.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        floor = int(request.GET.get('floor', 0))
+        limit = int(request.GET.get('limit', settings.NOTES_CHANGES_BATCH))
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        return None
+    if (since < 0 or floor < 0
+            or not 0 < limit <= settings.NOTES_CHANGES_BATCH
+            or not 0 <= wait <= settings.NOTES_CHANGES_MAX_WAIT):
+        return None
+    return since, floor, limit, wait
+
+
+def serialize_change(change):
+    if change.action == NoteChange.DELETE:
+        data = {'id': change.note_id, 'slug': change.slug}
+    else:
+        data = serialize(change.note, CHANGE_FIELDS)
+    return {'seq': change.seq, 'action': change.action, **data}
+
+
+def changes_response(user, since, floor, limit, final=True):
+    """Изменения после since; None, если их нет и ответ не последний."""
+    found, next_seq, more = changes.read(user.pk, since, limit)
+    if next_seq == since and not final:
+        return None
+    return JsonResponse({
+        'changes': [serialize_change(change) for change in found],
+        'next': next_seq,
+        'floor': floor,
+        'more': more,
+    })
+
+
+def read_changes(request, user):
+    query = changes_query(request)
+    if query is None:
+        return error(HTTPStatus.BAD_REQUEST, 'Некорректные параметры.')
+    since, seen, limit, wait = query
+    try:
+        floor = changes.check_floor(user.pk, since, seen)
+    except changes.HistoryCompacted:
+        return error(
+            HTTPStatus.GONE, 'Журнал сжат, нужна полная синхронизация.',
+            reset=True,
+        )
+    request.changes_floor = floor
+    return changes_response(user, since, floor, limit, final=not wait)
+
+
+def complete_titles(request, user):
+    try:
+        limit = int(request.GET.get(
+            'limit', settings.NOTES_AUTOCOMPLETE_LIMIT
+        ))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= settings.NOTES_AUTOCOMPLETE_LIMIT:
+        return error(HTTPStatus.BAD_REQUEST, 'Некорректные параметры.')
+    found = autocomplete.complete(user.pk, request.GET.get('q', ''), limit)
+    return JsonResponse({'results': [
+        dict(zip(LIST_FIELDS, row)) for row in found
+    ]})
+
+
+LIST_HANDLERS = {'GET': list_notes, 'POST': create_note}
+DETAIL_HANDLERS = {
+    'GET': read_note,
+    'PUT': update_note,
+    'PATCH': update_note,
+    'DELETE': delete_note,
+}
+CHANGES_HANDLERS = {'GET': read_changes}
+AUTOCOMPLETE_HANDLERS = {'GET': complete_titles}
+
+
+async def note_list(request):
+    """GET — страница заметок по курсору, POST — новая заметка."""
+    return await dispatch(request, LIST_HANDLERS)
+
+
+async def note_detail(request, slug):
+    """Чтение, изменение и удаление одной заметки по slug."""
+    return await dispatch(request, DETAIL_HANDLERS, slug)
+
+
+async def note_changes(request):
+    """
+    GET ?since=<seq>&floor=<floor> — изменения после since.
+
+    Клиент передаёт next и floor из прошлого ответа; 410 означает, что
+    нужна полная синхронизация с since=0. С wait=N ответ без изменений
+    откладывается, пока они не появятся, но не больше чем на N секунд.
+    """
+    response = await dispatch(request, CHANGES_HANDLERS)
+    if response is not None:
+        return response
+    since, _, limit, wait = changes_query(request)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while response is None:
+        await asyncio.sleep(max(0, min(
+            settings.NOTES_CHANGES_POLL_INTERVAL, deadline - loop.time()
+        )))
+        response = await sync_to_async(changes_response)(
+            request.user, since, request.changes_floor, limit,
+            final=loop.time() >= deadline,
+        )
+    return response
+
+
+async def note_autocomplete(request):
+    """
+    GET ?q=<начало слова>&limit=<k> — заметки для быстрого перехода.
+
+    Ищет по началу любого слова заголовка или slug без учёта регистра
+    и алфавита: «спис» и «spis» находят «Список покупок».
+    """
+    return await dispatch(request, AUTOCOMPLETE_HANDLERS)
@@ -0,0 +1,126 @@
+"""
+Кеш пользователей для AuthenticationMiddleware.
+
+Бэкенд CachedModelBackend хранит загруженных пользователей в памяти
+процесса NOTES_USER_CACHE_TTL секунд, поэтому запрос с уже
+проверенной сессией не читает таблицу пользователей. Запись
+сбрасывается при сохранении и удалении пользователя (смена пароля,
+вход) и при выходе; в других процессах устаревшая запись живёт не
+дольше TTL.
+
+Он же ограничивает пересчёт устаревших хешей при входе: после смены
+хешера или его стоимости каждый вход пользователя со старым хешем
+стоит второго хеширования и записи в базу. Пересчёт идёт не чаще
+NOTES_PASSWORD_UPGRADE_RATE на процесс или общий кеш лимитов,
+остальные входы проверяют старый хеш и пересчитают его позже.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from . import throttle
+
+UPGRADE_KEY = f'{throttle.KEY_PREFIX}:password-upgrade'
+
+
+class UserCache:
+    """Пользователи по первичному ключу с ограниченным временем жизни."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        expires, user = entry
+        if expires < time.monotonic():
+            self.invalidate(user_id)
+            return None
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        if len(self._users) >= settings.NOTES_USER_CACHE_SIZE:
+            self.clear()
+        expires = time.monotonic() + settings.NOTES_USER_CACHE_TTL
+        with self._lock:
+            self._users[user_id] = (expires, copy.copy(user))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users = {}
+
+
+users = UserCache()
+
+
+def normalize_id(user_id):
+    """Ключ из сессии приводится к типу первичного ключа."""
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return user_id
+
+
+def check_password(user, password):
+    """User.check_password с ограничением пересчёта хеша."""
+    def upgrade(raw_password):
+        burst, period = settings.NOTES_PASSWORD_UPGRADE_RATE
+        if throttle.take(UPGRADE_KEY, burst, period):
+            return
+        user.set_password(raw_password)
+        user._password = None
+        user.save(update_fields=['password'])
+    return hashers.check_password(password, user.password, upgrade)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берёт пользователя сессии из кеша."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        """
+        Проверка логина и пароля.
+
+        Отказ — PermissionDenied, а не None: ModelBackend стоит в
+        AUTHENTICATION_BACKENDS только ради старых сессий и не должен
+        хешировать тот же пароль второй раз.
+        """
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Хеш для несуществующего пользователя, как в ModelBackend:
+            # время ответа не выдаёт, есть ли такой логин.
+            user_model().set_password(password)
+            raise PermissionDenied
+        if not check_password(user, password):
+            raise PermissionDenied
+        if not self.user_can_authenticate(user):
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        if not settings.NOTES_USER_CACHE_TTL:
+            return super().get_user(user_id)
+        key = normalize_id(user_id)
+        user = users.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                users.set(key, user)
+        return user
@@ -0,0 +1,141 @@
+"""
+Автодополнение заголовков заметок по началу слов.
+
+Заголовок и slug приводятся к виду slug тем же pytils, что и в
+Note.save: строчные буквы, кириллица в латинице, слова через «-».
+Поэтому «Спис», «spis» и «SPIS» находят «Список покупок». Ключи
+заметки в NoteKey — нормализованный текст с начала каждого слова:
+у «Список покупок» это «spisok-pokupok» и «pokupok». Запрос — тоже
+нормализованный текст, и ключи, которые с него начинаются, лежат в
+индексе (author, key, note) одним диапазоном: поиск читает не больше
+нескольких десятков строк индекса при любом числе заметок.
+
+Ключи обновляются при каждой записи заметки: Note.save (сигнал),
+пакетные операции notes.bulk и перенос между шардами. Удаление
+заметки удаляет её ключи каскадом или в тех же DELETE, что строки
+заметок.
+"""
+from functools import lru_cache
+
+from .models import Note, NoteKey
+
+KEY_LENGTH = NoteKey._meta.get_field('key').max_length
+# Строк индекса на заметку в выдаче: у заметки может быть несколько
+# ключей с одним началом.
+ROWS_PER_NOTE = 4
+
+
+@lru_cache(maxsize=4096)
+def normalize(text):
+    """Текст по правилам slug: pytils, строчные буквы, слова через «-»."""
+    from pytils.translit import slugify
+
+    return slugify(text).strip('-')
+
+
+def words_from(normalized):
+    """Хвосты нормализованного текста с начала каждого слова."""
+    start = 0
+    while True:
+        yield normalized[start:start + KEY_LENGTH]
+        start = normalized.find('-', start) + 1
+        if not start:
+            return
+
+
+def keys(title, slug):
+    """Ключи заметки по заголовку и slug."""
+    return {
+        key
+        for text in (title, slug)
+        for key in words_from(normalize(text))
+        if key
+    }
+
+
+def key_rows(notes):
+    return [
+        NoteKey(author_id=note.author_id, note_id=note.pk, key=key)
+        for note in notes
+        for key in keys(note.title, note.slug)
+    ]
+
+
+def index_notes(notes):
+    """Ключи новых заметок; INSERT делит на части только бэкенд."""
+    NoteKey.objects.bulk_create(key_rows(notes))
+
+
+def reindex_notes(notes):
+    """Ключи заметок после смены заголовка или slug."""
+    unindex([note.pk for note in notes])
+    index_notes(notes)
+
+
+def unindex(note_ids):
+    NoteKey.objects.filter(note_id__in=note_ids).delete()
+
+
+def index_note(note, created=False):
+    """Меняет только ключи, которые появились или пропали."""
+    new = keys(note.title, note.slug)
+    if created:
+        old = set()
+    else:
+        old = set(
+            NoteKey.objects.filter(note_id=note.pk)
+            .values_list('key', flat=True)
+        )
+    if old - new:
+        NoteKey.objects.filter(note_id=note.pk, key__in=old - new).delete()
+    NoteKey.objects.bulk_create(
+        NoteKey(author_id=note.author_id, note_id=note.pk, key=key)
+        for key in new - old
+    )
+
+
+def key_range(prefix):
+    """Ключи, начинающиеся с prefix: от prefix до следующей строки."""
+    return {
+        'key__gte': prefix,
+        'key__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1),
+    }
+
+
+def complete(user_id, query, limit):
+    """
+    Заметки, у которых слово заголовка или slug начинается с query.
+
+    Не больше limit троек (id, title, slug) в алфавитном порядке
+    ключей: первыми идут заметки, чей ключ совпал с запросом целиком.
+    """
+    prefix = normalize(query)[:KEY_LENGTH]
+    if not prefix:
+        return []
+    rows = NoteKey.objects.filter(
+        author_id=user_id, **key_range(prefix)
+    ).order_by('key', 'note_id').values_list(
+        'note_id', 'note__title', 'note__slug'
+    )[:limit * ROWS_PER_NOTE]
+    found = {}
+    for note_id, title, slug in rows:
+        found.setdefault(note_id, (note_id, title, slug))
+        if len(found) == limit:
+            break
+    return list(found.values())
+
+
+def rebuild(batch_size):
+    """Перестраивает ключи заметок шарда, отдавая размер порций."""
+    NoteKey.objects.all().delete()
+    queryset = Note.objects.order_by('pk').only(
+        'id', 'author_id', 'title', 'slug'
+    )
+    last_id = 0
+    while True:
+        notes = list(queryset.filter(pk__gt=last_id)[:batch_size])
+        if not notes:
+            return
+        last_id = notes[-1].pk
+        index_notes(notes)
+        yield len(notes)
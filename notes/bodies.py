@@ -0,0 +1,48 @@
+"""
+Кодирование текстов больших заметок.
+
+Текст длиннее NOTES_BODY_INLINE_LIMIT хранится не в строке
+notes_note, а в notes_notebody: одна строка на каждый различный текст
+по его SHA-256 и куски по NOTES_BODY_CHUNK_SIZE символов, каждый сжат
+отдельно. Кусок можно распаковать без остальных, поэтому страница
+заметки отдаётся потоком, а в колонке text остаётся только начало
+текста для полнотекстового поиска.
+"""
+import hashlib
+import zlib
+
+from django.conf import settings
+
+
+def is_large(text):
+    return len(text) > settings.NOTES_BODY_INLINE_LIMIT
+
+
+def preview(text):
+    """Начало текста, которое остаётся в строке заметки."""
+    return text[:settings.NOTES_BODY_INLINE_LIMIT]
+
+
+def pieces(text):
+    size = settings.NOTES_BODY_CHUNK_SIZE
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def digest(text):
+    """SHA-256 текста в UTF-8 без копии всего текста в байтах."""
+    hasher = hashlib.sha256()
+    for piece in pieces(text):
+        hasher.update(piece.encode())
+    return hasher.hexdigest()
+
+
+def encode(text):
+    for piece in pieces(text):
+        yield zlib.compress(
+            piece.encode(), settings.NOTES_BODY_COMPRESS_LEVEL
+        )
+
+
+def decode(data):
+    return zlib.decompress(bytes(data)).decode()
@@ -0,0 +1,296 @@
+"""
+Массовые операции с заметками.
+
+Импорт и экспорт в формате NDJSON, удаление и смена заголовков
+выбранных заметок. Удаление и смена заголовков выполняются
+постоянным числом запросов при любом числе заметок: сигналы Note
+на каждую заметку не отправляются, их работа (кеш, версия набора,
+история, ключи автодополнения, освобождение NoteBody) делается один
+раз на всю порцию.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+from django.db.models import CASCADE, Value
+from django.db.models.functions import Concat, Left
+from django.utils import timezone
+
+from . import autocomplete, bodies, cache, changes, revisions, slugs
+from .queue import enqueue_many_on_commit, enqueue_on_commit
+from .models import Note, NoteBody, NoteChange
+from .routers import notes_db
+
+SLUG_MAX_LENGTH = Note._meta.get_field('slug').max_length
+TITLE_MAX_LENGTH = Note._meta.get_field('title').max_length
+ALLOCATION_ATTEMPTS = 3
+
+
+class ImportResult:
+    """
+    Итог импорта: сколько создано, ошибки по строкам и скорость.
+
+    Хранятся первые NOTES_BULK_MAX_ERRORS ошибок, error_count считает
+    все.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def add_error(self, line, error):
+        self.error_count += 1
+        if len(self.errors) < settings.NOTES_BULK_MAX_ERRORS:
+            self.errors.append({'line': line, 'error': str(error)})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def notes_per_second(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'errors': self.errors,
+            'error_count': self.error_count,
+            'seconds': round(self.seconds, 3),
+            'notes_per_second': round(self.notes_per_second, 1),
+        }
+
+
+def parse_record(line):
+    """Проверяет строку NDJSON и возвращает поля заметки."""
+    if isinstance(line, bytes):
+        line = line.decode()
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError('ожидается JSON-объект')
+    title = record.get('title')
+    text = record.get('text')
+    slug = record.get('slug') or ''
+    if not isinstance(title, str) or not title:
+        raise ValueError('нет заголовка')
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError('слишком длинный заголовок')
+    if not isinstance(text, str) or not text:
+        raise ValueError('нет текста')
+    if not isinstance(slug, str) or len(slug) > SLUG_MAX_LENGTH:
+        raise ValueError('некорректный slug')
+    if slug:
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise ValueError('некорректный slug')
+    return {'title': title, 'text': text, 'slug': slug}
+
+
+def allocate_slugs(notes):
+    """Назначает порции автора свободные slug, разводя повторы в памяти."""
+    bases = [note.slug or slugs.slugify_title(note.title) for note in notes]
+    allocated = slugs.allocate_many(
+        Note.objects.filter(author_id=notes[0].author_id), bases
+    )
+    for note, slug in zip(notes, allocated):
+        note.slug = slug
+
+
+def save_chunk(notes):
+    """Сохраняет порцию в одной транзакции, повторяя при гонке за slug."""
+    for attempt in range(ALLOCATION_ATTEMPTS):
+        allocate_slugs(notes)
+        try:
+            with transaction.atomic(using=notes_db()):
+                for note in notes:
+                    if bodies.is_large(note.text):
+                        note.body = NoteBody.store(note.text)
+                Note.objects.bulk_create(notes)
+                revisions.snapshot_many(notes)
+                autocomplete.index_notes(notes)
+                changes.record(notes[0].author_id, NoteChange.CREATE, (
+                    (note.pk, note.slug) for note in notes
+                ))
+            return
+        except IntegrityError:
+            if attempt == ALLOCATION_ATTEMPTS - 1:
+                raise
+
+
+def import_notes(author, lines, chunk_size=None):
+    """Импортирует заметки автора из итератора строк NDJSON."""
+    chunk_size = chunk_size or settings.NOTES_BULK_CHUNK_SIZE
+    result = ImportResult()
+    chunk = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            fields = parse_record(line)
+        except ValueError as error:
+            result.add_error(number, error)
+            continue
+        chunk.append(Note(author=author, **fields))
+        if len(chunk) == chunk_size:
+            save_chunk(chunk)
+            result.created += len(chunk)
+            chunk = []
+    if chunk:
+        save_chunk(chunk)
+        result.created += len(chunk)
+    if result.created:
+        cache.invalidate_user(author.pk)
+        enqueue_on_commit('word_count_backfill', author.pk)
+    return result.finish()
+
+
+def export_notes(author, chunk_size=None):
+    """
+    Отдаёт заметки автора строками NDJSON.
+
+    Заметки читаются порциями по id, поэтому в памяти одновременно
+    находится не больше chunk_size заметок. Текст, вынесенный в
+    NoteBody, выгружается целиком.
+    """
+    chunk_size = chunk_size or settings.NOTES_BULK_CHUNK_SIZE
+    queryset = Note.objects.filter(author=author).order_by('id')
+    last_id = 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).values(
+                'id', 'title', 'text', 'body_id', 'slug'
+            )[:chunk_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        yield ''.join(
+            json.dumps(
+                {
+                    'title': row['title'],
+                    'text': (row['text'] if row['body_id'] is None
+                             else NoteBody.read(row['body_id'])),
+                    'slug': row['slug'],
+                },
+                ensure_ascii=False,
+            ) + '\n'
+            for row in rows
+        )
+
+
+def changed(author, action, rows, requested, record=True):
+    """
+    Сброс кешей автора, журнал и отчёт: что изменено и каких slug нет.
+
+    rows — пары (id, slug) изменённых заметок; record=False — кеш и
+    журнал уже обновили сигналы.
+    """
+    found = [slug for _, slug in rows]
+    if found and record:
+        cache.invalidate_user(author.pk)
+        changes.record(author.pk, action, rows)
+    return {
+        'count': len(found),
+        'slugs': sorted(found),
+        'missing': sorted(set(requested) - set(found)),
+    }
+
+
+def unsupported_relations():
+    """Связи с заметкой, которые raw_delete не удаляет одним DELETE."""
+    return [
+        relation for relation in Note._meta.related_objects
+        if relation.on_delete is not CASCADE
+    ]
+
+
+def raw_delete(notes):
+    """
+    Удаляет заметки queryset notes без Collector и сигналов.
+
+    Collector загрузил бы каждую заметку и отправил post_delete на
+    каждую. Строки, которые ссылаются на заметки, удаляются по связям
+    из Note._meta.related_objects, одним DELETE на связь: новая связь с
+    CASCADE удаляется без правок здесь. Связь с другим on_delete
+    отмечает системная проверка notes.W001, а удаление идёт обычным
+    QuerySet.delete() с сигналами. Возвращает False, если сигналы не
+    отправлялись и работу обработчиков post_delete делает вызывающий
+    код.
+    """
+    if unsupported_relations():
+        notes.delete()
+        return True
+    for relation in Note._meta.related_objects:
+        relation.related_model._base_manager.filter(**{
+            f'{relation.field.name}__in': notes.values('pk'),
+        }).delete()
+    notes._raw_delete(notes.db)
+    return False
+
+
+def delete_notes(author, requested):
+    """
+    Удаляет заметки автора с данными slug.
+
+    Строки заметок и ссылающиеся на них строки удаляются без загрузки
+    объектов (raw_delete); тексты из NoteBody освобождает фоновая
+    задача.
+    """
+    with transaction.atomic(using=notes_db()):
+        rows = list(
+            Note.objects.filter(author=author, slug__in=requested)
+            .values_list('id', 'slug', 'body_id')
+        )
+        signalled = raw_delete(Note.objects.filter(pk__in=[
+            note_id for note_id, _, _ in rows
+        ]))
+        if not signalled:
+            enqueue_many_on_commit('release_note_body', {
+                body_id for _, _, body_id in rows if body_id is not None
+            })
+        return changed(author, NoteChange.DELETE, [
+            (note_id, slug) for note_id, slug, _ in rows
+        ], requested, record=not signalled)
+
+
+def retitle_notes(author, requested, title=None, prefix=None):
+    """
+    Меняет заголовок заметок автора с данными slug.
+
+    Новый заголовок — title или prefix перед прежним заголовком. Все
+    заметки меняются одним UPDATE, версии истории добавляются одним
+    INSERT; гонка за номер версии решается повтором всей порции.
+    """
+    if prefix is not None:
+        expression = Left(Concat(Value(prefix), 'title'), TITLE_MAX_LENGTH)
+    else:
+        expression = Value(title)
+    for attempt in range(ALLOCATION_ATTEMPTS):
+        try:
+            with transaction.atomic(using=notes_db()):
+                notes = list(revisions.with_latest(
+                    Note.objects.filter(author=author, slug__in=requested)
+                ).only('id', 'author_id', 'slug', 'title'))
+                Note.objects.filter(
+                    pk__in=[note.pk for note in notes]
+                ).update(title=expression, updated=timezone.now())
+                for note in notes:
+                    note.title = (
+                        title if prefix is None
+                        else (prefix + note.title)[:TITLE_MAX_LENGTH]
+                    )
+                revisions.retitle_many(notes)
+                autocomplete.reindex_notes(notes)
+                return changed(author, NoteChange.UPDATE, [
+                    (note.pk, note.slug) for note in notes
+                ], requested)
+        except IntegrityError:
+            if attempt == ALLOCATION_ATTEMPTS - 1:
+                raise
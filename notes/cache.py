@@ -0,0 +1,105 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, transaction
+
+from .routers import notes_db
+
+MISSING = object()
+
+
+class CacheStats:
+    """Счётчики попаданий и промахов кеша в текущем процессе."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[settings.NOTES_CACHE_ALIAS]
+
+
+def generation_key(user_id):
+    return f'notes:generation:{user_id}'
+
+
+def get_generation(user_id):
+    """
+    Текущее поколение кеша пользователя.
+
+    Начальное значение берётся из часов, чтобы после вытеснения ключа
+    поколение не совпало с одним из прежних.
+    """
+    cache = get_cache()
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """Делает все записи пользователя недостижимыми."""
+    cache = get_cache()
+    key = generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """
+    Сбрасывает кеш пользователя сразу и ещё раз после коммита.
+
+    Повторный сброс не даёт параллельному запросу закешировать данные,
+    прочитанные до коммита, под уже новым поколением.
+    """
+    bump_generation(user_id)
+    using = notes_db()
+    if connections[using].in_atomic_block:
+        transaction.on_commit(lambda: bump_generation(user_id), using=using)
+
+
+def get_or_set(user_id, name, parts, compute):
+    """Значение из кеша по ключу пользователя или результат compute()."""
+    generation = get_generation(user_id)
+    suffix = ':'.join(str(part) for part in parts)
+    key = f'notes:{name}:{user_id}:{generation}:{suffix}'
+    cache = get_cache()
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        stats.record(hit=True)
+        return value
+    stats.record(hit=False)
+    value = compute()
+    cache.set(key, value, settings.NOTES_CACHE_TIMEOUT)
+    return value
@@ -0,0 +1,141 @@
+"""
+Журнал изменений заметок для синхронизации клиентов.
+
+Каждое создание, изменение и удаление заметки добавляет запись
+NoteChange с номером seq, который растёт в пределах пользователя.
+Клиент хранит последний полученный номер и спрашивает только то, что
+случилось после него, поэтому синхронизация стоит O(изменений), а не
+O(заметок). Удалённая заметка остаётся в журнале записью DELETE.
+
+Номера выделяет тот же UPDATE NotesVersion, что сдвигает версию для
+ETag: строка версии заблокирована до конца транзакции, поэтому номера
+пользователя становятся видны в порядке возрастания. Версию двигают и
+изменения вне журнала (число слов), так что в номерах бывают пропуски.
+
+Сжатие (compact) удаляет записи, за которыми у той же заметки есть
+более новая, и записи DELETE старше срока хранения. Последняя запись
+живой заметки не удаляется никогда, поэтому чтение с since=0 — полный
+снимок заметок. Номер последней удалённой записи DELETE запоминается в
+NotesVersion.changes_floor. Клиент получает его вместе с изменениями;
+если с тех пор граница поднялась выше его номера, он мог не узнать об
+удалении и нуждается в полной синхронизации.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, Max, OuterRef
+from django.utils import timezone
+
+from .models import Note, NoteChange, NotesVersion
+from .routers import notes_db
+
+NOTE_FIELDS = ('id', 'title', 'slug', 'updated', 'author_id')
+
+
+class HistoryCompacted(Exception):
+    """Записи после since удалены сжатием журнала."""
+
+
+def record(user_id, action, notes):
+    """Добавляет в журнал по записи action на каждую пару (id, slug)."""
+    notes = list(notes)
+    if not notes:
+        return
+    with transaction.atomic(using=notes_db()):
+        versions = NotesVersion.objects.filter(user_id=user_id)
+        bump = {
+            'version': F('version') + len(notes),
+            'updated': timezone.now(),
+        }
+        if not versions.update(**bump):
+            NotesVersion.objects.get_or_create(user_id=user_id)
+            versions.update(**bump)
+        last = versions.values_list('version', flat=True).get()
+        first = last - len(notes) + 1
+        NoteChange.objects.bulk_create(
+            NoteChange(
+                user_id=user_id, seq=seq, note_id=note_id, slug=slug,
+                action=action,
+            )
+            for seq, (note_id, slug) in enumerate(notes, first)
+        )
+
+
+def check_floor(user_id, since, seen=0):
+    """
+    Граница сжатия журнала пользователя.
+
+    HistoryCompacted, если с тех пор, как клиент видел границу seen,
+    сжатие удалило записи после since. Клиент с since=0 ещё ничего не
+    знает, ему удалённое не нужно.
+    """
+    floor = NotesVersion.objects.filter(
+        user_id=user_id
+    ).values_list('changes_floor', flat=True).first() or 0
+    if 0 < since < floor and seen < floor:
+        raise HistoryCompacted
+    return floor
+
+
+def read(user_id, since, limit):
+    """
+    До limit записей после since и признак, что записи ещё есть.
+
+    Из нескольких записей одной заметки в порции остаётся последняя.
+    Записи CREATE и UPDATE получают атрибут note — заметку в текущем
+    состоянии; если заметки уже нет, запись пропускается: её DELETE
+    идёт дальше в журнале. Вторым значением возвращается номер, с
+    которого читать дальше.
+    """
+    rows = list(
+        NoteChange.objects.filter(user_id=user_id, seq__gt=since)
+        .order_by('seq').only('seq', 'note_id', 'slug', 'action')
+        [:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], since, False
+    latest = {}
+    for change in rows:
+        latest.pop(change.note_id, None)
+        latest[change.note_id] = change
+    notes = Note.objects.filter(author_id=user_id).only(
+        *NOTE_FIELDS
+    ).in_bulk([
+        change.note_id for change in latest.values()
+        if change.action != NoteChange.DELETE
+    ])
+    changes = []
+    for change in latest.values():
+        if change.action != NoteChange.DELETE:
+            change.note = notes.get(change.note_id)
+            if change.note is None:
+                continue
+        changes.append(change)
+    return changes, rows[-1].seq, more
+
+
+def compact(before):
+    """
+    Сжимает журнал всех пользователей.
+
+    Удаляет записи, за которыми у заметки есть более новая, и записи
+    DELETE, сделанные раньше before. Возвращает числа удалённых
+    записей обоих видов.
+    """
+    with transaction.atomic(using=notes_db()):
+        superseded, _ = NoteChange.objects.filter(Exists(
+            NoteChange.objects.filter(
+                user_id=OuterRef('user_id'), note_id=OuterRef('note_id'),
+                seq__gt=OuterRef('seq'),
+            )
+        )).delete()
+        expired = NoteChange.objects.filter(
+            action=NoteChange.DELETE, created__lt=before
+        )
+        floors = expired.values_list('user_id').annotate(Max('seq'))
+        for user_id, floor in floors.order_by():
+            NotesVersion.objects.filter(
+                user_id=user_id, changes_floor__lt=floor
+            ).update(changes_floor=floor)
+        deleted, _ = expired.delete()
+    return superseded, deleted
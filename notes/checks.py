@@ -0,0 +1,19 @@
+from django.core.checks import Tags, Warning, register
+
+from .bulk import unsupported_relations
+
+
+@register(Tags.models)
+def check_bulk_delete(app_configs, **kwargs):
+    """Пакетное удаление заметок без Collector знает только CASCADE."""
+    return [
+        Warning(
+            f'{relation.related_model.__name__}.{relation.field.name}: '
+            f'пакетное удаление заметок умеет только CASCADE.',
+            hint='Удаление пойдёт через QuerySet.delete() с сигналами; '
+                 'добавьте обработку связи в notes.bulk.raw_delete.',
+            obj=relation.field,
+            id='notes.W001',
+        )
+        for relation in unsupported_relations()
+    ]
@@ -0,0 +1,64 @@
+"""
+Сжатие ответов и статики: brotli и gzip.
+
+Кодировку выбирает сервер в порядке ENCODINGS из тех, что клиент
+перечислил в Accept-Encoding без q=0. Потоковое сжатие сбрасывает
+сжатые байты после каждого куска ответа: куски доходят до клиента по
+мере рендеринга, а не в конце ответа.
+"""
+import gzip
+import zlib
+from functools import partial
+
+import brotli
+
+ENCODINGS = ('br', 'gzip')
+
+
+def accepted(accept_encoding):
+    """Кодировки из заголовка Accept-Encoding, кроме отвергнутых q=0."""
+    codings = set()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = params.strip().lower()
+        if quality.startswith('q=') and not quality[2:].strip('0. '):
+            continue
+        codings.add(coding.strip().lower())
+    return codings
+
+
+def choose(accept_encoding, available=ENCODINGS):
+    """Первая из available, которую принимает клиент, иначе None."""
+    codings = accepted(accept_encoding)
+    for encoding in available:
+        if encoding in codings:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level):
+    """Сжатие целиком; level — quality для br и уровень для gzip."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, level, mtime=0)
+
+
+def compress_stream(chunks, encoding, level):
+    """Сжатый поток: после каждого куска — сброс сжатых байтов."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        process, flush = compressor.process, compressor.flush
+        finish = compressor.finish
+    else:
+        # 16 + MAX_WBITS — заголовок и контрольная сумма gzip.
+        compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        process = compressor.compress
+        flush = partial(compressor.flush, zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    for chunk in chunks:
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
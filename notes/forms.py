@@ -1,7 +1,7 @@
-from pytils.translit import slugify
-
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
 
 from .models import Note
 
@@ -15,15 +15,63 @@ class NoteForm(forms.ModelForm):
         model = Note
         fields = ('title', 'text', 'slug')
 
-    def clean_slug(self):
-        """Обрабатывает случай, если slug не уникален."""
+    def validate_unique(self):
+        """
+        Уникальность slug обеспечивает база при сохранении.
+
+        Пустой slug подберёт Note.save, а занятый явно указанный slug
+        превращается в ошибку формы в представлении, поэтому отдельный
+        запрос на проверку перед сохранением не нужен.
+        """
+        exclude = [*self._get_validation_exclusions(), 'slug']
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as error:
+            self._update_errors(error)
+
+    def add_slug_taken_error(self):
+        slug = self.cleaned_data['slug']
+        self.add_error('slug', slug + WARNING)
+
+
+class SlugListField(forms.Field):
+    """Повторяющееся поле со slug выбранных заметок."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            raise ValidationError('Ожидается список заметок.')
+        return list(dict.fromkeys(str(slug) for slug in value))
+
+    def validate(self, value):
+        super().validate(value)
+        limit = settings.NOTES_BULK_MAX_NOTES
+        if len(value) > limit:
+            raise ValidationError(f'Не больше {limit} заметок за раз.')
+        for slug in value:
+            validate_slug(slug)
+
+
+class BulkDeleteForm(forms.Form):
+    """Выбор заметок для массовой операции."""
+    slugs = SlugListField(label='Заметки')
+
+
+class BulkUpdateForm(BulkDeleteForm):
+    """Новый заголовок или приставка к заголовку выбранных заметок."""
+    title = forms.CharField(
+        label='Заголовок', max_length=Note._meta.get_field('title').max_length,
+        required=False,
+    )
+    prefix = forms.CharField(
+        label='Приставка к заголовку', max_length=50, required=False,
+        strip=False,
+    )
+
+    def clean(self):
         cleaned_data = super().clean()
-        slug = cleaned_data.get('slug')
-        if not slug:
-            title = cleaned_data.get('title')
-            slug = slugify(title)[:100]
-        if Note.objects.filter(
-                slug=slug
-        ).exclude(id=self.instance.pk).exists():
-            raise ValidationError(slug + WARNING)
-        return slug
+        if bool(cleaned_data.get('title')) == bool(cleaned_data.get('prefix')):
+            raise ValidationError('Укажите либо заголовок, либо приставку.')
+        return cleaned_data
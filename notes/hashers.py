@@ -0,0 +1,199 @@
+"""
+Хеширование паролей вне рабочего процесса.
+
+Вход и регистрация считают хеш пароля, а это сотни миллисекунд
+процессора. Сам вывод ключа (scrypt или PBKDF2) выполняется в пуле из
+NOTES_PASSWORD_HASH_WORKERS процессов с пониженным на
+NOTES_PASSWORD_HASH_NICE приоритетом: при волне входов хеши занимают
+не больше этого числа ядер, а запросы к заметкам их вытесняют. Ждать
+свободного процесса могут не больше NOTES_PASSWORD_HASH_QUEUE хешей,
+следующий получает PasswordHashBusy, и ThrottleMiddleware отвечает 503.
+При нуле процессов хеш считается в рабочем потоке, как в Django.
+
+Пул ограничивает процессор, а не ускоряет вход: поток запроса ждёт
+хеш целиком, и передача аргументов в процесс пула добавляет к нему
+около миллисекунды (scrypt с n = 2 ** 14 — около 60 мс на ядро).
+Выигрывают остальные запросы: они не стоят в очереди к процессору за
+волной входов. Само время входа задаёт NOTES_SCRYPT_WORK_FACTOR.
+"""
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+# Запас памяти для scrypt сверх 128 * n * r * p байт.
+SCRYPT_MAXMEM_FACTOR = 2
+
+
+class PasswordHashBusy(Exception):
+    """Все процессы пула заняты, и очередь к ним заполнена."""
+
+
+class HashPool:
+    """Пул процессов для хеширования, создаётся при первом хеше."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                workers = settings.NOTES_PASSWORD_HASH_WORKERS
+                self._slots = threading.BoundedSemaphore(
+                    workers + settings.NOTES_PASSWORD_HASH_QUEUE
+                )
+                self._executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=os.nice,
+                    initargs=(settings.NOTES_PASSWORD_HASH_NICE,),
+                )
+            return self._executor, self._slots
+
+    def run(self, func, *args, **kwargs):
+        """
+        func(*args, **kwargs) в процессе пула.
+
+        Вызывающий поток ждёт результата: пул держит хеширование в
+        NOTES_PASSWORD_HASH_WORKERS ядрах с низким приоритетом, но не
+        сокращает время одного хеша.
+
+        Демон-процесс (процесс multiprocessing.Pool, рабочий процесс
+        параллельных тестов) не может запускать дочерние и считает хеш
+        сам.
+        """
+        if (not settings.NOTES_PASSWORD_HASH_WORKERS
+                or multiprocessing.current_process().daemon):
+            return func(*args, **kwargs)
+        executor, slots = self.start()
+        if not slots.acquire(blocking=False):
+            raise PasswordHashBusy
+        try:
+            return executor.submit(func, *args, **kwargs).result()
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+        finally:
+            slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor, self._slots = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+pool = HashPool()
+
+
+@receiver(setting_changed)
+def reset_pool(*, setting, **kwargs):
+    if setting.startswith('NOTES_PASSWORD_HASH_'):
+        pool.shutdown()
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2PasswordHasher из Django, который считает хеш в пуле."""
+
+    def encode(self, password, salt, iterations=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        iterations = iterations or self.iterations
+        hash_ = pool.run(
+            hashlib.pbkdf2_hmac, self.digest().name,
+            password.encode(), salt.encode(), iterations,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, hash_)
+
+
+class ScryptPasswordHasher(hashers.BasePasswordHasher):
+    """
+    scrypt из hashlib с параметрами NOTES_SCRYPT_*.
+
+    Хеш записывается как scrypt$n$соль$r$p$хеш, в формате
+    ScryptPasswordHasher из Django 4.0.
+    """
+
+    algorithm = 'scrypt'
+
+    @staticmethod
+    def params():
+        return (
+            settings.NOTES_SCRYPT_WORK_FACTOR,
+            settings.NOTES_SCRYPT_BLOCK_SIZE,
+            settings.NOTES_SCRYPT_PARALLELISM,
+        )
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        work_factor, block_size, parallelism = self.params()
+        n = n or work_factor
+        r = r or block_size
+        p = p or parallelism
+        hash_ = pool.run(
+            hashlib.scrypt, password.encode(), salt=salt.encode(),
+            n=n, r=r, p=p, maxmem=SCRYPT_MAXMEM_FACTOR * 128 * n * r * p,
+            dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash_)
+
+    def decode(self, encoded):
+        algorithm, n, salt, r, p, hash_ = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return {
+            'algorithm': algorithm,
+            'work_factor': int(n),
+            'salt': salt,
+            'block_size': int(r),
+            'parallelism': int(p),
+            'hash': hash_,
+        }
+
+    def verify(self, password, encoded):
+        decoded = self.decode(encoded)
+        encoded_2 = self.encode(
+            password, decoded['salt'], decoded['work_factor'],
+            decoded['block_size'], decoded['parallelism'],
+        )
+        return constant_time_compare(encoded, encoded_2)
+
+    def safe_summary(self, encoded):
+        decoded = self.decode(encoded)
+        return {
+            _('algorithm'): decoded['algorithm'],
+            _('work factor'): decoded['work_factor'],
+            _('block size'): decoded['block_size'],
+            _('parallelism'): decoded['parallelism'],
+            _('salt'): hashers.mask_hash(decoded['salt']),
+            _('hash'): hashers.mask_hash(decoded['hash']),
+        }
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        current = (
+            decoded['work_factor'],
+            decoded['block_size'],
+            decoded['parallelism'],
+        )
+        return current != self.params() or hashers.must_update_salt(
+            decoded['salt'], self.salt_entropy
+        )
+
+    def harden_runtime(self, password, encoded):
+        # Время scrypt не выровнять добавочной работой, как у PBKDF2.
+        pass
@@ -0,0 +1,37 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notes import changes, shards
+from notes.routers import on_shard
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из журнала изменений устаревшие записи и старые '
+            'записи об удалении заметок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Сколько дней хранить записи об удалении.',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days is None:
+            days = settings.NOTES_CHANGES_RETENTION_DAYS
+        if days < 0:
+            raise CommandError('--days >= 0')
+        before = timezone.now() - datetime.timedelta(days=days)
+        superseded = expired = 0
+        for alias in shards.aliases():
+            with on_shard(alias):
+                shard_superseded, shard_expired = changes.compact(before)
+            superseded += shard_superseded
+            expired += shard_expired
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено устаревших записей: {superseded}, '
+            f'записей об удалении: {expired}'
+        ))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes import revisions, shards
+from notes.models import NoteRevision
+from notes.routers import on_shard
+
+
+class Command(BaseCommand):
+    help = ('Удаляет старые версии заметок и перекодирует историю '
+            'снимками и разницами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep', type=int, default=None,
+            help='Сколько последних версий оставить у каждой заметки.',
+        )
+        parser.add_argument(
+            '--snapshot-every', type=int, default=None,
+            help='Полный текст в каждой N-й версии.',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('keep', 'snapshot_every'):
+            if options[option] is not None and options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} >= 1')
+        deleted = rewritten = 0
+        for alias in shards.aliases():
+            with on_shard(alias):
+                shard_deleted, shard_rewritten = self.compact(
+                    alias, options['keep'], options['snapshot_every']
+                )
+            deleted += shard_deleted
+            rewritten += shard_rewritten
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено версий: {deleted}, перезаписано: {rewritten}'
+        ))
+
+    @staticmethod
+    def compact(alias, keep, snapshot_every):
+        """История заметок одного шарда; по транзакции на заметку."""
+        note_ids = list(
+            NoteRevision.objects.order_by('note_id')
+            .values_list('note_id', flat=True).distinct()
+        )
+        deleted = rewritten = 0
+        for note_id in note_ids:
+            with transaction.atomic(using=alias):
+                note_deleted, note_rewritten = revisions.compact(
+                    note_id, keep, snapshot_every
+                )
+            deleted += note_deleted
+            rewritten += note_rewritten
+        return deleted, rewritten
@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards
+from notes.bulk import export_notes
+
+
+class Command(BaseCommand):
+    help = 'Выгружает заметки пользователя в файл NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл NDJSON, по умолчанию стандартный вывод.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        started = time.perf_counter()
+        exported = 0
+        output = (
+            sys.stdout if options['path'] == '-'
+            else open(options['path'], 'w', encoding='utf-8')
+        )
+        try:
+            with shards.for_user(author.pk):
+                for chunk in export_notes(author, options['chunk_size']):
+                    output.write(chunk)
+                    exported += chunk.count('\n')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        seconds = time.perf_counter() - started
+        rate = exported / seconds if seconds else 0
+        self.stderr.write(
+            f'Выгружено заметок: {exported} за {seconds:.2f} с '
+            f'({rate:.0f} заметок/с)'
+        )
@@ -0,0 +1,47 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards
+from notes.bulk import import_notes
+
+
+class Command(BaseCommand):
+    help = 'Импортирует заметки пользователя из файла NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл NDJSON, по умолчанию стандартный ввод.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        with shards.for_user(author.pk):
+            if options['path'] == '-':
+                result = import_notes(
+                    author, sys.stdin, options['chunk_size']
+                )
+            else:
+                with open(options['path'], encoding='utf-8') as lines:
+                    result = import_notes(
+                        author, lines, options['chunk_size']
+                    )
+        for error in result.errors:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(
+                f'И ещё ошибок: {result.error_count - len(result.errors)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано заметок: {result.created} '
+            f'за {result.seconds:.2f} с '
+            f'({result.notes_per_second:.0f} заметок/с)'
+        ))
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import shards
+
+
+class Command(BaseCommand):
+    help = ('Переносит пользователей между шардами заметок, выравнивая '
+            'число заметок в шардах, или одного пользователя в шард --to.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default=None,
+            help='Имя пользователя, которого перенести в шард --to.',
+        )
+        parser.add_argument('--to', default=None, help='Шард для --user.')
+        parser.add_argument(
+            '--max-moves', type=int, default=10,
+            help='Сколько пользователей перенести за запуск.',
+        )
+        parser.add_argument(
+            '--grace', type=float, default=None,
+            help='Пауза перед копированием, по умолчанию '
+                 'NOTES_SHARD_MOVE_GRACE секунд.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только вывести план переносов.',
+        )
+
+    def handle(self, *args, **options):
+        if not shards.enabled():
+            raise CommandError('В NOTES_SHARDS одна база.')
+        if (options['user'] is None) != (options['to'] is None):
+            raise CommandError('--user и --to указываются вместе.')
+        if options['user'] is not None:
+            moves = [self.user_move(options['user'], options['to'])]
+        else:
+            moves = shards.plan_moves(
+                shards.note_counts(), options['max_moves']
+            )
+        for user_id, source, target in moves:
+            if options['dry_run']:
+                self.stdout.write(f'{user_id}: {source} -> {target}')
+                continue
+            moved = shards.move_user(user_id, target, options['grace'])
+            self.stdout.write(
+                f'{user_id}: {source} -> {target}, заметок: {moved}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Переносов: {len(moves)}'))
+
+    @staticmethod
+    def user_move(username, target):
+        if target not in shards.aliases():
+            raise CommandError(f'Шарда {target} нет в NOTES_SHARDS.')
+        User = get_user_model()
+        try:
+            user_id = User.objects.get(username=username).pk
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        return user_id, shards.placement(user_id)[0], target
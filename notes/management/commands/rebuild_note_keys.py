@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from notes import autocomplete, shards
+from notes.routers import on_shard
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает ключи автодополнения заметок порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок индексировать за один INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in shards.aliases():
+            with on_shard(alias):
+                for indexed in autocomplete.rebuild(options['batch_size']):
+                    total += indexed
+                    self.stdout.write(f'Проиндексировано заметок: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ключи перестроены, всего заметок: {total}'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from notes import shards
+from notes.routers import on_shard
+from notes.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс заметок порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for alias in shards.aliases():
+            with on_shard(alias):
+                for indexed in get_backend().rebuild(options['batch_size']):
+                    total += indexed
+                    self.stdout.write(f'Проиндексировано заметок: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен, всего заметок: {total}'
+        ))
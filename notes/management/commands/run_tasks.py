@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notes import queue, shards
+from notes.routers import on_shard
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди notes_task всех шардов '
+            'заметок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Сколько задач забирать за один запрос.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        if options['once']:
+            done = failed = 0
+            for alias in shards.aliases():
+                with on_shard(alias):
+                    shard_done, shard_failed = queue.run_pending(
+                        options['batch_size']
+                    )
+                done += shard_done
+                failed += shard_failed
+            self.report(done, failed)
+            return
+        interval = (options['poll_interval']
+                    or settings.NOTES_TASK_POLL_INTERVAL)
+        try:
+            while True:
+                close_old_connections()
+                idle = True
+                for alias in shards.aliases():
+                    with on_shard(alias):
+                        tasks = queue.claim(options['batch_size'])
+                        if tasks:
+                            idle = False
+                            self.report(*queue.process(tasks))
+                if idle:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено.')
+
+    def report(self, done, failed):
+        if self.verbosity or failed:
+            self.stdout.write(
+                f'Выполнено задач: {done}, отложено: {failed}'
+            )
@@ -0,0 +1,204 @@
+"""
+Метрики запросов в памяти процесса и их вывод в формате Prometheus.
+
+Эндпоинт метрик живёт здесь, а не в notes.views, чтобы облегчённый
+профиль yanote.settings_api не импортировал представления страниц.
+
+Агрегаты обновляются под одной блокировкой несколькими сложениями,
+поэтому учёт запроса почти ничего не стоит. SQL-запросы считает обёртка
+execute_wrapper, которая пишет в объект текущего запроса из ContextVar:
+так учитываются и запросы, выполненные в потоках sync_to_async.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.views import View
+
+from . import cache, queue
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = '<unresolved>'
+
+current_request = ContextVar('notes_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса."""
+
+    __slots__ = ('queries', 'query_duration', 'render_started',
+                 'render_duration')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_duration = 0.0
+        self.render_started = None
+        self.render_duration = 0.0
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response=None):
+        if self.render_started is not None:
+            self.render_duration += time.perf_counter() - self.render_started
+            self.render_started = None
+
+
+class ViewMetrics:
+    """Агрегаты одного представления."""
+
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'query_duration',
+                 'render_duration', 'response_bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_duration = 0.0
+        self.render_duration = 0.0
+        self.response_bytes = 0
+
+
+class Registry:
+    """Агрегаты всех представлений процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def _view(self, name):
+        view = self.views.get(name)
+        if view is None:
+            view = self.views[name] = ViewMetrics()
+        return view
+
+    def observe(self, name, duration, request_metrics, response_bytes):
+        bucket = bisect_left(BUCKETS, duration)
+        with self._lock:
+            view = self._view(name)
+            view.buckets[bucket] += 1
+            view.count += 1
+            view.duration += duration
+            view.queries += request_metrics.queries
+            view.query_duration += request_metrics.query_duration
+            view.render_duration += request_metrics.render_duration
+            view.response_bytes += response_bytes
+
+    def add_response_bytes(self, name, response_bytes):
+        with self._lock:
+            self._view(name).response_bytes += response_bytes
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {slot: (list(getattr(view, slot))
+                              if slot == 'buckets'
+                              else getattr(view, slot))
+                       for slot in ViewMetrics.__slots__}
+                for name, view in self.views.items()
+            }
+
+
+registry = Registry()
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Учитывает SQL-запрос в метриках текущего HTTP-запроса."""
+    request_metrics = current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.queries += 1
+        request_metrics.query_duration += time.perf_counter() - started
+
+
+def install_execute_wrapper(sender, connection, **kwargs):
+    """Подключает обёртку к каждому новому соединению с базой."""
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def _labels(view):
+    escaped = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{escaped}"'
+
+
+def _metric(lines, name, kind, help_text):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def render_prometheus(snapshot, cache_stats=None, queue_depth=None):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    lines = []
+    name = 'yanote_request_duration_seconds'
+    _metric(lines, name, 'histogram', 'Request latency by URL name.')
+    for view, data in sorted(snapshot.items()):
+        labels = _labels(view)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, data['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} '
+                         f'{cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {data["count"]}')
+        lines.append(f'{name}_sum{{{labels}}} {data["duration"]}')
+        lines.append(f'{name}_count{{{labels}}} {data["count"]}')
+
+    counters = (
+        ('yanote_db_queries_total', 'queries', 'SQL queries by URL name.'),
+        ('yanote_db_query_duration_seconds_total', 'query_duration',
+         'Time spent in SQL queries by URL name.'),
+        ('yanote_template_render_seconds_total', 'render_duration',
+         'Template render time by URL name.'),
+        ('yanote_response_bytes_total', 'response_bytes',
+         'Response body size by URL name.'),
+    )
+    for name, key, help_text in counters:
+        _metric(lines, name, 'counter', help_text)
+        for view, data in sorted(snapshot.items()):
+            lines.append(f'{name}{{{_labels(view)}}} {data[key]}')
+
+    if cache_stats is not None:
+        for key in ('hits', 'misses'):
+            name = f'yanote_note_cache_{key}_total'
+            _metric(lines, name, 'counter', f'Note cache {key}.')
+            lines.append(f'{name} {cache_stats[key]}')
+
+    if queue_depth is not None:
+        gauges = (
+            ('yanote_task_queue_depth', 'count', 'Queued tasks by status.'),
+            ('yanote_task_queue_oldest_seconds', 'oldest_seconds',
+             'Age of the oldest queued task by status.'),
+        )
+        for name, key, help_text in gauges:
+            _metric(lines, name, 'gauge', help_text)
+            for row in queue_depth:
+                labels = f'task="{row["name"]}",status="{row["status"]}"'
+                lines.append(f'{name}{{{labels}}} {row[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics(View):
+    """Метрики процесса в формате Prometheus для адресов из INTERNAL_IPS."""
+
+    def get(self, request, *args, **kwargs):
+        if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+            raise PermissionDenied
+        return HttpResponse(
+            render_prometheus(
+                registry.snapshot(), cache.stats.snapshot(), queue.depth()
+            ),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,431 @@
+import asyncio
+import cProfile
+import math
+import random
+import time
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import compression, shards, staticfiles, throttle
+from .hashers import PasswordHashBusy
+from .metrics import UNRESOLVED, RequestMetrics, current_request, registry
+from .routers import on_shard, reading
+
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'TRACE'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class HybridMiddleware:
+    """
+    Middleware для синхронного и асинхронного стека.
+
+    Под ASGI middleware только для синхронного стека заставляет Django
+    обернуть цепочку в sync_to_async: асинхронные представления ждут в
+    общем синхронном потоке. Подкласс в асинхронном стеке отдаёт
+    ответ из __acall__.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class StaticFilesMiddleware(HybridMiddleware):
+    """
+    Отдаёт собранную collectstatic статику из STATIC_ROOT.
+
+    Файлы с хешем в имени кешируются на год (immutable), остальные — на
+    NOTES_STATIC_MAX_AGE секунд. Клиенту, который принимает br или gzip,
+    отдаётся сжатая копия, готовая после collectstatic. Файл передаёт
+    FileResponse, то есть wsgi.file_wrapper сервера. Индекс файлов
+    строится при запуске процесса: после collectstatic процессы
+    перезапускают. Без собранной статики выключается. Должен стоять
+    первым в MIDDLEWARE: остальные слои статике не нужны.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.files = staticfiles.collect(
+            settings.STATIC_ROOT, urlsplit(settings.STATIC_URL).path
+        )
+        if not self.files:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        static = self.static(request)
+        if static is None:
+            return self.get_response(request)
+        return self.serve(request, static)
+
+    async def __acall__(self, request):
+        static = self.static(request)
+        if static is None:
+            return await self.get_response(request)
+        return self.serve(request, static)
+
+    def static(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return self.files.get(request.path)
+
+    @staticmethod
+    def serve(request, static):
+        encoding = compression.choose(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), static.encodings
+        )
+        path, size, modified = static.variants[encoding]
+        etag = quote_etag(f'{modified:x}-{size:x}')
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if response is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static.content_type)
+            else:
+                response = FileResponse(
+                    open(path, 'rb'), content_type=static.content_type
+                )
+                del response['Content-Disposition']
+            response['Content-Length'] = str(size)
+            response['Last-Modified'] = http_date(modified)
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            IMMUTABLE if static.immutable
+            else f'public, max-age={settings.NOTES_STATIC_MAX_AGE}'
+        )
+        if static.encodings:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Собирает метрики запроса по имени URL.
+
+    Должен стоять первым в MIDDLEWARE после StaticFilesMiddleware: тогда
+    задержка включает все остальные слои, а его
+    process_template_response вызывается последним, непосредственно
+    перед рендерингом шаблона.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        profiler = self.start_profiler()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+            self.dump_profile(request, profiler, duration)
+        return self.finish(request, response, request_metrics, duration)
+
+    async def __acall__(self, request):
+        """В асинхронном стеке профилирование не ведётся."""
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        duration = time.perf_counter() - started
+        return self.finish(request, response, request_metrics, duration)
+
+    def process_template_response(self, request, response):
+        request_metrics = current_request.get()
+        if request_metrics is not None:
+            request_metrics.start_render()
+            response.add_post_render_callback(request_metrics.finish_render)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else UNRESOLVED
+
+    def finish(self, request, response, request_metrics, duration):
+        name = self.view_name(request)
+        if response.streaming:
+            response.streaming_content = self.count_streamed(
+                name, response.streaming_content
+            )
+            size = 0
+        else:
+            size = len(response.content)
+        registry.observe(name, duration, request_metrics, size)
+        return response
+
+    @staticmethod
+    def count_streamed(name, content):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            registry.add_response_bytes(name, size)
+
+    @staticmethod
+    def start_profiler():
+        threshold = settings.NOTES_PROFILE_THRESHOLD_MS
+        if threshold is None:
+            return None
+        if random.random() >= settings.NOTES_PROFILE_SAMPLE_RATE:
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def dump_profile(self, request, profiler, duration):
+        """Сохраняет профиль pstats, если запрос медленнее порога."""
+        if duration * 1000 < settings.NOTES_PROFILE_THRESHOLD_MS:
+            return
+        directory = Path(settings.NOTES_PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        name = self.view_name(request).replace(':', '-').strip('<>')
+        profiler.dump_stats(
+            directory / f'{name}-{time.time_ns()}-{duration * 1000:.0f}ms.prof'
+        )
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """
+    Сжимает в br или gzip ответы с типом из NOTES_COMPRESS_TYPES.
+
+    Обычный ответ сжимается целиком, если он не короче
+    NOTES_COMPRESS_MIN_SIZE байт и сжатие его уменьшает. Потоковый
+    ответ (страница большой заметки) сжимается по кускам, и каждый
+    кусок уходит клиенту сразу. ETag становится слабым, как в
+    GZipMiddleware: ответ 304 по нему работает по-прежнему. Должен
+    стоять сразу после MetricsMiddleware: метрики считают сжатые байты.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        """Потоковый ответ оборачивается так же, как в синхронном стеке."""
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if not self.compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.choose(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        level = settings.NOTES_COMPRESS_LEVELS[encoding]
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(
+                response.streaming_content, encoding, level
+            )
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(
+                response.content, encoding, level
+            )
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def compressible(response):
+        if response.has_header('Content-Encoding'):
+            return False
+        content_type = response.get('Content-Type', '').partition(';')[0]
+        if content_type.strip() not in settings.NOTES_COMPRESS_TYPES:
+            return False
+        return response.streaming or (
+            len(response.content) >= settings.NOTES_COMPRESS_MIN_SIZE
+        )
+
+
+class ReadOnlyMiddleware(HybridMiddleware):
+    """
+    Включает чтение через READ_ALIAS для представлений с read_only.
+
+    Флаг сбрасывается только после ответа, поэтому запросы, которые
+    выполняет отложенный рендеринг шаблона, тоже идут на чтение.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = reading.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            reading.reset(token)
+
+    async def __acall__(self, request):
+        token = reading.set(False)
+        try:
+            return await self.get_response(request)
+        finally:
+            reading.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'read_only', False):
+            reading.set(True)
+
+
+def stream_on_shard(alias, chunks):
+    """
+    Куски потокового ответа, каждый — внутри on_shard(alias).
+
+    Потоковый ответ читает базу, когда сервер забирает куски, уже после
+    выхода из ShardMiddleware. Шард выставляется только на время
+    получения куска, чтобы не оставлять его в контексте сервера между
+    кусками.
+    """
+    chunks = iter(chunks)
+    while True:
+        with on_shard(alias):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+class ShardMiddleware(HybridMiddleware):
+    """
+    Заметки запроса — в шарде вошедшего пользователя (notes.shards).
+
+    Пока пользователя переносят в другой шард, его изменения получают
+    503, а чтение идёт из прежнего шарда. Потоковые ответы (выгрузка,
+    текст большой заметки) читают тот же шард. Должен стоять после
+    AuthenticationMiddleware. Без шардирования ничего не делает и
+    запросов к базе не добавляет.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not shards.enabled():
+            return self.get_response(request)
+        alias, response = self.placement(request)
+        if response is not None:
+            return response
+        if alias is None:
+            return self.get_response(request)
+        with on_shard(alias):
+            response = self.get_response(request)
+        return self.keep_shard(alias, response)
+
+    async def __acall__(self, request):
+        """Шард пользователя читается одним переходом в синхронный код."""
+        if not shards.enabled():
+            return await self.get_response(request)
+        alias, response = await sync_to_async(self.placement)(request)
+        if response is not None:
+            return response
+        if alias is None:
+            return await self.get_response(request)
+        with on_shard(alias):
+            response = await self.get_response(request)
+        return self.keep_shard(alias, response)
+
+    @staticmethod
+    def placement(request):
+        """Шард пользователя и ответ 503, если заметки переносятся."""
+        if not request.user.is_authenticated:
+            return None, None
+        alias, moving = shards.placement(request.user.pk)
+        if not moving or request.method in SAFE_METHODS:
+            return alias, None
+        response = HttpResponse(
+            'Заметки переносятся, попробуйте позже.',
+            status=HTTPStatus.SERVICE_UNAVAILABLE,
+            content_type='text/plain; charset=utf-8',
+        )
+        response['Retry-After'] = str(
+            max(1, math.ceil(settings.NOTES_SHARD_MOVE_GRACE))
+        )
+        return alias, response
+
+    @staticmethod
+    def keep_shard(alias, response):
+        if response.streaming:
+            response.streaming_content = stream_on_shard(
+                alias, response.streaming_content
+            )
+        return response
+
+
+class ThrottleMiddleware(HybridMiddleware):
+    """
+    Ответ 429 на изменения сверх NOTES_RATE_LIMITS.
+
+    Проверка идёт в process_view, то есть до формы и запросов
+    представления к базе; чтение страниц не ограничивается. Должен
+    стоять после AuthenticationMiddleware: лимит считается по
+    пользователю. Вход и регистрация при заполненной очереди к пулу
+    хеширования паролей получают 503.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def reject(status, retry_after):
+        response = HttpResponse(
+            'Слишком много запросов, попробуйте позже.',
+            status=status,
+            content_type='text/plain; charset=utf-8',
+        )
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS:
+            return None
+        retry_after = throttle.check(
+            request, request.resolver_match.view_name
+        )
+        if not retry_after:
+            return None
+        return self.reject(HTTPStatus.TOO_MANY_REQUESTS, retry_after)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashBusy):
+            return self.reject(HTTPStatus.SERVICE_UNAVAILABLE, 1)
+        return None
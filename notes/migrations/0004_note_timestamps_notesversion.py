@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from notes.search import install_search_index, uninstall_search_index
+
+
+def create_versions(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    if db_alias != DEFAULT_DB_ALIAS:
+        # Пользователи есть только в default.
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    NotesVersion = apps.get_model('notes', 'NotesVersion')
+    now = django.utils.timezone.now()
+    users = User.objects.using(db_alias).values_list('pk', flat=True)
+    NotesVersion.objects.using(db_alias).bulk_create(
+        (NotesVersion(user_id=pk, updated=now) for pk in users.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0003_note_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search_index, install_search_index),
+        migrations.AddField(
+            model_name='note',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Создана'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменена'),
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+        migrations.CreateModel(
+            name='NotesVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notes_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменена')),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+from notes.revisions import encode_snapshot
+
+BATCH_SIZE = 1000
+
+
+def snapshot_existing_notes(apps, schema_editor):
+    """Первая версия для заметок, созданных до истории."""
+    Note = apps.get_model('notes', 'Note')
+    NoteRevision = apps.get_model('notes', 'NoteRevision')
+    db_alias = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        notes = list(
+            Note.objects.using(db_alias).filter(id__gt=last_id).order_by('id')
+            .only('id', 'title', 'text', 'updated')[:BATCH_SIZE]
+        )
+        if not notes:
+            return
+        NoteRevision.objects.using(db_alias).bulk_create(
+            NoteRevision(
+                note_id=note.id, number=1, is_snapshot=True,
+                title=note.title, data=encode_snapshot(note.text),
+                size=len(note.text), created=note.updated,
+            )
+            for note in notes
+        )
+        last_id = notes[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_note_word_count_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='Полный текст')),
+                ('title', models.CharField(max_length=100, verbose_name='Заголовок')),
+                ('data', models.BinaryField(verbose_name='Данные')),
+                ('size', models.PositiveIntegerField(verbose_name='Длина текста')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создана')),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notes.note')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='noterevision',
+            constraint=models.UniqueConstraint(fields=('note', 'number'), name='revision_note_number_uniq'),
+        ),
+        migrations.RunPython(snapshot_existing_notes, migrations.RunPython.noop),
+    ]
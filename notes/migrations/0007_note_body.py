@@ -0,0 +1,96 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Length
+import django.db.models.deletion
+import django.utils.timezone
+import notes.models
+
+from notes import bodies
+from notes.search import install_search_index, uninstall_search_index
+
+
+def move_large_texts(apps, schema_editor):
+    """Выносит в NoteBody тексты, которые уже длиннее порога."""
+    db_alias = schema_editor.connection.alias
+    notes = apps.get_model('notes', 'Note').objects.using(db_alias)
+    NoteBody = apps.get_model('notes', 'NoteBody')
+    NoteBodyChunk = apps.get_model('notes', 'NoteBodyChunk')
+    large = notes.annotate(length=Length('text')).filter(
+        length__gt=settings.NOTES_BODY_INLINE_LIMIT
+    ).values_list('id', flat=True)
+    for note_id in list(large):
+        text = notes.values_list('text', flat=True).get(pk=note_id)
+        digest = bodies.digest(text)
+        body = NoteBody.objects.using(db_alias).filter(digest=digest).first()
+        if body is None:
+            body = NoteBody.objects.using(db_alias).create(
+                digest=digest, size=len(text)
+            )
+            NoteBodyChunk.objects.using(db_alias).bulk_create(
+                NoteBodyChunk(body=body, number=number, data=data)
+                for number, data in enumerate(bodies.encode(text))
+            )
+        notes.filter(pk=note_id).update(
+            body=body, text=bodies.preview(text)
+        )
+
+
+def restore_large_texts(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    notes = apps.get_model('notes', 'Note').objects.using(db_alias)
+    chunks = apps.get_model('notes', 'NoteBodyChunk').objects.using(db_alias)
+    large = notes.filter(body__isnull=False).values_list('id', 'body')
+    for note_id, body_id in list(large):
+        data = chunks.filter(
+            body_id=body_id
+        ).order_by('number').values_list('data', flat=True)
+        notes.filter(pk=note_id).update(
+            text=''.join(bodies.decode(chunk) for chunk in data)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_noterevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(verbose_name='Длина текста')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создан')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NoteBodyChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер')),
+                ('data', models.BinaryField(verbose_name='Данные')),
+                ('body', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='notes.notebody')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notebodychunk',
+            constraint=models.UniqueConstraint(fields=('body', 'number'), name='body_chunk_number_uniq'),
+        ),
+        migrations.RunPython(uninstall_search_index, install_search_index),
+        migrations.AlterField(
+            model_name='note',
+            name='text',
+            field=notes.models.NoteTextField(help_text='Добавьте подробностей', verbose_name='Текст'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='body',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='notes', to='notes.notebody'),
+        ),
+        migrations.RunPython(move_large_texts, restore_large_texts),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
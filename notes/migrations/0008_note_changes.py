@@ -0,0 +1,80 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def log_existing_notes(apps, schema_editor):
+    """Записи CREATE для заметок, созданных до журнала."""
+    Note = apps.get_model('notes', 'Note')
+    NoteChange = apps.get_model('notes', 'NoteChange')
+    NotesVersion = apps.get_model('notes', 'NotesVersion')
+    db_alias = schema_editor.connection.alias
+    author_ids = Note.objects.using(db_alias).order_by('author_id').values_list(
+        'author_id', flat=True
+    ).distinct()
+    for author_id in author_ids:
+        version, _ = NotesVersion.objects.using(db_alias).get_or_create(
+            user_id=author_id
+        )
+        notes = Note.objects.using(db_alias).filter(author_id=author_id).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(
+                notes.filter(id__gt=last_id)
+                .values_list('id', 'slug', 'updated')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            NoteChange.objects.using(db_alias).bulk_create(
+                NoteChange(
+                    user_id=author_id, seq=seq, note_id=note_id,
+                    slug=slug, action='create', created=updated,
+                )
+                for seq, (note_id, slug, updated)
+                in enumerate(batch, version.version + 1)
+            )
+            version.version += len(batch)
+            last_id = batch[-1][0]
+        version.save(using=db_alias, update_fields=('version',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0007_note_body'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notesversion',
+            name='changes_floor',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Журнал сжат до'),
+        ),
+        migrations.CreateModel(
+            name='NoteChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField(verbose_name='Номер')),
+                ('note_id', models.PositiveIntegerField(verbose_name='Заметка')),
+                ('slug', models.SlugField(db_index=False, max_length=100, verbose_name='Адрес')),
+                ('action', models.CharField(choices=[('create', 'Создана'), ('update', 'Изменена'), ('delete', 'Удалена')], max_length=10, verbose_name='Действие')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Записана')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notechange',
+            index=models.Index(fields=['user', 'note_id', 'seq'], name='change_note_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notechange',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='change_user_seq_uniq'),
+        ),
+        migrations.RunPython(log_existing_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from pytils.translit import slugify
+
+BATCH_SIZE = 1000
+
+
+def note_keys(title, slug, key_length):
+    """
+    Ключи заметки, как notes.autocomplete.keys на момент миграции.
+
+    Копия, а не импорт: миграция не должна меняться вместе с модулем.
+    """
+    result = set()
+    for text in (title, slug):
+        normalized = slugify(text).strip('-')
+        start = 0
+        while True:
+            key = normalized[start:start + key_length]
+            if key:
+                result.add(key)
+            start = normalized.find('-', start) + 1
+            if not start:
+                break
+    return result
+
+
+def index_existing_notes(apps, schema_editor):
+    """Ключи автодополнения для заметок, созданных до индекса."""
+    alias = schema_editor.connection.alias
+    Note = apps.get_model('notes', 'Note')
+    NoteKey = apps.get_model('notes', 'NoteKey')
+    key_length = NoteKey._meta.get_field('key').max_length
+    notes = Note.objects.using(alias).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(
+            notes.filter(id__gt=last_id)
+            .values_list('id', 'author_id', 'title', 'slug')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        NoteKey.objects.using(alias).bulk_create(
+            NoteKey(author_id=author_id, note_id=note_id, key=key)
+            for note_id, author_id, title, slug in batch
+            for key in note_keys(title, slug, key_length)
+        )
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0009_note_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, verbose_name='Ключ')),
+                ('author', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keys', to='notes.note')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notekey',
+            index=models.Index(fields=['author', 'key', 'note'], name='notekey_prefix_idx'),
+        ),
+        migrations.RunPython(index_existing_notes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0010_note_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notechange',
+            name='note_id',
+            field=models.PositiveBigIntegerField(verbose_name='Заметка'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations
+
+from notes.search import install_search_index, uninstall_search_index
+
+
+class Migration(migrations.Migration):
+    """Индекс поиска заново — с колонкой author_id."""
+
+    dependencies = [
+        ('notes', '0011_notechange_note_id_bigint'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search_index, install_search_index),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
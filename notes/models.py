@@ -1,7 +1,138 @@
+from contextlib import nullcontext
+from itertools import islice
+
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F
+from django.db.models.query_utils import DeferredAttribute
+from django.utils import timezone
+
+from . import bodies, slugs
+from .routers import notes_db
+
+SLUG_ATTEMPTS = 10
+BODY_INSERT_BATCH = 16
+TEXT_PREVIEW = '_text_preview'
+
+
+def savepoint():
+    """
+    Точка сохранения, если запись идёт внутри транзакции.
+
+    В режиме autocommit ошибка вставки ничего не ломает, а лишний BEGIN
+    в SQLite превращает одиночную вставку в транзакцию с повышением
+    блокировки, которая падает с «database is locked» под нагрузкой.
+    """
+    using = notes_db()
+    if connections[using].in_atomic_block:
+        return transaction.atomic(using=using)
+    return nullcontext()
+
+
+class NoteTextDescriptor(DeferredAttribute):
+    """
+    Полный текст вместо загруженного из базы начала.
+
+    Текст вынесенной заметки читается из NoteBody при первом обращении,
+    поэтому формы, API и задачи видят заметку целиком, а код, которому
+    нужен только заголовок или поток, текст не загружает.
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        text = super().__get__(instance, cls)
+        if instance.__dict__.get(TEXT_PREVIEW):
+            if instance.body_id is None:
+                del instance.__dict__[TEXT_PREVIEW]
+            else:
+                text = NoteBody.read(instance.body_id)
+                self.__set__(instance, text)
+        return text
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+        instance.__dict__.pop(TEXT_PREVIEW, None)
+
+
+class NoteTextField(models.TextField):
+    """Текст заметки; у вынесенной заметки в колонку пишется начало."""
+    descriptor_class = NoteTextDescriptor
+
+    def pre_save(self, model_instance, add):
+        text = model_instance.__dict__[self.attname]
+        if model_instance.body_id is None:
+            return text
+        return bodies.preview(text)
+
+
+class NoteBody(models.Model):
+    """
+    Текст большой заметки вне строки notes_note.
+
+    Заметки с одинаковым текстом ссылаются на одну строку; сам текст
+    лежит в NoteBodyChunk сжатыми кусками, которые читаются по одному.
+    """
+    digest = models.CharField('SHA-256', max_length=64, unique=True)
+    size = models.PositiveBigIntegerField('Длина текста')
+    created = models.DateTimeField('Создан', default=timezone.now)
+
+    def __str__(self):
+        return self.digest
+
+    @classmethod
+    def store(cls, text):
+        """Строка с этим текстом: найденная по хешу или новая."""
+        digest = bodies.digest(text)
+        body = cls.objects.filter(digest=digest).first()
+        if body is not None:
+            return body
+        try:
+            with transaction.atomic(using=notes_db()):
+                body = cls.objects.create(digest=digest, size=len(text))
+                chunks = (
+                    NoteBodyChunk(body=body, number=number, data=data)
+                    for number, data in enumerate(bodies.encode(text))
+                )
+                while True:
+                    batch = list(islice(chunks, BODY_INSERT_BATCH))
+                    if not batch:
+                        break
+                    NoteBodyChunk.objects.bulk_create(batch)
+        except IntegrityError:
+            return cls.objects.get(digest=digest)
+        return body
+
+    @staticmethod
+    def stream(body_id):
+        """Текст по кускам; в памяти одновременно один кусок."""
+        chunks = NoteBodyChunk.objects.filter(
+            body_id=body_id
+        ).order_by('number').values_list('data', flat=True)
+        for data in chunks.iterator(chunk_size=1):
+            yield bodies.decode(data)
+
+    @classmethod
+    def read(cls, body_id):
+        return ''.join(cls.stream(body_id))
+
 
-from pytils.translit import slugify
+class NoteBodyChunk(models.Model):
+    body = models.ForeignKey(
+        NoteBody, on_delete=models.CASCADE, related_name='chunks'
+    )
+    number = models.PositiveIntegerField('Номер')
+    data = models.BinaryField('Данные')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('body', 'number'), name='body_chunk_number_uniq'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.body_id}#{self.number}'
 
 
 class Note(models.Model):
@@ -11,28 +142,308 @@ class Note(models.Model):
         default='Название заметки',
         help_text='Дайте короткое название заметке'
     )
-    text = models.TextField(
+    text = NoteTextField(
         'Текст',
         help_text='Добавьте подробностей'
     )
+    body = models.ForeignKey(
+        NoteBody,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='notes',
+    )
     slug = models.SlugField(
         'Адрес для страницы с заметкой',
         max_length=100,
-        unique=True,
         blank=True,
         help_text=('Укажите адрес для страницы заметки. Используйте только '
                    'латиницу, цифры, дефисы и знаки подчёркивания')
     )
+    # Без ограничения в базе: в шарде (notes.shards) нет пользователей.
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_constraint=False,
     )
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    updated = models.DateTimeField('Изменена', auto_now=True)
+    word_count = models.PositiveIntegerField(
+        'Число слов', null=True, blank=True, editable=False
+    )
+
+    class Meta:
+        # slug уникален у автора: заметки открываются только по адресам
+        # своего автора, а шарды не видят slug друг друга.
+        constraints = (
+            models.UniqueConstraint(
+                fields=('author', 'slug'), name='note_author_slug_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('author', 'id'), name='note_author_id_idx'),
+        )
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Загруженный текст заметки с NoteBody — только его начало."""
+        note = super().from_db(db, field_names, values)
+        loaded = note.__dict__
+        if 'text' in loaded and loaded.get('body_id', True) is not None:
+            loaded[TEXT_PREVIEW] = True
+        return note
+
+    def has_full_text(self):
+        """Текст присвоен или прочитан, а не только загружено начало."""
+        return 'text' in self.__dict__ and TEXT_PREVIEW not in self.__dict__
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        """
+        Текст длиннее NOTES_BODY_INLINE_LIMIT переносится в NoteBody.
+
+        Текст, строка заметки и записи обработчиков post_save (журнал
+        изменений, история, ключи автодополнения) пишутся в одной
+        транзакции: заметка не появится без записи в журнале, по
+        которому её найдут клиенты синхронизации. Если текст не менялся
+        и не читался после загрузки, NoteBody остаётся прежним.
+        Заменённый NoteBody удаляет фоновая задача, когда на него больше
+        не ссылается ни одна заметка.
+        """
+        with transaction.atomic(using=notes_db()):
+            if self.has_full_text():
+                previous_body = self.body_id
+                large = bodies.is_large(self.text)
+                self.body = NoteBody.store(self.text) if large else None
+                if previous_body != self.body_id:
+                    self.replaced_body_id = previous_body
+            self.save_row(*args, **kwargs)
+
+    def save_row(self, *args, **kwargs):
+        """
+        Пустой slug подбирается среди заметок автора одним запросом.
+
+        Внутри транзакции запись идёт в точке сохранения, чтобы ошибка
+        уникальности не ломала внешнюю транзакцию. Если параллельная
+        запись заняла подобранный slug раньше, подбор повторяется со всё
+        большим случайным сдвигом номера; занятый явный slug возвращается
+        вызывающему как IntegrityError.
+        """
+        if self.slug:
+            with savepoint():
+                super().save(*args, **kwargs)
+            return
+        base = slugs.slugify_title(self.title)
+        own_notes = Note.objects.filter(author_id=self.author_id)
+        for attempt in range(SLUG_ATTEMPTS):
+            self.slug = slugs.allocate(
+                own_notes, base, exclude_pk=self.pk,
+                spread=(1 << attempt) - 1,
+            )
+            try:
+                with savepoint():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                self.slug = ''
+                if attempt == SLUG_ATTEMPTS - 1:
+                    raise
+
+
+class NoteKey(models.Model):
+    """
+    Ключ автодополнения заметки (notes.autocomplete).
+
+    Нормализованный хвост заголовка или slug с начала одного из слов;
+    индекс (author, key, note) отдаёт ключи с общим началом по порядку.
+    """
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_constraint=False,
+        db_index=False,
+    )
+    note = models.ForeignKey(
+        Note, on_delete=models.CASCADE, related_name='keys'
+    )
+    key = models.CharField('Ключ', max_length=50)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('author', 'key', 'note'), name='notekey_prefix_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.note_id}: {self.key}'
+
+
+class NotesVersion(models.Model):
+    """
+    Версия набора заметок пользователя для условных GET-запросов.
+
+    Строка создаётся вместе с пользователем, а любое изменение его
+    заметок увеличивает version одним UPDATE по первичному ключу.
+    Если строки нет, условные ответы для пользователя не выдаются.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notes_version',
+        db_constraint=False,
+    )
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated = models.DateTimeField('Изменена', default=timezone.now)
+    changes_floor = models.PositiveBigIntegerField(
+        'Журнал сжат до', default=0
+    )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
+
+    @classmethod
+    def bump(cls, user_id):
+        cls.objects.filter(user_id=user_id).update(
+            version=F('version') + 1, updated=timezone.now()
+        )
+
+
+class NoteChange(models.Model):
+    """
+    Запись журнала изменений заметок пользователя.
+
+    seq — значение NotesVersion.version после изменения, поэтому номера
+    растут в пределах пользователя. Заметка хранится id без внешнего
+    ключа: запись DELETE остаётся после удаления заметки.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = (
+        (CREATE, 'Создана'),
+        (UPDATE, 'Изменена'),
+        (DELETE, 'Удалена'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='note_changes',
+        db_constraint=False,
+    )
+    seq = models.PositiveBigIntegerField('Номер')
+    note_id = models.PositiveBigIntegerField('Заметка')
+    slug = models.SlugField('Адрес', max_length=100, db_index=False)
+    action = models.CharField('Действие', max_length=10, choices=ACTIONS)
+    created = models.DateTimeField('Записана', default=timezone.now)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'seq'), name='change_user_seq_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'note_id', 'seq'), name='change_note_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}#{self.seq}'
+
+
+class ShardPlacement(models.Model):
+    """
+    Шард с заметками пользователя (notes.shards); хранится в default.
+
+    moving — пользователя переносят в другой шард, его заметки пока
+    только читаются.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='shard_placement',
+    )
+    alias = models.CharField('База', max_length=50)
+    moving = models.BooleanField('Переносится', default=False)
+    updated = models.DateTimeField('Изменена', default=timezone.now)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.alias}'
+
+
+class NoteRevision(models.Model):
+    """
+    Версия заметки: сжатый полный текст или разница с предыдущей.
+
+    Хранится отдельно от Note, чтобы история не расширяла строки,
+    которые читают список и страница заметки.
+    """
+    note = models.ForeignKey(
+        Note, on_delete=models.CASCADE, related_name='revisions'
+    )
+    number = models.PositiveIntegerField('Номер')
+    is_snapshot = models.BooleanField('Полный текст', default=False)
+    title = models.CharField('Заголовок', max_length=100)
+    data = models.BinaryField('Данные')
+    size = models.PositiveIntegerField('Длина текста')
+    created = models.DateTimeField('Создана', default=timezone.now)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('note', 'number'), name='revision_note_number_uniq'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.note_id}#{self.number}'
+
+
+class Task(models.Model):
+    """
+    Отложенная задача фоновой обработки.
+
+    На пару (name, key) приходится одна строка: повторная постановка
+    той же задачи только увеличивает version, и обработчик выполнит её
+    ещё раз, если строка изменилась, пока задача уже выполнялась.
+    """
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=50)
+    key = models.CharField('Ключ', max_length=100)
+    version = models.PositiveIntegerField('Версия', default=0)
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'key'), name='task_name_key_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('status', 'run_after'), name='task_due_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.name}:{self.key}'
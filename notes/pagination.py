@@ -0,0 +1,167 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import Http404
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPage:
+    """Страница списка с курсорами на соседние страницы."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу вместо OFFSET.
+
+    Курсор хранит направление и id крайней заметки страницы, поэтому
+    каждая страница читается диапазоном по индексу (author, id) вне
+    зависимости от глубины, а добавление заметок не сдвигает страницы.
+    """
+
+    def __init__(self, queryset, per_page, key='id'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.key = key
+
+    @staticmethod
+    def encode_cursor(direction, pivot):
+        raw = f'{direction}{pivot}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Возвращает пару (направление, id) или 404 на битый курсор."""
+        if not cursor:
+            return None, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, pivot = raw[0], int(raw[1:])
+        except (binascii.Error, UnicodeDecodeError, ValueError, IndexError):
+            raise Http404('Некорректный курсор страницы.')
+        if direction not in (NEXT, PREVIOUS):
+            raise Http404('Некорректный курсор страницы.')
+        return direction, pivot
+
+    def page(self, cursor=None):
+        direction, pivot = self.decode_cursor(cursor)
+        key = self.key
+        queryset = self.queryset
+        if direction == NEXT:
+            queryset = queryset.filter(**{f'{key}__gt': pivot})
+        elif direction == PREVIOUS:
+            queryset = queryset.filter(**{f'{key}__lt': pivot})
+        ordering = f'-{key}' if direction == PREVIOUS else key
+        rows = list(queryset.order_by(ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+
+        if not rows:
+            if direction == PREVIOUS:
+                return CursorPage(
+                    rows, next_cursor=self.encode_cursor(NEXT, pivot - 1)
+                )
+            if direction == NEXT:
+                return CursorPage(
+                    rows,
+                    previous_cursor=self.encode_cursor(PREVIOUS, pivot + 1),
+                )
+            return CursorPage(rows)
+
+        first = getattr(rows[0], key)
+        last = getattr(rows[-1], key)
+        has_next = has_more if direction != PREVIOUS else True
+        has_previous = has_more if direction == PREVIOUS else bool(direction)
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(NEXT, last) if has_next else None,
+            previous_cursor=(
+                self.encode_cursor(PREVIOUS, first) if has_previous else None
+            ),
+        )
+
+
+def estimated_count(queryset):
+    """
+    Число строк таблицы queryset по статистике СУБД или None.
+
+    SQLite держит его в sqlite_stat1 после ANALYZE (или PRAGMA
+    optimize), PostgreSQL — в pg_class.reltuples после VACUUM/ANALYZE.
+    Оценка читается одним запросом и не зависит от размера таблицы.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            # stat начинается с числа строк: «1000 1 1».
+            cursor.execute(
+                'SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 '
+                'WHERE tbl = %s',
+                (table,),
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                (connection.ops.quote_name(table),),
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator без COUNT(*) по всей таблице.
+
+    Без условий WHERE число строк берётся из статистики СУБД. С
+    условиями или без статистики строки считаются, но не больше
+    NOTES_ADMIN_COUNT_LIMIT: дальние страницы большой выборки
+    недоступны, её нужно сузить поиском или фильтром.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None:
+                return estimate
+        limit = settings.NOTES_ADMIN_COUNT_LIMIT
+        return queryset.order_by()[:limit].count()
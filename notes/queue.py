@@ -0,0 +1,191 @@
+"""
+Очередь фоновых задач в таблице notes_task.
+
+Веб-запрос только ставит задачу после коммита своей транзакции:
+enqueue_on_commit. Команда run_tasks забирает готовые задачи порциями,
+группирует их по имени и передаёт обработчику сразу все ключи группы.
+Повторная постановка задачи с тем же ключом не создаёт новую строку,
+а неудачная порция откладывается с экспоненциальной задержкой.
+"""
+import datetime
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Task, savepoint
+from .routers import notes_db, on_shard
+
+HANDLERS = {}
+
+
+def task(name):
+    """Регистрирует обработчик: он получает список ключей порции."""
+    def register(handler):
+        HANDLERS[name] = handler
+        return handler
+    return register
+
+
+def requeue(pending):
+    """Отмечает стоящие задачи как изменившиеся; возвращает их число."""
+    return pending.update(
+        version=F('version') + 1, status=Task.PENDING, attempts=0
+    )
+
+
+def enqueue(name, key):
+    """Ставит задачу или отмечает уже стоящую как изменившуюся."""
+    key = str(key)
+    if settings.NOTES_TASKS_EAGER:
+        HANDLERS[name]([key])
+        return
+    pending = Task.objects.filter(name=name, key=key)
+    if requeue(pending):
+        return
+    try:
+        with savepoint():
+            Task.objects.create(name=name, key=key)
+    except IntegrityError:
+        requeue(pending)
+
+
+def enqueue_many(name, keys):
+    """Как enqueue, но для многих ключей: два запроса при любом их числе."""
+    keys = sorted({str(key) for key in keys})
+    if not keys:
+        return
+    if settings.NOTES_TASKS_EAGER:
+        HANDLERS[name](keys)
+        return
+    requeue(Task.objects.filter(name=name, key__in=keys))
+    Task.objects.bulk_create(
+        (Task(name=name, key=key) for key in keys), ignore_conflicts=True
+    )
+
+
+def on_commit(func, *args):
+    """func(*args) после коммита базы заметок, в очередь того же шарда."""
+    using = notes_db()
+
+    def callback():
+        with on_shard(using):
+            func(*args)
+
+    transaction.on_commit(callback, using=using)
+
+
+def enqueue_on_commit(name, key):
+    """Задача появится в очереди, только если транзакция зафиксирована."""
+    on_commit(enqueue, name, key)
+
+
+def enqueue_many_on_commit(name, keys):
+    on_commit(enqueue_many, name, list(keys))
+
+
+def claim(batch_size=None):
+    """Забирает готовые задачи и занимает их на NOTES_TASK_LEASE."""
+    batch_size = batch_size or settings.NOTES_TASK_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic(using=notes_db()):
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.PENDING, run_after__lte=now)
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+            .order_by('run_after')[:batch_size]
+        )
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            locked_until=now + datetime.timedelta(
+                seconds=settings.NOTES_TASK_LEASE
+            )
+        )
+    return tasks
+
+
+def complete(tasks):
+    """
+    Удаляет выполненные задачи.
+
+    Задача, которую снова поставили во время выполнения, остаётся в
+    очереди и освобождается для следующего прохода.
+    """
+    done = reduce(or_, (Q(pk=task.pk, version=task.version) for task in tasks))
+    Task.objects.filter(done).delete()
+    Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+        locked_until=None
+    )
+
+
+def retry(tasks, error):
+    """Откладывает задачи или помечает их ошибочными после лимита."""
+    now = timezone.now()
+    for task in tasks:
+        task.attempts += 1
+        task.last_error = f'{type(error).__name__}: {error}'
+        task.locked_until = None
+        if task.attempts >= settings.NOTES_TASK_MAX_ATTEMPTS:
+            task.status = Task.FAILED
+        else:
+            task.run_after = now + datetime.timedelta(
+                seconds=settings.NOTES_TASK_RETRY_DELAY
+                * 2 ** (task.attempts - 1)
+            )
+    Task.objects.bulk_update(
+        tasks, ('attempts', 'last_error', 'locked_until', 'status',
+                'run_after')
+    )
+
+
+def process(tasks):
+    """Выполняет порцию; возвращает число выполненных и отложенных."""
+    groups = defaultdict(list)
+    for task in tasks:
+        groups[task.name].append(task)
+    done = failed = 0
+    for name, group in groups.items():
+        try:
+            handler = HANDLERS[name]
+            handler([task.key for task in group])
+        except Exception as error:
+            retry(group, error)
+            failed += len(group)
+        else:
+            complete(group)
+            done += len(group)
+    return done, failed
+
+
+def run_pending(batch_size=None):
+    """Выполняет очередь до конца готовых задач."""
+    done = failed = 0
+    while True:
+        tasks = claim(batch_size)
+        if not tasks:
+            return done, failed
+        batch_done, batch_failed = process(tasks)
+        done += batch_done
+        failed += batch_failed
+
+
+def depth():
+    """Размер очереди по задачам и возраст самой старой готовой задачи."""
+    rows = Task.objects.values('name', 'status').annotate(
+        count=Count('id'), oldest=Min('run_after')
+    ).order_by('name', 'status')
+    now = timezone.now()
+    return [
+        {
+            'name': row['name'],
+            'status': row['status'],
+            'count': row['count'],
+            'oldest_seconds': max(
+                0.0, (now - row['oldest']).total_seconds()
+            ),
+        }
+        for row in rows
+    ]
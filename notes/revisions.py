@@ -0,0 +1,248 @@
+"""
+История версий заметок.
+
+Каждое сохранение с новым заголовком или текстом добавляет версию в
+notes_noterevision. Каждая NOTES_REVISION_SNAPSHOT_EVERY-я версия —
+сжатый полный текст, остальные — сжатая построчная разница с
+предыдущей версией. Чтобы собрать любую версию, достаточно одного
+запроса за ближайшим снимком и не больше SNAPSHOT_EVERY - 1 разниц.
+Разница между текстами длиннее NOTES_REVISION_DELTA_MAX_LINES строк
+не считается, такая версия — тоже снимок: время difflib растёт быстрее
+длины текста, а снимок стоит одного сжатия.
+Сама заметка ничего не знает об истории, поэтому список и страница
+заметки её не читают.
+
+Массовая смена заголовков пишет версии без чтения текстов: разница,
+копирующая все строки, не требует знать текст. Поэтому такая версия
+никогда не снимок, и цепочка до следующего снимка может оказаться
+длиннее SNAPSHOT_EVERY - 1 разниц.
+"""
+import difflib
+import json
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Max, OuterRef, Subquery
+
+from .models import Note, NoteRevision, savepoint
+
+RECORD_ATTEMPTS = 3
+
+
+def compress(data):
+    return zlib.compress(data, settings.NOTES_REVISION_COMPRESS_LEVEL)
+
+
+def encode_snapshot(text):
+    return compress(text.encode())
+
+
+def delta_too_costly(*texts):
+    """Разница этих текстов дороже снимка."""
+    limit = settings.NOTES_REVISION_DELTA_MAX_LINES
+    return any(text.count('\n') >= limit for text in texts)
+
+
+def encode_delta(base, text):
+    """
+    Разница base -> text: диапазоны строк base и вставленный текст.
+
+    Копирование хранится парой [начало, конец] строк base, вставка —
+    строкой, поэтому правка одной строки большой заметки занимает
+    несколько байт.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    operations = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([i1, i2])
+        elif j1 != j2:
+            operations.append(''.join(lines[j1:j2]))
+    return compress(
+        json.dumps(operations, ensure_ascii=False,
+                   separators=(',', ':')).encode()
+    )
+
+
+def apply_delta(base, data):
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for operation in json.loads(zlib.decompress(data)):
+        if isinstance(operation, str):
+            parts.append(operation)
+        else:
+            start, end = operation
+            parts.extend(base_lines[start:end])
+    return ''.join(parts)
+
+
+def decode(revisions):
+    """Тексты версий цепочки, начинающейся со снимка."""
+    text = None
+    for revision in revisions:
+        data = bytes(revision.data)
+        if revision.is_snapshot:
+            text = zlib.decompress(data).decode()
+        else:
+            text = apply_delta(text, data)
+        yield revision, text
+
+
+def chain(note_id, number=None):
+    """Версии от последнего снимка не позже number до number."""
+    revisions = NoteRevision.objects.filter(note_id=note_id)
+    if number is not None:
+        revisions = revisions.filter(number__lte=number)
+    snapshot = revisions.filter(is_snapshot=True).order_by('-number')
+    return revisions.filter(
+        number__gte=Subquery(snapshot.values('number')[:1])
+    ).order_by('number')
+
+
+def rebuild(note_id, number=None):
+    """Версия number (по умолчанию последняя) и её текст или None."""
+    result = None
+    for result in decode(chain(note_id, number)):
+        pass
+    if result is None or (number is not None and result[0].number != number):
+        return None
+    return result
+
+
+def record(note):
+    """
+    Добавляет версию, если заголовок или текст изменились.
+
+    Разница считается от последней сохранённой версии, собранной из
+    базы, а не от прочитанной формой заметки: так параллельные правки
+    не ломают цепочку, а гонка за номер версии решается повтором.
+    """
+    every = settings.NOTES_REVISION_SNAPSHOT_EVERY
+    for attempt in range(RECORD_ATTEMPTS):
+        latest = rebuild(note.pk)
+        if latest is None:
+            number, is_snapshot, text = 1, True, note.text
+        else:
+            revision, previous = latest
+            # Текст, не прочитанный после загрузки, не менялся: большой
+            # текст из NoteBody ради этого не читается.
+            text = note.text if note.has_full_text() else previous
+            if revision.title == note.title and text == previous:
+                return None
+            number = revision.number + 1
+            is_snapshot = (
+                (number - 1) % every == 0
+                or delta_too_costly(previous, text)
+            )
+        data = (encode_snapshot(text) if is_snapshot
+                else encode_delta(previous, text))
+        try:
+            with savepoint():
+                return NoteRevision.objects.create(
+                    note=note, number=number, is_snapshot=is_snapshot,
+                    title=note.title, data=data, size=len(text),
+                )
+        except IntegrityError:
+            if attempt == RECORD_ATTEMPTS - 1:
+                raise
+
+
+def encode_unchanged(size):
+    """Разница, которая копирует весь текст: строк не больше size."""
+    return compress(json.dumps([[0, size]] if size else []).encode())
+
+
+def with_latest(queryset):
+    """Заметки с номером и длиной текста последней версии."""
+    latest = NoteRevision.objects.filter(
+        note=OuterRef('pk')
+    ).order_by('-number')
+    return queryset.annotate(
+        revision_number=Subquery(latest.values('number')[:1]),
+        revision_size=Subquery(latest.values('size')[:1]),
+    )
+
+
+def retitle_many(notes):
+    """
+    Версии с новым заголовком и прежним текстом одним запросом.
+
+    Заметки загружены через with_latest. Заметки без истории
+    пропускаются: их первую версию запишет следующее сохранение.
+    """
+    NoteRevision.objects.bulk_create(
+        NoteRevision(
+            note_id=note.pk, number=note.revision_number + 1,
+            title=note.title, data=encode_unchanged(note.revision_size),
+            size=note.revision_size,
+        )
+        for note in notes if note.revision_number is not None
+    )
+
+
+def snapshot_many(notes):
+    """
+    Первые версии заметок, сохранённых bulk_create без сигналов.
+
+    Если bulk_create не вернул id, они читаются по slug и проставляются
+    заметкам.
+    """
+    if any(note.pk is None for note in notes):
+        ids = dict(
+            Note.objects.filter(
+                author_id=notes[0].author_id,
+                slug__in=[note.slug for note in notes],
+            ).values_list('slug', 'id')
+        )
+        for note in notes:
+            note.pk = ids[note.slug]
+    NoteRevision.objects.bulk_create(
+        NoteRevision(
+            note_id=note.pk, number=1, is_snapshot=True,
+            title=note.title, data=encode_snapshot(note.text),
+            size=len(note.text),
+        )
+        for note in notes
+    )
+
+
+def compact(note_id, keep=None, every=None):
+    """
+    Перекодирует историю заметки, оставляя keep последних версий.
+
+    Первая оставшаяся версия, каждая every-я после неё и слишком
+    длинные для разницы становятся снимками, остальные — разницами с
+    предыдущей. Возвращает число
+    удалённых и перезаписанных версий.
+    """
+    every = every or settings.NOTES_REVISION_SNAPSHOT_EVERY
+    revisions = NoteRevision.objects.filter(note_id=note_id)
+    last = revisions.aggregate(last=Max('number'))['last']
+    if last is None:
+        return 0, 0
+    first_kept = 1 if keep is None else max(1, last - keep + 1)
+    changed = []
+    previous = None
+    position = 0
+    for revision, text in decode(revisions.order_by('number').iterator()):
+        if revision.number < first_kept:
+            continue
+        is_snapshot = position % every == 0 or delta_too_costly(
+            previous, text
+        )
+        data = (encode_snapshot(text) if is_snapshot
+                else encode_delta(previous, text))
+        if is_snapshot != revision.is_snapshot or data != bytes(revision.data):
+            revision.is_snapshot = is_snapshot
+            revision.data = data
+            changed.append(revision)
+        previous = text
+        position += 1
+    deleted, _ = revisions.filter(number__lt=first_kept).delete()
+    NoteRevision.objects.bulk_update(
+        changed, ('is_snapshot', 'data'), batch_size=100
+    )
+    return deleted, len(changed)
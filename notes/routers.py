@@ -0,0 +1,102 @@
+"""
+Маршрутизация чтения на отдельное соединение SQLite и шарды заметок.
+
+Представления с read_only = True читают через алиас READ_ALIAS:
+это та же база в режиме WAL, открытая с query_only, поэтому чтение не
+ждёт писателя и не отстаёт от него. Всё остальное, включая запись,
+идёт в default. Чтение внутри транзакции default остаётся на ней,
+чтобы видеть собственные незафиксированные изменения.
+
+Модели приложения notes, кроме GLOBAL_MODELS, внутри on_shard(alias)
+идут в шард alias (см. notes.shards); вне его и для шарда default —
+как описано выше.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ALIAS = 'reader'
+GLOBAL_MODELS = frozenset(('shardplacement',))
+
+reading = ContextVar('notes_read_only', default=False)
+shard = ContextVar('notes_shard', default=None)
+
+
+@contextmanager
+def read_only():
+    """Чтение в блоке идёт через READ_ALIAS."""
+    token = reading.set(True)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+@contextmanager
+def on_shard(alias):
+    """Заметки в блоке читаются и пишутся в базе alias."""
+    token = shard.set(alias)
+    try:
+        yield
+    finally:
+        shard.reset(token)
+
+
+def notes_db():
+    """Алиас базы с заметками для transaction.atomic и on_commit."""
+    return shard.get() or DEFAULT_DB_ALIAS
+
+
+def is_sharded(model):
+    """Модель или объект, которые лежат в шарде заметок."""
+    meta = model._meta
+    return meta.app_label == 'notes' and meta.model_name not in GLOBAL_MODELS
+
+
+class ShardRouter:
+    """
+    Заметки — в шард из on_shard() или в базу объекта из подсказки.
+
+    Пользователь и другие общие модели, связанные с объектом из шарда,
+    ищутся в default, а не в базе этого объекта. В остальных случаях и
+    для шарда default решает следующий роутер, поэтому ShardRouter
+    должен стоять в DATABASE_ROUTERS первым.
+    """
+
+    def db_for_model(self, model, **hints):
+        instance = hints.get('instance')
+        from_shard = instance is not None and is_sharded(instance)
+        if not is_sharded(model):
+            if from_shard and instance._state.db not in (None, READ_ALIAS):
+                return DEFAULT_DB_ALIAS
+            return None
+        alias = shard.get()
+        if alias is None and from_shard:
+            alias = instance._state.db
+        if alias == DEFAULT_DB_ALIAS:
+            return None
+        return alias
+
+    db_for_read = db_for_model
+    db_for_write = db_for_model
+
+
+class ReadReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not reading.get() or READ_ALIAS not in settings.DATABASES:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != READ_ALIAS
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .backends import (BaseSearchBackend, PostgresSearchBackend,
+                       SQLiteSearchBackend)
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (SQLiteSearchBackend, PostgresSearchBackend)
+}
+
+__all__ = (
+    'BaseSearchBackend',
+    'PostgresSearchBackend',
+    'SQLiteSearchBackend',
+    'get_backend',
+    'install_search_index',
+    'uninstall_search_index',
+)
+
+
+def get_backend(vendor=None):
+    """Бэкенд из NOTES_SEARCH_BACKEND или подходящий к базе данных."""
+    if settings.NOTES_SEARCH_BACKEND:
+        return import_string(settings.NOTES_SEARCH_BACKEND)()
+    return BACKENDS[vendor or connection.vendor]()
+
+
+def install_search_index(apps, schema_editor):
+    """
+    Операция RunPython: создаёт индекс для базы миграции.
+
+    На SQLite AddField пересоздаёт таблицу notes_note вместе с её
+    триггерами, поэтому такие миграции снимают индекс до изменения
+    схемы и ставят его заново после.
+    """
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend().install(schema_editor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    backend = BACKENDS.get(schema_editor.connection.vendor)
+    if backend is not None:
+        backend().uninstall(schema_editor)
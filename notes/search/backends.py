@@ -0,0 +1,221 @@
+from django.db import connections, transaction
+from django.db.models import Case, IntegerField, When
+
+from ..routers import notes_db
+from .stemmer import stem_terms
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс полнотекстового индекса заметок.
+
+    Бэкенд создаёт и удаляет структуры индекса в миграции, ищет по
+    заголовку и тексту в пределах переданного queryset и умеет
+    перестраивать индекс порциями. С author_id поиск ограничен
+    заметками автора в самом индексе.
+    """
+
+    vendor = None
+
+    def install(self, schema_editor):
+        raise NotImplementedError
+
+    def uninstall(self, schema_editor):
+        raise NotImplementedError
+
+    def search(self, queryset, query, limit, author_id=None):
+        """Возвращает заметки из queryset в порядке релевантности."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size):
+        """Перестраивает индекс, отдавая число обработанных заметок."""
+        raise NotImplementedError
+
+    @staticmethod
+    def order_by_ids(queryset, ids):
+        """Сохраняет порядок id, полученный от индекса."""
+        if not ids:
+            return queryset.none()
+        ordering = Case(
+            *(When(pk=pk, then=position) for position, pk in enumerate(ids)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).order_by(ordering)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    Индекс FTS5 с внешним содержимым в таблице notes_note.
+
+    Теневые таблицы обновляются триггерами, поэтому индекс не отстаёт
+    от заметок при любом способе записи. Морфология учитывается на
+    стороне запроса: слова приводятся к основе и ищутся по префиксу.
+    Колонка author_id проиндексирована как токен, и с author_id MATCH
+    отбирает только заметки автора. Префикс основы и статистика bm25
+    всё равно читают список документов слова по всей базе, поэтому
+    запрос с частым словом дорожает вместе с корпусом (см.
+    benchmarks.search).
+    """
+
+    vendor = 'sqlite'
+    table = 'notes_note_fts'
+    title_weight = 10.0
+    text_weight = 1.0
+    author_weight = 0.0
+
+    def install(self, schema_editor):
+        table = self.table
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5("
+            f"title, text, author_id, "
+            f"content='notes_note', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_ai AFTER INSERT ON notes_note BEGIN '
+            f'INSERT INTO {table}(rowid, title, text, author_id) '
+            f'VALUES (new.id, new.title, new.text, new.author_id); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_ad AFTER DELETE ON notes_note BEGIN '
+            f"INSERT INTO {table}({table}, rowid, title, text, author_id) "
+            f"VALUES ('delete', old.id, old.title, old.text, "
+            f"old.author_id); END"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER {table}_au '
+            f'AFTER UPDATE OF title, text, author_id ON notes_note BEGIN '
+            f"INSERT INTO {table}({table}, rowid, title, text, author_id) "
+            f"VALUES ('delete', old.id, old.title, old.text, "
+            f"old.author_id); "
+            f'INSERT INTO {table}(rowid, title, text, author_id) '
+            f'VALUES (new.id, new.title, new.text, new.author_id); END'
+        )
+        schema_editor.execute(
+            f"INSERT INTO {table}({table}) VALUES ('rebuild')"
+        )
+
+    def uninstall(self, schema_editor):
+        for suffix in ('_ai', '_ad', '_au'):
+            schema_editor.execute(
+                f'DROP TRIGGER IF EXISTS {self.table}{suffix}'
+            )
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    @staticmethod
+    def match_expression(query, author_id=None):
+        """
+        Каждая основа ищется как префикс, все слова обязательны.
+
+        Слова ищутся только в заголовке и тексте; author_id добавляет
+        условие на колонку автора.
+        """
+        terms = ' '.join(f'"{term}"*' for term in stem_terms(query) if term)
+        if not terms:
+            return ''
+        expression = f'{{title text}} : ({terms})'
+        if author_id is None:
+            return expression
+        return f'author_id : "{int(author_id)}" AND {expression}'
+
+    def search(self, queryset, query, limit, author_id=None):
+        expression = self.match_expression(query, author_id)
+        if not expression:
+            return queryset.none()
+        scope_sql, scope_params = (
+            queryset.order_by().values('pk').query.sql_with_params()
+        )
+        # Унарный плюс не даёт передать IN в FTS5 как ограничение rowid:
+        # иначе полнотекстовый запрос выполнялся бы заново для каждого id.
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND +rowid IN ({scope_sql}) '
+                f'ORDER BY bm25({self.table}, %s, %s, %s) LIMIT %s',
+                (expression, *scope_params, self.title_weight,
+                 self.text_weight, self.author_weight, limit),
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return self.order_by_ids(queryset, ids)
+
+    def rebuild(self, batch_size):
+        table = self.table
+        using = notes_db()
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table}({table}) VALUES ('delete-all')"
+            )
+        last_id = 0
+        while True:
+            with transaction.atomic(using=using), \
+                    connections[using].cursor() as cursor:
+                cursor.execute(
+                    'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM notes_note '
+                    'WHERE id > %s ORDER BY id LIMIT %s)',
+                    (last_id, batch_size),
+                )
+                batch_last_id, indexed = cursor.fetchone()
+                if not indexed:
+                    return
+                cursor.execute(
+                    f'INSERT INTO {table}(rowid, title, text, author_id) '
+                    f'SELECT id, title, text, author_id FROM notes_note '
+                    f'WHERE id > %s AND id <= %s',
+                    (last_id, batch_last_id),
+                )
+            last_id = batch_last_id
+            yield indexed
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Поиск по tsvector с русской конфигурацией и индексом GIN."""
+
+    vendor = 'postgresql'
+    config = 'russian'
+    index_name = 'notes_note_search_gin'
+
+    def document_sql(self):
+        return (
+            f"setweight(to_tsvector('{self.config}'::regconfig, "
+            f"COALESCE(title, '')), 'A') || "
+            f"setweight(to_tsvector('{self.config}'::regconfig, "
+            f"COALESCE(text, '')), 'B')"
+        )
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.index_name} '
+            f'ON notes_note USING GIN (({self.document_sql()}))'
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+
+    def search(self, queryset, query, limit, author_id=None):
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+
+        vector = (
+            SearchVector('title', weight='A', config=self.config)
+            + SearchVector('text', weight='B', config=self.config)
+        )
+        search_query = SearchQuery(
+            query, config=self.config, search_type='websearch'
+        )
+        if author_id is not None:
+            queryset = queryset.filter(author_id=author_id)
+        ids = list(
+            queryset.annotate(
+                document=vector,
+                rank=SearchRank(vector, search_query),
+            ).filter(
+                document=search_query
+            ).order_by('-rank').values_list('pk', flat=True)[:limit]
+        )
+        return self.order_by_ids(queryset, ids)
+
+    def rebuild(self, batch_size):
+        with connections[notes_db()].cursor() as cursor:
+            cursor.execute(f'REINDEX INDEX {self.index_name}')
+            cursor.execute('SELECT COUNT(*) FROM notes_note')
+            yield cursor.fetchone()[0]
@@ -0,0 +1,119 @@
+"""Стеммер русского языка по алгоритму Snowball (Портера)."""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', 'вши', 'в'),
+    ('ившись', 'ывшись', 'ивши', 'ывши', 'ив', 'ыв'),
+)
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    ('ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'й', 'л', 'н'),
+    ('ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило', 'ыло',
+     'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил',
+     'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю'),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах', 'ях',
+    'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Возвращает начала областей RV и R2 слова."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание, целиком лежащее в области."""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            return word[:-len(ending)], True
+    return word, False
+
+
+def _strip_grouped(word, start, groups):
+    """Окончания первой группы должны следовать за «а» или «я»."""
+    first, second = groups
+    candidates = [(ending, True) for ending in first]
+    candidates += [(ending, False) for ending in second]
+    for ending, needs_a in sorted(
+            candidates, key=lambda item: len(item[0]), reverse=True
+    ):
+        if not word.endswith(ending):
+            continue
+        stem = word[:-len(ending)]
+        if len(stem) < start:
+            continue
+        if needs_a and not (len(stem) > start and stem[-1] in 'ая'):
+            continue
+        return stem, True
+    return word, False
+
+
+def _strip_adjectival(word, start):
+    word, found = _strip(word, start, ADJECTIVE)
+    if found:
+        word, _ = _strip_grouped(word, start, PARTICIPLE)
+    return word, found
+
+
+def stem(word):
+    """Возвращает основу русского слова; латиница остаётся как есть."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+
+    word, found = _strip_grouped(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _strip(word, rv, REFLEXIVE)
+        word, found = _strip_adjectival(word, rv)
+        if not found:
+            word, found = _strip_grouped(word, rv, VERB)
+        if not found:
+            word, _ = _strip(word, rv, NOUN)
+
+    word, _ = _strip(word, rv, ('и',))
+    word, _ = _strip(word, r2, DERIVATIONAL)
+
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        return word[:-1]
+    word, found = _strip(word, rv, SUPERLATIVE)
+    if found and word.endswith('нн'):
+        return word[:-1]
+    if not found:
+        word, _ = _strip(word, rv, ('ь',))
+    return word
+
+
+def stem_terms(text):
+    """Разбивает строку запроса на слова и возвращает их основы."""
+    return [stem(word) for word in WORD_RE.findall(text)]
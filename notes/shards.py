@@ -0,0 +1,294 @@
+"""
+Шардирование заметок по автору.
+
+Заметки пользователя и всё, что к ним относится (тексты NoteBody,
+история, журнал изменений, версия набора, очередь задач), лежат в
+одной базе из NOTES_SHARDS. Пользователи, сессии и ShardPlacement
+остаются в default. Пока база в NOTES_SHARDS одна, шардирования нет.
+
+Новый пользователь попадает в шард по устойчивому хешу id, и выбор
+записывается в ShardPlacement: добавление шардов никого не переносит.
+Пользователь без строки живёт в default — там остаются заметки,
+созданные до включения шардов.
+
+Запрос работает с шардом вошедшего пользователя (ShardMiddleware),
+команды и фоновые задачи — с шардом из on_shard(). Поэтому slug
+уникален в пределах автора, а id заметок — в пределах шарда.
+
+move_user переносит пользователя, не останавливая остальных: строка
+помечается moving, и его изменения получают 503, пока заметки
+копируются в новый шард одной транзакцией. Id заметок в новом шарде
+другие, поэтому журнал изменений начинается заново, а граница его
+сжатия поднимается до конца: клиенты синхронизации получат 410 и
+перечитают заметки целиком.
+"""
+import time
+import zlib
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import autocomplete, cache
+from .bulk import raw_delete
+from .models import (BODY_INSERT_BATCH, Note, NoteBody, NoteBodyChunk,
+                     NoteChange, NoteRevision, NotesVersion, ShardPlacement)
+from .queue import enqueue_many_on_commit, enqueue_on_commit
+from .routers import notes_db, on_shard
+
+NOTE_FIELDS = (
+    'id', 'title', 'text', 'body_id', 'slug', 'created', 'updated',
+    'word_count',
+)
+REVISION_FIELDS = (
+    'note_id', 'number', 'is_snapshot', 'title', 'data', 'size', 'created',
+)
+
+
+def aliases():
+    return tuple(settings.NOTES_SHARDS)
+
+
+def enabled():
+    return len(settings.NOTES_SHARDS) > 1
+
+
+def hash_alias(user_id):
+    """Шард нового пользователя: crc32 от id по числу шардов."""
+    shards = aliases()
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def placement(user_id):
+    """Шард пользователя и признак переноса; один запрос к default."""
+    if not enabled():
+        return DEFAULT_DB_ALIAS, False
+    row = ShardPlacement.objects.filter(
+        user_id=user_id
+    ).values_list('alias', 'moving').first()
+    return row or (DEFAULT_DB_ALIAS, False)
+
+
+@contextmanager
+def for_user(user_id):
+    """Заметки в блоке — в шарде пользователя."""
+    with on_shard(placement(user_id)[0]):
+        yield
+
+
+def assign(user_id):
+    """Выбирает и записывает шард нового пользователя."""
+    if not enabled():
+        return DEFAULT_DB_ALIAS
+    alias = hash_alias(user_id)
+    ShardPlacement.objects.create(user_id=user_id, alias=alias)
+    return alias
+
+
+def purge(user_id):
+    """
+    Удаляет из текущего шарда заметки пользователя и их следы.
+
+    Как bulk.delete_notes, без сигналов на каждую заметку; тексты
+    NoteBody освобождает фоновая задача.
+    """
+    notes = Note.objects.filter(author_id=user_id)
+    with transaction.atomic(using=notes_db()):
+        body_ids = set(
+            notes.exclude(body=None).values_list('body_id', flat=True)
+        )
+        raw_delete(notes)
+        NoteChange.objects.filter(user_id=user_id).delete()
+        NotesVersion.objects.filter(user_id=user_id).delete()
+        enqueue_many_on_commit('release_note_body', body_ids)
+
+
+def copy_bodies(body_ids, source, target):
+    """
+    Тексты NoteBody из source в target; возвращает {старый id: новый}.
+
+    Тексты, которые в target уже есть, находятся по хешу; куски
+    остальных копируются как есть, без распаковки.
+    """
+    rows = NoteBody.objects.using(source).filter(
+        pk__in=body_ids
+    ).values_list('pk', 'digest', 'size')
+    existing = dict(
+        NoteBody.objects.using(target).filter(
+            digest__in=[digest for _, digest, _ in rows]
+        ).values_list('digest', 'pk')
+    )
+    mapping = {}
+    for body_id, digest, size in rows:
+        if digest not in existing:
+            body = NoteBody.objects.using(target).create(
+                digest=digest, size=size
+            )
+            chunks = (
+                NoteBodyChunk(body_id=body.pk, number=number, data=data)
+                for number, data in NoteBodyChunk.objects.using(source)
+                .filter(body_id=body_id).order_by('number')
+                .values_list('number', 'data').iterator(chunk_size=1)
+            )
+            while True:
+                batch = list(islice(chunks, BODY_INSERT_BATCH))
+                if not batch:
+                    break
+                NoteBodyChunk.objects.using(target).bulk_create(batch)
+            existing[digest] = body.pk
+        mapping[body_id] = existing[digest]
+    return mapping
+
+
+def copy_notes(user_id, source, target):
+    """
+    Копирует заметки пользователя порциями по NOTES_BULK_CHUNK_SIZE.
+
+    Возвращает пары (новый id, slug) в порядке старых id.
+    """
+    queryset = Note.objects.using(source).filter(
+        author_id=user_id
+    ).order_by('pk').values(*NOTE_FIELDS)
+    size = settings.NOTES_BULK_CHUNK_SIZE
+    copied = []
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id)[:size])
+        if not rows:
+            return copied
+        last_id = rows[-1]['id']
+        bodies = copy_bodies(
+            {row['body_id'] for row in rows if row['body_id'] is not None},
+            source, target,
+        )
+        notes = [
+            Note(
+                author_id=user_id, title=row['title'], text=row['text'],
+                body_id=bodies.get(row['body_id']), slug=row['slug'],
+                word_count=row['word_count'],
+            )
+            for row in rows
+        ]
+        Note.objects.using(target).bulk_create(notes)
+        ids = dict(
+            Note.objects.using(target).filter(
+                author_id=user_id, slug__in=[row['slug'] for row in rows]
+            ).values_list('slug', 'pk')
+        )
+        # bulk_create ставит created и updated в текущее время.
+        for note, row in zip(notes, rows):
+            note.pk = ids[row['slug']]
+            note.created = row['created']
+            note.updated = row['updated']
+        Note.objects.using(target).bulk_update(notes, ('created', 'updated'))
+        autocomplete.index_notes(notes)
+        new_ids = {row['id']: note.pk for note, row in zip(notes, rows)}
+        revisions = NoteRevision.objects.using(source).filter(
+            note_id__in=new_ids
+        ).values(*REVISION_FIELDS)
+        NoteRevision.objects.using(target).bulk_create(
+            NoteRevision(**{**row, 'note_id': new_ids[row['note_id']]})
+            for row in revisions
+        )
+        copied += [(note.pk, note.slug) for note in notes]
+
+
+def copy_user(user_id, source, target):
+    """Копирует заметки пользователя в target одной транзакцией."""
+    version = NotesVersion.objects.using(source).filter(
+        user_id=user_id
+    ).values_list('version', flat=True).first() or 0
+    with on_shard(target), transaction.atomic(using=target):
+        copied = copy_notes(user_id, source, target)
+        last = version + len(copied)
+        NotesVersion.objects.create(
+            user_id=user_id, version=last, changes_floor=last
+        )
+        NoteChange.objects.bulk_create(
+            NoteChange(
+                user_id=user_id, seq=seq, note_id=note_id, slug=slug,
+                action=NoteChange.CREATE,
+            )
+            for seq, (note_id, slug) in enumerate(copied, version + 1)
+        )
+        enqueue_on_commit('word_count_backfill', user_id)
+    return len(copied)
+
+
+def move_user(user_id, target, grace=None):
+    """
+    Переносит заметки пользователя в шард target.
+
+    Перед копированием ждёт grace секунд (NOTES_SHARD_MOVE_GRACE), чтобы
+    закончились запросы, начатые до пометки moving. Прерванный перенос
+    можно повторить: остатки прошлой попытки в target удаляются.
+    Возвращает число перенесённых заметок.
+    """
+    if target not in aliases():
+        raise ValueError(f'{target} нет в NOTES_SHARDS')
+    source, _ = placement(user_id)
+    if source == target:
+        return 0
+    ShardPlacement.objects.update_or_create(user_id=user_id, defaults={
+        'alias': source, 'moving': True, 'updated': timezone.now(),
+    })
+    time.sleep(settings.NOTES_SHARD_MOVE_GRACE if grace is None else grace)
+    try:
+        with on_shard(target):
+            purge(user_id)
+        moved = copy_user(user_id, source, target)
+    except Exception:
+        ShardPlacement.objects.filter(user_id=user_id).update(moving=False)
+        raise
+    ShardPlacement.objects.filter(user_id=user_id).update(
+        alias=target, moving=False, updated=timezone.now()
+    )
+    cache.invalidate_user(user_id)
+    with on_shard(source):
+        purge(user_id)
+    return moved
+
+
+def note_counts():
+    """{алиас: {id пользователя: число заметок}} по всем шардам."""
+    return {
+        alias: dict(
+            Note.objects.using(alias).order_by().values_list('author_id')
+            .annotate(Count('id'))
+        )
+        for alias in aliases()
+    }
+
+
+def plan_moves(counts, max_moves):
+    """
+    Переносы (пользователь, откуда, куда), выравнивающие число заметок.
+
+    Каждый шаг переносит с самого загруженного шарда на самый свободный
+    пользователя, после переноса которого разрыв между ними меньше всего.
+    """
+    counts = {alias: dict(users) for alias, users in counts.items()}
+    totals = {alias: sum(users.values()) for alias, users in counts.items()}
+    moves = []
+    while len(moves) < max_moves:
+        fullest = max(totals, key=totals.get)
+        emptiest = min(totals, key=totals.get)
+        gap = totals[fullest] - totals[emptiest]
+        candidates = [
+            (notes, user_id) for user_id, notes in counts[fullest].items()
+            if notes < gap
+        ]
+        if not candidates:
+            return moves
+        notes, user_id = min(
+            candidates, key=lambda candidate: abs(gap - 2 * candidate[0])
+        )
+        del counts[fullest][user_id]
+        counts[emptiest][user_id] = notes
+        totals[fullest] -= notes
+        totals[emptiest] += notes
+        moves.append((user_id, fullest, emptiest))
+    return moves
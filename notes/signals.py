@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete, changes, revisions, shards
+from .auth import users
+from .cache import invalidate_user
+from .metrics import install_execute_wrapper
+from .models import Note, NoteChange, NotesVersion
+from .queue import enqueue_on_commit
+from .routers import on_shard
+
+connection_created.connect(install_execute_wrapper)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_cache(sender, instance, signal, created=False,
+                          **kwargs):
+    """Любое изменение заметки сбрасывает кеш её автора и ETag."""
+    invalidate_user(instance.author_id)
+    if signal is post_delete:
+        action = NoteChange.DELETE
+    else:
+        action = NoteChange.CREATE if created else NoteChange.UPDATE
+    changes.record(instance.author_id, action, [(instance.pk, instance.slug)])
+
+
+@receiver(post_save, sender=Note)
+def record_revision(sender, instance, raw=False, **kwargs):
+    """Новый заголовок или текст попадает в историю версий."""
+    if not raw:
+        revisions.record(instance)
+
+
+@receiver(post_save, sender=Note)
+def update_note_keys(sender, instance, created, update_fields=None,
+                     **kwargs):
+    """Ключи автодополнения следуют за заголовком и slug."""
+    if update_fields is None or {'title', 'slug'} & set(update_fields):
+        autocomplete.index_note(instance, created)
+
+
+@receiver(post_save, sender=Note)
+def schedule_note_tasks(sender, instance, raw=False, **kwargs):
+    """Обработка заметки идёт в фоне, после коммита."""
+    if not raw:
+        enqueue_on_commit('word_count', instance.pk)
+    replaced_body_id = instance.__dict__.pop('replaced_body_id', None)
+    if replaced_body_id is not None:
+        enqueue_on_commit('release_note_body', replaced_body_id)
+
+
+@receiver(post_delete, sender=Note)
+def release_note_body(sender, instance, **kwargs):
+    if instance.body_id is not None:
+        enqueue_on_commit('release_note_body', instance.body_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache(sender, instance, created=True, **kwargs):
+    """Новый пользователь не должен получить кеш удалённого с тем же id."""
+    if created:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_notes_version(sender, instance, created, raw=False, **kwargs):
+    """Новый пользователь получает шард и версию набора заметок в нём."""
+    if created and not raw:
+        with on_shard(shards.assign(instance.pk)):
+            NotesVersion.objects.create(user=instance)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def purge_sharded_notes(sender, instance, **kwargs):
+    """
+    Заметки в другом шарде удаляются после удаления пользователя.
+
+    Заметки в default удаляет каскад самого удаления.
+    """
+    user_id = instance.pk
+    alias, _ = shards.placement(user_id)
+    if alias == DEFAULT_DB_ALIAS:
+        return
+
+    def purge():
+        with on_shard(alias):
+            shards.purge(user_id)
+
+    transaction.on_commit(purge)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    """Смена пароля, вход и удаление не должны видеть старую копию."""
+    users.invalidate(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        users.invalidate(user.pk)
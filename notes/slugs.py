@@ -0,0 +1,110 @@
+"""
+Подбор уникальных slug для заметок.
+
+Занятые варианты slug ищутся одним запросом по диапазону уникального
+индекса: сам slug и все его варианты с числовым суффиксом «-N» лежат
+между «основа-» и «основа.», так как «.» следует за «-» в ASCII.
+"""
+import random
+from functools import lru_cache
+
+from django.db.models import Q
+
+SLUG_MAX_LENGTH = 100
+SUFFIX_ROOM = 7
+RANGE_QUERY_BATCH = 250
+FALLBACK_SLUG = 'note'
+
+
+@lru_cache(maxsize=4096)
+def slugify_title(title):
+    """
+    Транслитерация заголовка; результат кешируется для повторов.
+
+    pytils импортируется при первом подборе slug, а не при запуске
+    процесса: многим процессам (API на чтение, run_tasks) он не нужен.
+    """
+    from pytils.translit import slugify
+
+    return slugify(title)[:SLUG_MAX_LENGTH] or FALLBACK_SLUG
+
+
+def stem_of(base):
+    """Основа для суффиксов, чтобы «основа-N» влезла в max_length."""
+    return base[:SLUG_MAX_LENGTH - SUFFIX_ROOM]
+
+
+def suffix_range(base):
+    stem = stem_of(base)
+    return Q(slug=base) | Q(slug__gt=f'{stem}-', slug__lt=f'{stem}.')
+
+
+def suffix_number(slug, stem):
+    """Номер суффикса slug вида «stem-N» или None."""
+    suffix = slug[len(stem) + 1:]
+    if slug.startswith(f'{stem}-') and suffix.isdigit():
+        return int(suffix)
+    return None
+
+
+class SlugAllocator:
+    """
+    Назначает свободные slug с учётом уже выданных в этом вызове.
+
+    spread добавляет к первому номеру случайный сдвиг, чтобы повторные
+    попытки параллельных запросов не выбирали один и тот же номер.
+    """
+
+    def __init__(self, taken, spread=0):
+        self.taken = set(taken)
+        self.spread = spread
+        self.next_numbers = {}
+
+    def allocate(self, base):
+        if base not in self.taken:
+            self.taken.add(base)
+            return base
+        stem = stem_of(base)
+        number = self.next_numbers.get(stem)
+        if number is None:
+            numbers = (suffix_number(slug, stem) for slug in self.taken)
+            number = max(filter(None, numbers), default=1) + 1
+            number += random.randint(0, self.spread)
+        slug = f'{stem}-{number}'
+        while slug in self.taken:
+            number += 1
+            slug = f'{stem}-{number}'
+        self.next_numbers[stem] = number + 1
+        self.taken.add(slug)
+        return slug
+
+
+def taken_slugs(queryset, bases):
+    """Занятые варианты всех основ; один запрос на порцию основ."""
+    bases = list(dict.fromkeys(bases))
+    taken = set()
+    for start in range(0, len(bases), RANGE_QUERY_BATCH):
+        batch = bases[start:start + RANGE_QUERY_BATCH]
+        # Q(*условия) вместо цепочки «|»: та копирует накопленное
+        # условие на каждом шаге.
+        condition = Q(
+            *(suffix_range(base) for base in batch), _connector=Q.OR
+        )
+        taken.update(
+            queryset.filter(condition).values_list('slug', flat=True)
+        )
+    return taken
+
+
+def allocate(queryset, base, exclude_pk=None, spread=0):
+    """Свободный slug для одной заметки за один запрос."""
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    taken = taken_slugs(queryset, [base])
+    return SlugAllocator(taken, spread).allocate(base)
+
+
+def allocate_many(queryset, bases):
+    """Свободные slug для порции заметок, включая повторы внутри неё."""
+    allocator = SlugAllocator(taken_slugs(queryset, bases))
+    return [allocator.allocate(base) for base in bases]
@@ -0,0 +1,163 @@
+"""
+Статика с хешем в имени и заранее сжатыми копиями.
+
+collectstatic (CompressedManifestStaticFilesStorage) кладёт в
+STATIC_ROOT копии файлов с хешем содержимого в имени и рядом с каждой
+сжимаемой копией — .br и .gz с наибольшим сжатием: при запросах сжимать
+статику не нужно. {% static %} ссылается на имена с хешем, поэтому
+такие файлы кешируются навсегда, а новая версия файла получает новый
+адрес. Отдаёт их StaticFilesMiddleware по индексу, который строит
+collect().
+"""
+import json
+import mimetypes
+import os
+from pathlib import Path
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from . import compression
+
+COMPRESSIBLE = frozenset((
+    '.css', '.js', '.map', '.svg', '.txt', '.json', '.html', '.xml',
+))
+# Уровни сжатия статики — максимальные: сжимается один раз.
+LEVELS = {'br': 11, 'gzip': 9}
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+MANIFEST_NAME = ManifestStaticFilesStorage.manifest_name
+
+
+def write_atomic(path, data):
+    """Прерванная запись не оставит обрезанный файл под именем path."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Имена с хешем содержимого и сжатые копии .br и .gz.
+
+    Сжатая копия сохраняется, только если она меньше исходного файла.
+    Без manifest, то есть пока collectstatic не запускали (разработка,
+    тесты), {% static %} ссылается на исходные имена.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        """Пишет сжатые копии файла name; возвращает их имена."""
+        if Path(name).suffix.lower() not in COMPRESSIBLE:
+            return []
+        path = self.path(name)
+        data = None
+        written = []
+        for encoding in compression.ENCODINGS:
+            compressed_name = name + SUFFIXES[encoding]
+            # Содержимое файла с хешем в имени не меняется.
+            if self.exists(compressed_name):
+                continue
+            if data is None:
+                with open(path, 'rb') as file:
+                    data = file.read()
+            compressed = compression.compress(
+                data, encoding, LEVELS[encoding]
+            )
+            if len(compressed) < len(data):
+                write_atomic(self.path(compressed_name), compressed)
+                written.append(compressed_name)
+        return written
+
+
+def stat(path):
+    """Путь, размер и время изменения файла."""
+    result = os.stat(path)
+    return path, result.st_size, int(result.st_mtime)
+
+
+class StaticFile:
+    """
+    Файл из STATIC_ROOT и его сжатые копии.
+
+    variants — {кодировка: (путь, размер, время изменения)}, вариант
+    без сжатия — под ключом None. Размеры читаются один раз при
+    построении индекса.
+    """
+
+    def __init__(self, path, content_type, immutable):
+        self.content_type = content_type
+        self.immutable = immutable
+        self.variants = {None: stat(path)}
+
+    @property
+    def encodings(self):
+        """Сжатые варианты в порядке предпочтения сервера."""
+        return tuple(
+            encoding for encoding in compression.ENCODINGS
+            if encoding in self.variants
+        )
+
+
+def content_type(name):
+    guessed, _ = mimetypes.guess_type(name)
+    if guessed is None:
+        return 'application/octet-stream'
+    if guessed.startswith('text/') or guessed in (
+        'application/javascript', 'application/json',
+    ):
+        return f'{guessed}; charset=utf-8'
+    return guessed
+
+
+def hashed_names(root):
+    """Имена с хешем из manifest collectstatic."""
+    manifest = Path(root) / MANIFEST_NAME
+    try:
+        with open(manifest, encoding='utf-8') as file:
+            return frozenset(json.load(file)['paths'].values())
+    except FileNotFoundError:
+        return frozenset()
+
+
+def collect(root, url):
+    """
+    {адрес: StaticFile} для всех файлов в root.
+
+    Файлы с хешем в имени (по manifest) помечены immutable. Пустой
+    словарь, если root не задан или collectstatic не запускали.
+    """
+    if not root or not os.path.isdir(root):
+        return {}
+    root = Path(root)
+    hashed = hashed_names(root)
+    suffixes = {suffix: encoding for encoding, suffix in SUFFIXES.items()}
+    files, compressed = {}, []
+    for path in root.rglob('*'):
+        if not path.is_file():
+            continue
+        name = path.relative_to(root).as_posix()
+        if name == MANIFEST_NAME:
+            continue
+        stem, suffix = os.path.splitext(name)
+        if suffix in suffixes and stem in hashed:
+            compressed.append((stem, suffixes[suffix], str(path)))
+            continue
+        files[name] = StaticFile(
+            str(path), content_type(name), name in hashed
+        )
+    for stem, encoding, path in compressed:
+        if stem in files:
+            files[stem].variants[encoding] = stat(path)
+    return {url + name: static for name, static in files.items()}
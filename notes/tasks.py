@@ -0,0 +1,51 @@
+"""Фоновые задачи заметок; регистрируются при запуске приложения."""
+from . import cache
+from .models import Note, NoteBody, NotesVersion
+from .queue import task
+
+BACKFILL_BATCH = 1000
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def save_word_counts(notes):
+    """Записывает число слов без сигналов и сбрасывает кеш авторов."""
+    for note in notes:
+        note.word_count = count_words(note.text)
+    Note.objects.bulk_update(notes, ('word_count',))
+    for author_id in {note.author_id for note in notes}:
+        cache.invalidate_user(author_id)
+        NotesVersion.bump(author_id)
+
+
+@task('word_count')
+def update_word_counts(keys):
+    """Число слов в изменённых заметках."""
+    notes = list(
+        Note.objects.filter(pk__in=keys)
+        .only('id', 'text', 'body', 'author_id')
+    )
+    if notes:
+        save_word_counts(notes)
+
+
+@task('word_count_backfill')
+def backfill_word_counts(keys):
+    """Число слов во всех заметках авторов, где его ещё нет."""
+    for author_id in keys:
+        notes = Note.objects.filter(
+            author_id=author_id, word_count__isnull=True
+        ).only('id', 'text', 'body', 'author_id').order_by('id')
+        while True:
+            batch = list(notes[:BACKFILL_BATCH])
+            if not batch:
+                break
+            save_word_counts(batch)
+
+
+@task('release_note_body')
+def release_note_bodies(keys):
+    """Тексты, на которые больше не ссылается ни одна заметка."""
+    NoteBody.objects.filter(pk__in=keys, notes__isnull=True).delete()
@@ -0,0 +1,60 @@
+"""
+Быстрое создание тестовых данных.
+
+Пользователи и заметки создаются bulk_create, без сигналов на каждый
+объект: строки NotesVersion, тексты NoteBody, первые версии истории и
+записи журнала изменений добавляются так же пакетно, как при импорте.
+Тысяча заметок стоит нескольких запросов, а не нескольких тысяч.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from notes import bulk, cache
+from notes.models import Note, NotesVersion
+
+User = get_user_model()
+
+
+def make_users(*usernames):
+    """Пользователи в порядке usernames, каждый со своей NotesVersion."""
+    User.objects.bulk_create(User(username=name) for name in usernames)
+    users = {
+        user.username: user
+        for user in User.objects.filter(username__in=usernames)
+    }
+    NotesVersion.objects.bulk_create(
+        NotesVersion(user=user) for user in users.values()
+    )
+    return [users[name] for name in usernames]
+
+
+def login(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def make_notes(author, count, title='Заметка', text='Текст', slug='note'):
+    """
+    Заметки автора со slug вида slug-номер, всего count.
+
+    Возвращает заметки в порядке номеров, уже с первичными ключами.
+    """
+    notes = [
+        Note(
+            author=author, title=f'{title} {number}', text=text,
+            slug=f'{slug}-{number}',
+        )
+        for number in range(count)
+    ]
+    size = settings.NOTES_BULK_CHUNK_SIZE
+    for start in range(0, count, size):
+        bulk.save_chunk(notes[start:start + size])
+    cache.invalidate_user(author.pk)
+    saved = {
+        note.slug: note for note in Note.objects.filter(
+            author=author, slug__in=[note.slug for note in notes]
+        )
+    }
+    return [saved[note.slug] for note in notes]
@@ -1,9 +1,23 @@
-from django.test import Client, TestCase
+from http import HTTPStatus
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.templatetags.static import static
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from notes import cache
 from notes.forms import NoteForm
-from notes.models import Note
+from notes.models import Note, ShardPlacement, Task
+from notes.routers import on_shard
+from notes.search import get_backend
+from notes.tests.factories import make_notes, make_users
 
 User = get_user_model()
 
@@ -59,3 +73,334 @@ class TestListPage(TestCase):
                 response = self.author_client.get(url)
                 self.assertIn('form', response.context)
                 self.assertIsInstance(response.context['form'], NoteForm)
+
+    def test_stylesheet_is_self_hosted(self):
+        """Bootstrap берётся из своей статики, а не с CDN."""
+        response = self.author_client.get(self.LIST_URL)
+        self.assertContains(
+            response, static('vendor/bootstrap/css/bootstrap.min.css')
+        )
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+
+
+@override_settings(NOTES_PAGINATE_BY=2)
+class TestListPagination(TestCase):
+
+    NOTES_COUNT = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметок')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        Note.objects.bulk_create(
+            Note(
+                title=f'Заметка {index}',
+                text='Текст',
+                slug=f'note-{index}',
+                author=cls.author
+            )
+            for index in range(cls.NOTES_COUNT)
+        )
+        cls.list_url = reverse('notes:list')
+
+    def test_cursor_pages_cover_all_notes(self):
+        """Курсоры вперёд обходят все заметки без повторов."""
+        seen = []
+        url = self.list_url
+        while url:
+            response = self.author_client.get(url)
+            page = response.context['page_obj']
+            seen.extend(note.id for note in page)
+            url = (
+                f'{self.list_url}?cursor={page.next_cursor}'
+                if page.has_next() else None
+            )
+        expected = list(
+            Note.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_same_page(self):
+        """Курсор назад возвращает предыдущую страницу."""
+        first_page = self.author_client.get(
+            self.list_url
+        ).context['page_obj']
+        second_page = self.author_client.get(
+            f'{self.list_url}?cursor={first_page.next_cursor}'
+        ).context['page_obj']
+        previous_page = self.author_client.get(
+            f'{self.list_url}?cursor={second_page.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            list(previous_page.object_list), list(first_page.object_list)
+        )
+        self.assertFalse(previous_page.has_previous())
+
+    def test_list_defers_text(self):
+        """Текст заметок не загружается в список."""
+        response = self.author_client.get(self.list_url)
+        for note in response.context['object_list']:
+            self.assertIn('text', note.get_deferred_fields())
+
+    def test_invalid_cursor(self):
+        """На битый курсор возвращается 404."""
+        response = self.author_client.get(f'{self.list_url}?cursor=@@@')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class TestSearch(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметок')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader = User.objects.create(username='Читатель')
+        cls.title_note = Note.objects.create(
+            title='Заметки о путешествии',
+            text='Поезд, вокзал и билеты',
+            slug='travel',
+            author=cls.author
+        )
+        cls.text_note = Note.objects.create(
+            title='Покупки',
+            text='Купить блокнот для заметок и ручку',
+            slug='shopping',
+            author=cls.author
+        )
+        cls.foreign_note = Note.objects.create(
+            title='Чужая заметка',
+            text='Текст',
+            slug='foreign',
+            author=cls.reader
+        )
+        cls.search_url = reverse('notes:search')
+
+    def search(self, query):
+        response = self.author_client.get(self.search_url, {'q': query})
+        return list(response.context['object_list'])
+
+    def test_word_forms_match(self):
+        """Разные формы слова находят одну и ту же заметку."""
+        for query in ('заметка', 'заметку', 'ЗАМЕТКАМИ'):
+            with self.subTest(query=query):
+                self.assertIn(self.title_note, self.search(query))
+
+    def test_title_ranks_higher_than_text(self):
+        """Совпадение в заголовке важнее совпадения в тексте."""
+        self.assertEqual(
+            self.search('вокзал')[:1], [self.title_note]
+        )
+        self.assertEqual(
+            self.search('блокнот'), [self.text_note]
+        )
+
+    def test_only_own_notes_found(self):
+        """Чужие заметки не попадают в результаты поиска."""
+        self.assertNotIn(self.foreign_note, self.search('заметка'))
+
+    def test_index_is_scoped_by_author(self):
+        """С author_id индекс отбирает только заметки этого автора."""
+        backend = get_backend()
+        notes = Note.objects.all()
+        self.assertEqual(
+            list(backend.search(notes, 'заметка', 10, self.reader.pk)),
+            [self.foreign_note],
+        )
+        self.assertEqual(
+            set(backend.search(notes, 'заметка', 10)),
+            {self.title_note, self.foreign_note},
+        )
+        self.assertEqual(
+            list(backend.search(notes, str(self.author.pk), 10,
+                                self.author.pk)),
+            [],
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        """Индекс обновляется при изменении и удалении заметки."""
+        self.text_note.text = 'Купить молоко'
+        self.text_note.save()
+        self.assertEqual(self.search('блокнот'), [])
+        self.assertEqual(self.search('молоко'), [self.text_note])
+        self.text_note.delete()
+        self.assertEqual(self.search('молоко'), [])
+
+    def test_rebuild_index_command(self):
+        """Индекс перестраивается порциями без потери заметок."""
+        call_command('rebuild_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.search('блокнот'), [self.text_note])
+        self.assertIn(self.title_note, self.search('заметка'))
+
+
+class TestTemplateCaching(TestCase):
+
+    LIST_URL = reverse('notes:list')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+
+    def setUp(self):
+        cache.bump_generation(self.author.pk)
+        self.fragments = caches['template_fragments']
+        self.fragments.clear()
+
+    def test_cached_loader(self):
+        """Шаблоны загружаются через кеширующий загрузчик."""
+        loaders = engines['django'].engine.template_loaders
+        self.assertIsInstance(loaders[0], CachedLoader)
+
+    def test_header_and_rows_are_cached(self):
+        """Шапка и строка списка попадают в кеш фрагментов."""
+        self.author_client.get(self.LIST_URL)
+        self.assertEqual(len(self.fragments._cache), 2)
+        response = self.author_client.get(self.LIST_URL)
+        self.assertEqual(len(self.fragments._cache), 2)
+        self.assertContains(response, self.author.username)
+        self.assertContains(response, self.note.title)
+
+    def test_edited_note_row_is_rendered_again(self):
+        """Новая версия заметки не берётся из старого фрагмента."""
+        self.author_client.get(self.LIST_URL)
+        self.author_client.post(
+            reverse('notes:edit', args=(self.note.slug,)),
+            data={'title': 'Новый заголовок', 'text': 'Текст', 'slug': 'slug'},
+        )
+        response = self.author_client.get(self.LIST_URL)
+        self.assertContains(response, 'Новый заголовок')
+
+    def test_header_depends_on_user(self):
+        """Анонимный пользователь не получает шапку автора."""
+        self.author_client.get(self.LIST_URL)
+        response = self.client.get(reverse('notes:home'))
+        self.assertNotContains(response, self.author.username)
+        self.assertContains(response, reverse('users:login'))
+
+
+class TestNoteAdmin(TestCase):
+    databases = {'default', 'shard1'}
+
+    CHANGELIST_URL = reverse('admin:notes_note_changelist')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other = make_users('Автор заметки', 'Другой автор')
+        cls.admin = User.objects.create(
+            username='Администратор', is_staff=True, is_superuser=True
+        )
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+        make_notes(cls.author, 10, title='Первая', slug='first')
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(self.CHANGELIST_URL, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def note_queries(self, queries):
+        return [sql for sql in queries if '"notes_note"' in sql]
+
+    def test_changelist_cost_does_not_depend_on_table_size(self):
+        """Десять и две тысячи заметок — одни и те же запросы списка."""
+        self.get()
+        _, small = self.get()
+        make_notes(self.other, 2000, title='Вторая', slug='second')
+        response, large = self.get()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        for sql in self.note_queries(large):
+            with self.subTest(sql=sql):
+                self.assertNotIn('"notes_note"."text"', sql)
+                if 'COUNT(' in sql:
+                    self.assertIn('LIMIT', sql)
+        self.assertFalse([
+            sql for sql in large
+            if '"notes_note"' in sql and '"auth_user"' in sql
+        ])
+        self.assertEqual(len([
+            sql for sql in large
+            if 'FROM "auth_user"' in sql and '"auth_user"."id" IN' in sql
+        ]), 1)
+
+    @override_settings(NOTES_SHARDS=('default', 'shard1'))
+    def test_changelist_of_shard(self):
+        """Заметки из шарда выводятся с авторами из default."""
+        for user in (self.admin, self.other):
+            ShardPlacement.objects.create(user=user, alias='shard1')
+        with on_shard('shard1'):
+            make_notes(self.other, 3, title='В шарде', slug='sharded')
+        response, _ = self.get()
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        self.assertContains(response, 'В шарде 2')
+        self.assertContains(response, self.other.username)
+
+    def test_estimated_count(self):
+        """По статистике ANALYZE список не считает строки вовсе."""
+        make_notes(self.other, 500, slug='second')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        response, queries = self.get()
+        self.assertEqual(response.context['cl'].result_count, 510)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        response, queries = self.get(author=self.author.pk)
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertContains(response, self.author.username)
+
+    def test_search_uses_indexes(self):
+        """Поиск по заголовку идёт через FTS, по slug — диапазоном."""
+        make_notes(self.other, 20, title='Вторая', slug='second')
+        for term, count in (('Первая', 10), ('second-1', 11), ('нет', 0)):
+            with self.subTest(term=term):
+                response, queries = self.get(q=term)
+                self.assertEqual(response.context['cl'].result_count, count)
+                self.assertFalse([sql for sql in queries if 'LIKE' in sql])
+
+    def test_author_is_autocomplete(self):
+        """Форма заметки не загружает список пользователей."""
+        note = Note.objects.filter(author=self.author).first()
+        url = reverse('admin:notes_note_change', args=(note.pk,))
+        with CaptureQueriesContext(connection) as context:
+            response = self.admin_client.get(url)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if 'FROM "auth_user"' in query['sql']
+            and 'WHERE' not in query['sql']
+        ])
+
+    def test_actions_run_in_chunks(self):
+        """Действия обрабатывают любое число заметок порциями."""
+        make_notes(self.other, 25, slug='second')
+        selected = list(Note.objects.values_list('pk', flat=True))
+        data = {'_selected_action': selected}
+        with override_settings(NOTES_BULK_MAX_NOTES=10):
+            self.admin_client.post(
+                self.CHANGELIST_URL, {**data, 'action': 'recount_words'}
+            )
+            self.assertEqual(
+                Task.objects.filter(name='word_count').count(), 35
+            )
+            with CaptureQueriesContext(connection) as context:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.admin_client.post(
+                        self.CHANGELIST_URL,
+                        {**data, 'action': 'delete_in_chunks'},
+                    )
+        self.assertFalse(Note.objects.exists())
+        chunk_selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT "notes_note"."id", '
+                                       '"notes_note"."author_id"')
+        ]
+        # Четыре порции и пустая, после которой обход заканчивается.
+        self.assertEqual(len(chunk_selects), 5)
+        choices = self.get()[0].context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', [name for name, _ in choices])
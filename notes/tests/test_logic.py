@@ -1,12 +1,49 @@
 from http import HTTPStatus
 
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import brotli
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import PROTECT
+from django.db.models.signals import post_delete, pre_delete
+from django.test import (AsyncClient, Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.html import escape
+from django.utils.http import urlencode
 from pytils.translit import slugify
 
-from notes.forms import WARNING
-from notes.models import Note
+from notes import (auth, autocomplete, bulk, cache, changes, checks,
+                   hashers, metrics, queue, revisions, routers, shards,
+                   slugs, throttle)
+from notes.forms import WARNING, NoteForm
+from notes.middleware import MetricsMiddleware, StaticFilesMiddleware
+from notes.models import (Note, NoteBody, NoteBodyChunk, NoteChange,
+                          NoteKey, NoteRevision, NotesVersion,
+                          ShardPlacement, Task)
+from notes.pagination import KeysetPaginator
+from notes.tests.factories import login, make_notes, make_users
+from yanote import settings_api, settings_production
 
 User = get_user_model()
 
@@ -138,3 +175,2121 @@ class TestPostEditDelete(TestCase):
         self.assertEqual(self.note.title, self.NOTE_TITLE)
         self.assertEqual(self.note.text, self.NOTE_TEXT)
         self.assertEqual(self.note.slug, self.NOTE_SLUG)
+
+
+class TestPageCache(TestCase):
+
+    NOTE_TITLE = 'Название заметки'
+    NEW_NOTE_TITLE = 'Новое название заметки'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title=cls.NOTE_TITLE,
+            text='Текст заметки',
+            slug='slug',
+            author=cls.author
+        )
+        cls.detail_url = reverse('notes:detail', args=(cls.note.slug,))
+        cls.list_url = reverse('notes:list')
+        cls.edit_url = reverse('notes:edit', args=(cls.note.slug,))
+
+    def setUp(self):
+        cache.bump_generation(self.author.pk)
+        cache.stats.reset()
+
+    def note_queries(self, url):
+        """Запросы к таблице заметок при открытии страницы."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.author_client.get(url)
+        queries = [
+            query for query in context.captured_queries
+            if '"notes_note"' in query['sql']
+        ]
+        return response, len(queries)
+
+    def test_repeated_reads_skip_database(self):
+        """Повторное чтение заметки и списка не обращается к базе."""
+        for url in (self.detail_url, self.list_url):
+            with self.subTest(url=url):
+                _, first = self.note_queries(url)
+                response, second = self.note_queries(url)
+                self.assertEqual(first, 1)
+                self.assertEqual(second, 0)
+                self.assertContains(response, self.NOTE_TITLE)
+        self.assertEqual(
+            cache.stats.snapshot(),
+            {'hits': 2, 'misses': 2, 'hit_ratio': 0.5},
+        )
+
+    def test_list_cache_key_uses_decoded_cursor(self):
+        """Битый курсор не попадает в кеш, запись курсора не важна."""
+        cursor = KeysetPaginator.encode_cursor('n', self.note.pk - 1)
+        for value in (' \x00' + 'x' * 300, '%%%'):
+            with self.subTest(cursor=value):
+                response = self.author_client.get(
+                    self.list_url, {'cursor': value}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        _, first = self.note_queries(f'{self.list_url}?cursor={cursor}')
+        response, second = self.note_queries(
+            f'{self.list_url}?cursor={cursor}=='
+        )
+        self.assertEqual((first, second), (1, 0))
+        self.assertContains(response, self.NOTE_TITLE)
+        self.assertEqual(cache.stats.snapshot()['misses'], 1)
+
+    def test_edit_makes_cached_pages_stale(self):
+        """После редактирования страницы показывают новую версию."""
+        self.note_queries(self.detail_url)
+        self.note_queries(self.list_url)
+        self.author_client.post(self.edit_url, data={
+            'title': self.NEW_NOTE_TITLE,
+            'text': 'Текст заметки',
+            'slug': self.note.slug,
+        })
+        for url in (self.detail_url, self.list_url):
+            with self.subTest(url=url):
+                response, queries = self.note_queries(url)
+                self.assertEqual(queries, 1)
+                self.assertContains(response, self.NEW_NOTE_TITLE)
+
+    def test_delete_makes_cached_detail_stale(self):
+        """Удалённая заметка не отдаётся из кеша."""
+        self.note_queries(self.detail_url)
+        self.author_client.delete(reverse('notes:delete', args=('slug',)))
+        response = self.author_client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_file_based_backend(self):
+        """Кеш работает и с файловым бэкендом."""
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': location,
+            }
+            with override_settings(
+                CACHES={**settings.CACHES, 'default': file_cache}
+            ):
+                self.addCleanup(caches['default'].close)
+                cache.bump_generation(self.author.pk)
+                _, first = self.note_queries(self.detail_url)
+                _, second = self.note_queries(self.detail_url)
+                cache.bump_generation(self.author.pk)
+                _, third = self.note_queries(self.detail_url)
+        self.assertEqual((first, second, third), (1, 0, 1))
+
+
+class TestBulkImportExport(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметок')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.existing = Note.objects.create(
+            title='Заметка',
+            text='Текст',
+            slug='zametka',
+            author=cls.author
+        )
+        cls.import_url = reverse('notes:import')
+        cls.export_url = reverse('notes:export')
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+
+    def post_ndjson(self, client, records):
+        body = '\n'.join(
+            record if isinstance(record, str)
+            else json.dumps(record, ensure_ascii=False)
+            for record in records
+        )
+        return client.post(
+            self.import_url, data=body, content_type='application/x-ndjson'
+        )
+
+    def test_import_deduplicates_slugs(self):
+        """Повторы slug в порции и в базе получают числовые суффиксы."""
+        response = self.post_ndjson(self.author_client, [
+            {'title': 'Заметка', 'text': 'Первая'},
+            {'title': 'Заметка', 'text': 'Вторая'},
+            {'title': 'Другая', 'text': 'Третья', 'slug': 'zametka'},
+        ])
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(
+            set(Note.objects.values_list('slug', flat=True)),
+            {'zametka', 'zametka-2', 'zametka-3', 'zametka-4'},
+        )
+
+    def test_import_reports_invalid_lines(self):
+        """Некорректные строки пропускаются с указанием номера."""
+        response = self.post_ndjson(self.author_client, [
+            {'title': 'Хорошая', 'text': 'Текст'},
+            'не json',
+            {'title': 'Без текста'},
+            {'title': 'Плохой slug', 'text': 'Текст', 'slug': 'a b'},
+        ])
+        result = response.json()
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(
+            [error['line'] for error in result['errors']], [2, 3, 4]
+        )
+        self.assertEqual(result['error_count'], 3)
+
+    @override_settings(NOTES_BULK_MAX_ERRORS=2)
+    def test_import_caps_stored_errors(self):
+        """Хранятся первые ошибки, счётчик учитывает все."""
+        response = self.post_ndjson(
+            self.author_client, ['не json'] * 5 + [
+                {'title': 'Хорошая', 'text': 'Текст'},
+            ]
+        )
+        result = response.json()
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(
+            [error['line'] for error in result['errors']], [1, 2]
+        )
+        self.assertEqual(result['error_count'], 5)
+
+    def test_import_query_count_does_not_grow(self):
+        """Число запросов импорта не зависит от числа заметок в порции."""
+        records = [
+            {'title': f'Заметка {index}', 'text': 'Текст'}
+            for index in range(50)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            self.post_ndjson(self.author_client, records)
+        note_queries = [
+            query for query in context.captured_queries
+            if '"notes_note"' in query['sql']
+        ]
+        self.assertLessEqual(len(note_queries), 3)
+        self.assertEqual(Note.objects.count(), 51)
+
+    def test_anonymous_cant_import(self):
+        """Анонимный пользователь не может импортировать заметки."""
+        self.post_ndjson(self.client, [{'title': 'Заметка', 'text': 'Т'}])
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_export_round_trip(self):
+        """Выгрузка возвращает заметки автора построчно."""
+        response = self.author_client.get(self.export_url)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{'title': 'Заметка', 'text': 'Текст', 'slug': 'zametka'}],
+        )
+
+
+class TestSlugAllocation(TestCase):
+
+    NOTE_TITLE = 'Название заметки'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.add_url = reverse('notes:add')
+        cls.form_data = {'title': cls.NOTE_TITLE, 'text': 'Текст заметки'}
+        cls.expected_slug = slugify(cls.NOTE_TITLE)
+
+    def create_competitor(self, slug):
+        Note.objects.create(
+            title='Чужая заметка', text='Текст', slug=slug,
+            author=self.author
+        )
+
+    def test_same_title_gets_numbered_slug(self):
+        """Одинаковые заголовки получают slug с суффиксами."""
+        for _ in range(3):
+            response = self.author_client.post(
+                self.add_url, data=self.form_data
+            )
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            set(Note.objects.values_list('slug', flat=True)),
+            {
+                self.expected_slug,
+                f'{self.expected_slug}-2',
+                f'{self.expected_slug}-3',
+            },
+        )
+
+    def test_create_uses_two_note_queries(self):
+        """Создание заметки: один запрос подбора slug и одна вставка."""
+        with CaptureQueriesContext(connection) as context:
+            self.author_client.post(self.add_url, data=self.form_data)
+        note_queries = [
+            query for query in context.captured_queries
+            if '"notes_note"' in query['sql']
+        ]
+        self.assertEqual(len(note_queries), 2)
+
+    def test_concurrent_create_retries_allocation(self):
+        """Если slug заняли между подбором и вставкой, подбор повторяется."""
+        allocate = slugs.allocate
+
+        def racing_allocate(*args, **kwargs):
+            slug = allocate(*args, **kwargs)
+            if not Note.objects.exists():
+                self.create_competitor(slug)
+            return slug
+
+        with mock.patch.object(
+                slugs, 'allocate', side_effect=racing_allocate
+        ) as patched:
+            response = self.author_client.post(
+                self.add_url, data=self.form_data
+            )
+        self.assertRedirects(response, reverse('notes:success'))
+        self.assertEqual(patched.call_count, 2)
+        note = Note.objects.get(title=self.NOTE_TITLE)
+        self.assertIn(
+            note.slug, (f'{self.expected_slug}-2', f'{self.expected_slug}-3')
+        )
+
+    def test_concurrent_explicit_slug_is_form_error(self):
+        """Явный slug, занятый параллельно, даёт ошибку формы, а не 500."""
+        data = {**self.form_data, 'slug': 'slug'}
+        validate_unique = NoteForm.validate_unique
+
+        def racing_validate_unique(form):
+            validate_unique(form)
+            self.create_competitor(form.cleaned_data['slug'])
+
+        with mock.patch.object(
+                NoteForm, 'validate_unique', racing_validate_unique
+        ):
+            response = self.author_client.post(self.add_url, data=data)
+        self.assertFormError(
+            response, form='form', field='slug', errors='slug' + WARNING
+        )
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_edit_with_empty_slug_keeps_own_slug(self):
+        """При пустом slug заметка не конфликтует сама с собой."""
+        note = Note.objects.create(
+            title=self.NOTE_TITLE, text='Текст', author=self.author
+        )
+        self.author_client.post(
+            reverse('notes:edit', args=(note.slug,)),
+            data={**self.form_data, 'slug': ''},
+        )
+        note.refresh_from_db()
+        self.assertEqual(note.slug, self.expected_slug)
+
+    def test_long_titles_keep_suffix_within_limit(self):
+        """Суффикс длинного slug укладывается в ограничение длины."""
+        title = 'а' * 100
+        first = Note.objects.create(title=title, text='Т', author=self.author)
+        second = Note.objects.create(title=title, text='Т', author=self.author)
+        self.assertNotEqual(first.slug, second.slug)
+        self.assertLessEqual(len(second.slug), slugs.SLUG_MAX_LENGTH)
+
+
+class TestNoteApi(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.reader = User.objects.create(username='Читатель')
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+        cls.list_url = reverse('notes:api-list')
+        cls.detail_url = reverse('notes:api-detail', args=(cls.note.slug,))
+
+    def setUp(self):
+        self.author_client = AsyncClient()
+        self.author_client.force_login(self.author)
+        self.reader_client = AsyncClient()
+        self.reader_client.force_login(self.reader)
+
+    async def test_anonymous_gets_401(self):
+        """Анонимный клиент получает 401, а не редирект."""
+        for url in (self.list_url, self.detail_url):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    async def test_list_and_detail(self):
+        """Автор получает свои заметки, чужой пользователь — 404."""
+        response = await self.author_client.get(self.list_url)
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.note.id, 'title': 'Заметка', 'slug': 'slug'}],
+        )
+        response = await self.author_client.get(self.detail_url)
+        self.assertEqual(response.json()['text'], 'Текст')
+        response = await self.reader_client.get(self.detail_url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    async def test_create_update_delete(self):
+        """Заметку можно создать, изменить и удалить через API."""
+        response = await self.author_client.post(
+            self.list_url,
+            data={'title': 'Новая заметка', 'text': 'Текст'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        url = reverse('notes:api-detail', args=(response.json()['slug'],))
+        response = await self.author_client.patch(
+            url, data={'text': 'Новый текст'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['text'], 'Новый текст')
+        self.assertEqual(response.json()['title'], 'Новая заметка')
+        response = await self.author_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = await self.author_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    async def test_invalid_payloads(self):
+        """Некорректные данные и занятый slug дают 400 с ошибками."""
+        for data in ('[]', {'title': 'Без текста'},
+                     {'title': 'Т', 'text': 'Т', 'slug': 'slug'}):
+            with self.subTest(data=data):
+                response = await self.author_client.post(
+                    self.list_url, data=data,
+                    content_type='application/json',
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+
+    async def test_list_cursor(self):
+        """Битый курсор — 400 до кеша, запись курсора не важна."""
+        cursor = KeysetPaginator.encode_cursor('n', self.note.pk - 1)
+        for value in (' \x00' + 'x' * 300, '%%%'):
+            with self.subTest(cursor=value):
+                response = await self.author_client.get(
+                    f'{self.list_url}?{urlencode({"cursor": value})}'
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+                self.assertEqual(
+                    response.json()['error'], 'Некорректный курсор страницы.'
+                )
+        cache.stats.reset()
+        for value in (cursor, cursor + '=='):
+            response = await self.author_client.get(
+                f'{self.list_url}?cursor={value}'
+            )
+            self.assertEqual(response.json()['results'][0]['slug'], 'slug')
+        self.assertEqual(cache.stats.snapshot()['misses'], 1)
+
+
+class TestMetrics(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+
+    def setUp(self):
+        metrics.registry.reset()
+        cache.bump_generation(self.author.pk)
+
+    def test_requests_are_aggregated_by_url_name(self):
+        """Задержка, запросы, рендеринг и размер учитываются по имени URL."""
+        for _ in range(2):
+            response = self.author_client.get(reverse('notes:list'))
+        view = metrics.registry.snapshot()['notes:list']
+        self.assertEqual(view['count'], 2)
+        self.assertEqual(sum(view['buckets']), 2)
+        self.assertGreater(view['queries'], 0)
+        self.assertGreater(view['render_duration'], 0)
+        self.assertEqual(view['response_bytes'], 2 * len(response.content))
+
+    def test_async_view_queries_are_counted(self):
+        """Запросы из sync_to_async учитываются для асинхронного API."""
+        self.author_client.get(reverse('notes:api-list'))
+        view = metrics.registry.snapshot()['notes:api-list']
+        self.assertGreater(view['queries'], 0)
+
+    def test_prometheus_output(self):
+        """Эндпоинт отдаёт гистограмму и счётчики в формате Prometheus."""
+        self.author_client.get(reverse('notes:list'))
+        response = self.client.get(reverse('notes:metrics'))
+        content = response.content.decode()
+        self.assertIn(
+            'yanote_request_duration_seconds_count{view="notes:list"} 1',
+            content,
+        )
+        self.assertIn('yanote_db_queries_total{view="notes:list"}', content)
+        self.assertIn('yanote_note_cache_misses_total', content)
+
+    def test_slow_requests_are_profiled(self):
+        """Запросы медленнее порога сохраняют профиль pstats."""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                NOTES_PROFILE_THRESHOLD_MS=0,
+                NOTES_PROFILE_SAMPLE_RATE=1,
+                NOTES_PROFILE_DIR=directory,
+            ):
+                self.author_client.get(reverse('notes:list'))
+            profiles = os.listdir(directory)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith('notes-list-'))
+
+
+class TestUserCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author.set_password('Пароль-автора-1')
+        cls.author.save()
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+        cls.urls = (
+            reverse('notes:list'),
+            reverse('notes:detail', args=(cls.note.slug,)),
+        )
+
+    def setUp(self):
+        auth.users.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_warm_pages_skip_database(self):
+        """Сессия, пользователь и данные страницы берутся из кешей."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.author_client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    response = self.author_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(context.captured_queries), 1)
+                self.assertIn(
+                    'notes_notesversion', context.captured_queries[0]['sql']
+                )
+
+    def test_password_change_ends_other_sessions(self):
+        """После смены пароля старая сессия не принимается."""
+        self.author_client.get(self.urls[0])
+        self.author.set_password('Новый-пароль-2')
+        self.author.save()
+        response = self.author_client.get(self.urls[0])
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_logout_drops_cached_user(self):
+        """Выход убирает пользователя из кеша."""
+        self.author_client.get(self.urls[0])
+        self.assertIsNotNone(auth.users.get(self.author.pk))
+        self.author_client.get(reverse('users:logout'))
+        self.assertIsNone(auth.users.get(self.author.pk))
+
+    def test_sessions_of_model_backend_stay_valid(self):
+        """Сессия, открытая ModelBackend, после смены бэкенда действует."""
+        client = Client()
+        client.force_login(
+            self.author, 'django.contrib.auth.backends.ModelBackend'
+        )
+        response = client.get(self.urls[0])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_wrong_password_is_hashed_once(self):
+        """Неверный пароль не проверяется вторым бэкендом."""
+        with mock.patch.object(ModelBackend, 'authenticate') as fallback:
+            response = Client().post(reverse('users:login'), data={
+                'username': self.author.username, 'password': 'Неверный',
+            })
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        fallback.assert_not_called()
+
+    @override_settings(NOTES_USER_CACHE_TTL=0)
+    def test_cache_can_be_disabled(self):
+        """При нулевом TTL пользователь читается из базы."""
+        self.author_client.get(self.urls[0])
+        with CaptureQueriesContext(connection) as context:
+            self.author_client.get(self.urls[0])
+        user_queries = [
+            query for query in context.captured_queries
+            if '"auth_user"' in query['sql']
+        ]
+        self.assertEqual(len(user_queries), 1)
+
+
+class TestDatabaseProfile(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+
+    def setUp(self):
+        cache.bump_generation(self.author.pk)
+        auth.users.clear()
+
+    def test_connection_pragmas(self):
+        """Соединение получает PRAGMA и BEGIN IMMEDIATE для записи."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_shared_caches_in_production(self):
+        """Сессии и вёдра лимитов рабочего профиля — не в памяти процесса."""
+        caches_ = settings_production.CACHES
+        for alias in (settings_production.SESSION_CACHE_ALIAS,
+                      settings_production.NOTES_RATE_LIMIT_CACHE):
+            with self.subTest(alias=alias):
+                self.assertNotIn('locmem', caches_[alias]['BACKEND'])
+
+    def test_router(self):
+        """Чтение уходит в reader только вне транзакции default."""
+        router = routers.ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Note))
+        with routers.read_only():
+            self.assertIsNone(router.db_for_read(Note))
+            with mock.patch.object(
+                connections['default'], 'in_atomic_block', False
+            ):
+                self.assertEqual(
+                    router.db_for_read(Note), routers.READ_ALIAS
+                )
+        self.assertEqual(router.db_for_write(Note), 'default')
+        self.assertFalse(
+            router.allow_migrate(routers.READ_ALIAS, 'notes')
+        )
+
+    def test_read_only_views(self):
+        """Список и заметка читаются через reader, формы — нет."""
+        urls = (
+            (reverse('notes:list'), True),
+            (reverse('notes:detail', args=(self.note.slug,)), True),
+            (reverse('notes:edit', args=(self.note.slug,)), False),
+        )
+        for url, expected in urls:
+            with self.subTest(url=url):
+                flags = []
+                with mock.patch.object(
+                    routers.ReadReplicaRouter, 'db_for_read',
+                    lambda router, model, **hints: flags.append(
+                        routers.reading.get()
+                    ),
+                ):
+                    self.author_client.get(url)
+                self.assertTrue(flags)
+                self.assertEqual(set(flags), {expected})
+                self.assertFalse(routers.reading.get())
+
+
+class TestConditionalGet(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.note = Note.objects.create(
+            title='Заметка', text='Текст', slug='slug', author=cls.author
+        )
+        cls.list_url = reverse('notes:list')
+        cls.detail_url = reverse('notes:detail', args=(cls.note.slug,))
+        cls.edit_url = reverse('notes:edit', args=(cls.note.slug,))
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        auth.users.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_not_modified_from_one_query(self):
+        """Повторный запрос с ETag получает 304 за один запрос к базе."""
+        for url in (self.list_url, self.detail_url):
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.author_client.get(url)
+                with self.assertNumQueries(1):
+                    not_modified = self.author_client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(
+                    not_modified.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(not_modified.content, b'')
+
+    def test_if_modified_since(self):
+        """Last-Modified тоже позволяет ответить 304."""
+        response = self.author_client.get(self.list_url)
+        not_modified = self.author_client.get(
+            self.list_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_change_invalidates_etag(self):
+        """После правки и импорта старый ETag не подходит."""
+        etag = self.author_client.get(self.detail_url)['ETag']
+        self.author_client.post(self.edit_url, data={
+            'title': 'Новый заголовок', 'text': 'Текст', 'slug': 'slug',
+        })
+        response = self.author_client.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertContains(response, 'Новый заголовок')
+        etag = response['ETag']
+        self.author_client.post(
+            reverse('notes:import'),
+            data='{"title": "Ещё", "text": "Текст"}',
+            content_type='application/x-ndjson',
+        )
+        response = self.author_client.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_depends_on_page_and_user(self):
+        """У разных страниц и пользователей разные ETag."""
+        reader = User.objects.create(username='Читатель')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        etags = {
+            self.author_client.get(self.list_url)['ETag'],
+            self.author_client.get(self.detail_url)['ETag'],
+            reader_client.get(self.list_url)['ETag'],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_missing_note_has_no_etag(self):
+        """Ответ 404 не получает валидаторов."""
+        response = self.author_client.get(
+            reverse('notes:detail', args=('missing',))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_anonymous_is_redirected(self):
+        """Анонимный запрос с ETag всё равно уходит на вход."""
+        etag = self.author_client.get(self.list_url)['ETag']
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_timestamps(self):
+        """Заметка хранит время создания и изменения."""
+        note = Note.objects.get()
+        self.assertIsNotNone(note.created)
+        updated = note.updated
+        note.text = 'Новый текст'
+        note.save()
+        self.assertGreater(note.updated, updated)
+        self.assertEqual(
+            NotesVersion.objects.get(user=self.author).version, 2
+        )
+
+
+class TestTaskQueue(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.add_url = reverse('notes:add')
+        cls.form_data = {'title': 'Заметка', 'text': 'Раз два три'}
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+
+    def create_note(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(self.add_url, data=self.form_data)
+        return Note.objects.get()
+
+    def test_request_only_enqueues(self):
+        """Запрос ставит задачу, а число слов считает обработчик."""
+        note = self.create_note()
+        self.assertIsNone(note.word_count)
+        task = Task.objects.get()
+        self.assertEqual((task.name, task.key), ('word_count', str(note.pk)))
+        self.assertEqual(queue.run_pending(), (1, 0))
+        self.assertFalse(Task.objects.exists())
+        response = self.author_client.get(
+            reverse('notes:detail', args=(note.slug,))
+        )
+        self.assertContains(response, 'Слов: 3')
+
+    def test_rolled_back_change_is_not_enqueued(self):
+        """Задача ставится только после коммита."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Note.objects.create(
+                title='Заметка', text='Текст', author=self.author
+            )
+        self.assertTrue(callbacks)
+        self.assertFalse(Task.objects.exists())
+
+    def test_repeated_jobs_are_coalesced(self):
+        """Повторные правки одной заметки дают одну задачу."""
+        note = self.create_note()
+        for text in ('Один', 'Один два'):
+            with self.captureOnCommitCallbacks(execute=True):
+                note.text = text
+                note.save()
+        task = Task.objects.get()
+        self.assertEqual(task.version, 2)
+
+    def test_jobs_are_batched(self):
+        """Обработчик получает все ключи порции одним вызовом."""
+        handler = mock.Mock()
+        with mock.patch.dict(queue.HANDLERS, {'batch': handler}):
+            for key in range(3):
+                queue.enqueue('batch', key)
+            self.assertEqual(queue.run_pending(), (3, 0))
+        handler.assert_called_once_with(['0', '1', '2'])
+
+    def test_job_changed_while_running_stays_queued(self):
+        """Задача, поставленная во время выполнения, выполнится снова."""
+        handler = mock.Mock()
+        with mock.patch.dict(queue.HANDLERS, {'job': handler}):
+            queue.enqueue('job', 1)
+            tasks = queue.claim()
+            queue.enqueue('job', 1)
+            queue.process(tasks)
+            task = Task.objects.get()
+            self.assertIsNone(task.locked_until)
+            self.assertEqual(queue.run_pending(), (1, 0))
+
+    def test_failed_jobs_are_retried_with_backoff(self):
+        """Ошибка откладывает задачу, а после лимита попыток — помечает."""
+        handler = mock.Mock(side_effect=ValueError('сбой'))
+        with mock.patch.dict(queue.HANDLERS, {'job': handler}), \
+                override_settings(NOTES_TASK_MAX_ATTEMPTS=2):
+            queue.enqueue('job', 1)
+            self.assertEqual(queue.run_pending(), (0, 1))
+            task = Task.objects.get()
+            self.assertEqual(task.attempts, 1)
+            self.assertEqual(task.last_error, 'ValueError: сбой')
+            self.assertEqual(queue.run_pending(), (0, 0))
+            Task.objects.update(run_after=task.created)
+            self.assertEqual(queue.run_pending(), (0, 1))
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_bulk_import_backfills_word_counts(self):
+        """После импорта число слов заполняется одной задачей на автора."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(
+                reverse('notes:import'),
+                data='{"title": "Первая", "text": "Раз два"}\n'
+                     '{"title": "Вторая", "text": "Раз"}',
+                content_type='application/x-ndjson',
+            )
+        self.assertEqual(Task.objects.get().name, 'word_count_backfill')
+        queue.run_pending()
+        self.assertEqual(
+            sorted(Note.objects.values_list('word_count', flat=True)),
+            [1, 2],
+        )
+
+    def test_worker_command_and_metrics(self):
+        """Команда выполняет очередь, а метрики показывают её глубину."""
+        self.create_note()
+        response = self.client.get(reverse('notes:metrics'))
+        self.assertContains(
+            response,
+            'yanote_task_queue_depth{task="word_count",status="pending"} 1',
+        )
+        out = StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+
+
+@override_settings(NOTES_REVISION_SNAPSHOT_EVERY=3)
+class TestRevisions(TestCase):
+
+    LINES = [f'Строка номер {number}\n' for number in range(200)]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader = User.objects.create(username='Читатель')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        self.note = Note.objects.create(
+            title='Заметка', text=''.join(self.LINES), slug='slug',
+            author=self.author,
+        )
+        self.texts = [self.note.text]
+        for number in range(1, 7):
+            lines = list(self.LINES)
+            lines[number * 10] = f'Правка {number}\n'
+            lines.append(f'Новая строка {number}\n')
+            self.note.text = ''.join(lines)
+            self.note.save()
+            self.texts.append(self.note.text)
+
+    def test_snapshots_and_deltas(self):
+        """Снимок в каждой третьей версии, между ними — разницы."""
+        stored = NoteRevision.objects.filter(note=self.note).order_by('number')
+        self.assertEqual(
+            [(revision.number, revision.is_snapshot) for revision in stored],
+            [(1, True), (2, False), (3, False), (4, True), (5, False),
+             (6, False), (7, True)],
+        )
+        delta = stored.get(number=2)
+        self.assertLess(len(delta.data), 100)
+
+    @override_settings(NOTES_REVISION_DELTA_MAX_LINES=100)
+    def test_long_text_is_stored_as_snapshot(self):
+        """Длинный текст сохраняется снимком, разница не считается."""
+        self.note.text += 'Ещё строка\n'
+        with mock.patch('notes.revisions.encode_delta') as encode_delta:
+            self.note.save()
+        encode_delta.assert_not_called()
+        revision, text = revisions.rebuild(self.note.pk)
+        self.assertTrue(revision.is_snapshot)
+        self.assertEqual(text, self.note.text)
+
+    def test_every_revision_is_rebuilt(self):
+        """Любая версия собирается одним запросом."""
+        for number, text in enumerate(self.texts, 1):
+            with self.subTest(number=number):
+                with self.assertNumQueries(1):
+                    revision, rebuilt = revisions.rebuild(
+                        self.note.pk, number
+                    )
+                self.assertEqual(rebuilt, text)
+        self.assertIsNone(revisions.rebuild(self.note.pk, 100))
+
+    def test_unchanged_save_adds_no_revision(self):
+        """Сохранение без изменения текста и заголовка историю не растит."""
+        self.note.slug = 'new-slug'
+        self.note.save()
+        self.assertEqual(self.note.revisions.count(), len(self.texts))
+
+    def test_note_pages_do_not_read_history(self):
+        """Страница заметки не обращается к таблице версий."""
+        with CaptureQueriesContext(connection) as context:
+            self.author_client.get(
+                reverse('notes:detail', args=(self.note.slug,))
+            )
+        self.assertFalse(any(
+            'noterevision' in query['sql']
+            for query in context.captured_queries
+        ))
+
+    def test_compaction_keeps_latest(self):
+        """Сжатие оставляет последние версии, первая из них — снимок."""
+        out = StringIO()
+        call_command('compact_revisions', '--keep=3', stdout=out)
+        self.assertIn('Удалено версий: 4', out.getvalue())
+        stored = NoteRevision.objects.filter(note=self.note).order_by('number')
+        self.assertEqual(
+            [(revision.number, revision.is_snapshot) for revision in stored],
+            [(5, True), (6, False), (7, False)],
+        )
+        for number in (5, 6, 7):
+            self.assertEqual(
+                revisions.rebuild(self.note.pk, number)[1],
+                self.texts[number - 1],
+            )
+
+    def test_compaction_changes_snapshot_interval(self):
+        """История перекодируется под новый интервал снимков."""
+        call_command(
+            'compact_revisions', '--snapshot-every=10', stdout=StringIO()
+        )
+        self.assertEqual(
+            self.note.revisions.filter(is_snapshot=True).count(), 1
+        )
+        self.assertEqual(
+            revisions.rebuild(self.note.pk)[1], self.texts[-1]
+        )
+
+    def test_bulk_import_records_first_revision(self):
+        """Импортированные заметки получают первую версию."""
+        self.author_client.post(
+            reverse('notes:import'),
+            data='{"title": "Импорт", "text": "Текст", "slug": "imported"}',
+            content_type='application/x-ndjson',
+        )
+        note = Note.objects.get(slug='imported')
+        self.assertEqual(revisions.rebuild(note.pk)[1], 'Текст')
+
+    def test_history_pages(self):
+        """Автор видит историю и любую версию, другой пользователь — нет."""
+        history_url = reverse('notes:history', args=(self.note.slug,))
+        response = self.author_client.get(history_url)
+        self.assertEqual(len(response.context['revisions']), 7)
+        response = self.author_client.get(
+            reverse('notes:revision', args=(self.note.slug, 2))
+        )
+        self.assertEqual(response.context['text'], self.texts[1])
+        for client, number in (
+            (self.reader_client, 2),
+            (self.author_client, 100),
+        ):
+            with self.subTest(number=number):
+                response = client.get(
+                    reverse('notes:revision', args=(self.note.slug, number))
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(NOTES_BODY_INLINE_LIMIT=100, NOTES_BODY_CHUNK_SIZE=64)
+class TestLargeNotes(TestCase):
+
+    TEXT = ' '.join(f'слово{number}' for number in range(100)) + ' <b>'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+        self.note = Note.objects.create(
+            title='Большая заметка', text=self.TEXT, slug='big',
+            author=self.author,
+        )
+
+    def test_text_moves_out_of_row(self):
+        """В строке заметки остаётся начало, текст лежит кусками."""
+        self.assertEqual(
+            Note.objects.values_list('text', flat=True).get(),
+            self.TEXT[:100],
+        )
+        self.assertEqual(self.note.body.size, len(self.TEXT))
+        self.assertEqual(
+            NoteBodyChunk.objects.filter(body=self.note.body).count(),
+            -(-len(self.TEXT) // 64),
+        )
+        self.assertEqual(Note.objects.get().text, self.TEXT)
+
+    def test_same_text_is_stored_once(self):
+        """Одинаковые тексты разных заметок хранятся один раз."""
+        other = Note.objects.create(
+            title='Копия', text=self.TEXT, slug='copy', author=self.author
+        )
+        self.assertEqual(other.body_id, self.note.body_id)
+        self.assertEqual(NoteBody.objects.count(), 1)
+
+    def test_title_edit_does_not_read_body(self):
+        """Смена заголовка не читает и не переписывает текст."""
+        note = Note.objects.get()
+        note.title = 'Новый заголовок'
+        with CaptureQueriesContext(connection) as context:
+            note.save()
+        self.assertFalse(any(
+            'notes_notebody' in query['sql']
+            for query in context.captured_queries
+        ))
+        note = Note.objects.get()
+        self.assertEqual(note.body_id, self.note.body_id)
+        self.assertEqual(note.text, self.TEXT)
+
+    def test_unused_body_is_released(self):
+        """Текст без заметок удаляется фоновой задачей."""
+        other = Note.objects.create(
+            title='Другая', text=self.TEXT + ' ещё', slug='other',
+            author=self.author,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.note.text = 'Короткий текст'
+            self.note.save()
+            other.delete()
+        queue.run_pending()
+        self.assertFalse(NoteBody.objects.exists())
+        note = Note.objects.get()
+        self.assertIsNone(note.body_id)
+        self.assertEqual(note.text, 'Короткий текст')
+
+    def test_detail_streams_body(self):
+        """Страница заметки отдаёт вынесенный текст потоком."""
+        response = self.author_client.get(
+            reverse('notes:detail', args=(self.note.slug,))
+        )
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn(f'<p>{escape(self.TEXT)}</p>', content)
+        self.assertIn('Большая заметка', content)
+
+    def test_lists_do_not_read_body(self):
+        """Список и поиск не обращаются к вынесенным текстам."""
+        with CaptureQueriesContext(connection) as context:
+            self.author_client.get(reverse('notes:list'))
+            response = self.author_client.get(
+                reverse('notes:search'), {'q': 'слово1'}
+            )
+        self.assertEqual(list(response.context['object_list']), [self.note])
+        self.assertFalse(any(
+            'notes_notebody' in query['sql']
+            for query in context.captured_queries
+        ))
+
+    def test_edit_form_and_export_get_full_text(self):
+        """Форма редактирования и выгрузка получают текст целиком."""
+        response = self.author_client.get(
+            reverse('notes:edit', args=(self.note.slug,))
+        )
+        self.assertEqual(response.context['form']['text'].value(), self.TEXT)
+        response = self.author_client.get(reverse('notes:export'))
+        line = b''.join(response.streaming_content).decode()
+        self.assertEqual(json.loads(line)['text'], self.TEXT)
+
+    def test_import_moves_large_text(self):
+        """Импорт выносит длинные тексты так же, как сохранение."""
+        self.author_client.post(
+            reverse('notes:import'),
+            data=json.dumps({'title': 'Импорт', 'text': self.TEXT * 2}),
+            content_type='application/x-ndjson',
+        )
+        note = Note.objects.get(slug='import')
+        self.assertIsNotNone(note.body_id)
+        self.assertEqual(note.text, self.TEXT * 2)
+        self.assertEqual(revisions.rebuild(note.pk)[1], self.TEXT * 2)
+
+
+@override_settings(NOTES_RATE_LIMITS={'notes:add': (2, 60)})
+class TestRateLimit(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Автор заметки')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader = User.objects.create(username='Читатель')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.url = reverse('notes:add')
+        cls.form_data = {'title': 'Заметка', 'text': 'Текст'}
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+
+    def test_bucket_refills(self):
+        """Ведро пополняется со скоростью burst / period."""
+        for now in (0, 0):
+            self.assertEqual(throttle.take('key', 2, 60, now=now), 0)
+        self.assertEqual(throttle.take('key', 2, 60, now=15), 15)
+        self.assertEqual(throttle.take('key', 2, 60, now=30), 0)
+        self.assertEqual(throttle.take('key', 2, 60, now=30), 30)
+
+    def test_concurrent_takes_stay_within_burst(self):
+        """Параллельные запросы не проходят сверх лимита."""
+        barrier = threading.Barrier(20)
+        get = LocMemCache.get
+
+        def slow_get(cache, *args, **kwargs):
+            # Ответ идёт к процессу долго, как у сетевого кеша.
+            value = get(cache, *args, **kwargs)
+            time.sleep(0.01)
+            return value
+
+        def take(_):
+            barrier.wait()
+            return throttle.take('key', 5, 60, now=100)
+
+        with mock.patch.object(LocMemCache, 'get', slow_get), \
+                ThreadPoolExecutor(20) as executor:
+            waits = list(executor.map(take, range(20)))
+        self.assertEqual(waits.count(0), 5)
+
+    def test_excess_writes_are_rejected_before_view(self):
+        """Запрос сверх лимита получает 429 без обращения к заметкам."""
+        for _ in range(2):
+            self.author_client.post(self.url, data=self.form_data)
+        with CaptureQueriesContext(connection) as context:
+            response = self.author_client.post(self.url, data=self.form_data)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertFalse(any(
+            'notes_note' in query['sql']
+            for query in context.captured_queries
+        ))
+        self.assertEqual(Note.objects.count(), 2)
+
+    def test_limit_is_per_user_route_and_method(self):
+        """Лимит одного пользователя не мешает другому и чтению."""
+        for _ in range(3):
+            self.author_client.post(self.url, data=self.form_data)
+        self.assertEqual(
+            self.author_client.get(self.url).status_code, HTTPStatus.OK
+        )
+        note = Note.objects.first()
+        response = self.author_client.post(
+            reverse('notes:edit', args=(note.slug,)),
+            data={**self.form_data, 'slug': note.slug},
+        )
+        self.assertRedirects(response, reverse('notes:success'))
+        response = self.reader_client.post(self.url, data=self.form_data)
+        self.assertRedirects(response, reverse('notes:success'))
+
+    @override_settings(NOTES_RATE_LIMITS={'notes:api-list': (1, 60)})
+    def test_api_is_limited(self):
+        """Асинхронный API ограничивается так же."""
+        statuses = [
+            self.author_client.post(
+                reverse('notes:api-list'), data=self.form_data,
+                content_type='application/json',
+            ).status_code
+            for _ in range(2)
+        ]
+        self.assertEqual(
+            statuses, [HTTPStatus.CREATED, HTTPStatus.TOO_MANY_REQUESTS]
+        )
+
+
+class TestPasswordHashing(TestCase):
+
+    PASSWORD = 'Пароль-автора-1'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse('users:login')
+        # Старый хеш с малым числом итераций пересчитывается так же, как
+        # хеш с полным, а проверяется в сотни раз быстрее.
+        legacy = hashers.PBKDF2PasswordHasher()
+        cls.users = [
+            User.objects.create(
+                username=f'Автор {number}',
+                password=legacy.encode(
+                    cls.PASSWORD, legacy.salt(), iterations=1000
+                ),
+            )
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+
+    def login(self, user, password=PASSWORD):
+        return Client().post(
+            self.url, data={'username': user.username, 'password': password}
+        )
+
+    def test_scrypt_is_default(self):
+        """Новые пароли хешируются scrypt с параметрами из настроек."""
+        encoded = make_password(self.PASSWORD)
+        self.assertTrue(encoded.startswith('scrypt$16384$'))
+        self.assertTrue(check_password(self.PASSWORD, encoded))
+        self.assertFalse(check_password('Другой-пароль', encoded))
+        hasher = hashers.ScryptPasswordHasher()
+        self.assertFalse(hasher.must_update(encoded))
+        with override_settings(NOTES_SCRYPT_WORK_FACTOR=2 ** 15):
+            self.assertTrue(hasher.must_update(encoded))
+
+    @override_settings(NOTES_PASSWORD_HASH_WORKERS=0)
+    def test_hashing_without_pool(self):
+        """Без процессов пула хеш совпадает с посчитанным в пуле."""
+        encoded = make_password(self.PASSWORD, hasher='scrypt')
+        self.assertTrue(check_password(self.PASSWORD, encoded))
+
+    @override_settings(NOTES_PASSWORD_UPGRADE_RATE=(1, 3600))
+    def test_legacy_hash_upgrades_are_limited(self):
+        """Старые хеши пересчитываются при входе не чаще лимита."""
+        for user in self.users:
+            response = self.login(user)
+            self.assertRedirects(response, reverse('notes:home'))
+        algorithms = [
+            User.objects.get(pk=user.pk).password.split('$')[0]
+            for user in self.users
+        ]
+        self.assertEqual(algorithms, ['scrypt', 'pbkdf2_sha256'])
+
+    def test_wrong_password_is_not_upgraded(self):
+        """Неверный пароль не пересчитывает хеш."""
+        response = self.login(self.users[0], 'Неверный-пароль')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            User.objects.get(pk=self.users[0].pk).password,
+            self.users[0].password,
+        )
+
+    def test_busy_pool_returns_503(self):
+        """При заполненной очереди к пулу вход получает 503."""
+        with mock.patch.object(
+            hashers.pool, 'run', side_effect=hashers.PasswordHashBusy
+        ):
+            response = self.login(self.users[0])
+        self.assertEqual(
+            response.status_code, HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(response['Retry-After'], '1')
+
+
+@override_settings(NOTES_BODY_INLINE_LIMIT=100, NOTES_BODY_CHUNK_SIZE=64)
+class TestBulkOperations(TestCase):
+
+    LARGE_TEXT = 'строка\n' * 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = make_users('Автор заметки', 'Читатель')
+        cls.author_client = login(cls.author)
+        cls.delete_url = reverse('notes:bulk-delete')
+        cls.update_url = reverse('notes:bulk-update')
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+        # Сессия и пользователь уже в кеше: считаются только запросы
+        # самой операции.
+        self.author_client.get(reverse('notes:home'))
+
+    def create_notes(self, prefix, count, author=None):
+        """Заметки автора, первая — с текстом в NoteBody."""
+        return [
+            Note.objects.create(
+                title=f'Заметка {number}', slug=f'{prefix}-{number}',
+                text=self.LARGE_TEXT if number == 0 else 'Текст',
+                author=author or self.author,
+            ).slug
+            for number in range(count)
+        ]
+
+    def post(self, url, data):
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.author_client.post(url, data=data)
+        return response, len(context.captured_queries)
+
+    def test_delete_query_count_does_not_depend_on_batch_size(self):
+        """Удаление двух и двадцати заметок — одно число запросов."""
+        counts = []
+        for prefix, size in (('small', 2), ('large', 20)):
+            slugs = self.create_notes(prefix, size)
+            response, queries = self.post(self.delete_url, {'slugs': slugs})
+            self.assertEqual(response.json()['deleted']['count'], size)
+            counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Note.objects.exists())
+        self.assertFalse(NoteRevision.objects.exists())
+        self.assertEqual(queue.run_pending(), (1, 0))
+        self.assertFalse(NoteBody.objects.exists())
+
+    def test_delete_touches_only_own_notes(self):
+        """Чужие и несуществующие slug попадают в missing."""
+        own = self.create_notes('own', 2)
+        foreign = self.create_notes('foreign', 1, author=self.reader)
+        list_url = reverse('notes:list')
+        self.assertContains(self.author_client.get(list_url), own[1])
+        response, _ = self.post(
+            self.delete_url, {'slugs': [*own, *foreign, 'nothing']}
+        )
+        self.assertEqual(response.json(), {'deleted': {
+            'count': 2, 'slugs': sorted(own),
+            'missing': sorted([*foreign, 'nothing']),
+        }})
+        self.assertTrue(Note.objects.filter(slug__in=foreign).exists())
+        self.assertNotContains(self.author_client.get(list_url), own[1])
+
+    def test_delete_follows_note_relations(self):
+        """Связи с заметкой и сигналы удаления — те, что знает bulk."""
+        slugs = self.create_notes('note', 2)
+        self.assertTrue(NoteKey.objects.exists())
+        self.post(self.delete_url, {'slugs': slugs})
+        self.assertFalse(NoteKey.objects.exists())
+        self.assertFalse(NoteRevision.objects.exists())
+        self.assertEqual(
+            {receiver.__name__ for receiver in
+             post_delete._live_receivers(Note)},
+            {'invalidate_note_cache', 'release_note_body'},
+        )
+        self.assertFalse(pre_delete.has_listeners(Note))
+        protected = SimpleNamespace(
+            on_delete=PROTECT, related_model=Task,
+            field=SimpleNamespace(name='note'),
+        )
+        self.assertEqual(checks.check_bulk_delete(None), [])
+        slugs = self.create_notes('protected', 1)
+        with mock.patch.dict(
+            Note._meta.__dict__, {'related_objects': (protected,)}
+        ):
+            self.assertEqual(
+                [warning.id for warning in checks.check_bulk_delete(None)],
+                ['notes.W001'],
+            )
+            report = bulk.delete_notes(self.author, slugs)
+        self.assertEqual(report['slugs'], slugs)
+        self.assertFalse(Note.objects.filter(slug__in=slugs).exists())
+        self.assertEqual(
+            NoteChange.objects.filter(
+                slug__in=slugs, action=NoteChange.DELETE
+            ).count(),
+            1,
+        )
+
+    def test_update_query_count_does_not_depend_on_batch_size(self):
+        """Смена заголовка двух и двадцати заметок — одно число запросов."""
+        counts = []
+        for prefix, size in (('small', 2), ('large', 20)):
+            slugs = self.create_notes(prefix, size)
+            response, queries = self.post(
+                self.update_url, {'slugs': slugs, 'title': 'Архив'}
+            )
+            self.assertEqual(response.json()['updated']['count'], size)
+            counts.append(queries)
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            set(Note.objects.values_list('title', flat=True)), {'Архив'}
+        )
+
+    def test_prefix_keeps_text_and_history(self):
+        """Приставка попадает в заголовок и историю, текст не меняется."""
+        slugs = self.create_notes('note', 2)
+        self.post(self.update_url, {'slugs': slugs, 'prefix': 'Старое: '})
+        for slug, text in zip(slugs, (self.LARGE_TEXT, 'Текст')):
+            with self.subTest(slug=slug):
+                note = Note.objects.get(slug=slug)
+                self.assertTrue(note.title.startswith('Старое: Заметка'))
+                self.assertEqual(note.text, text)
+                revision, rebuilt = revisions.rebuild(note.pk)
+                self.assertEqual(
+                    (revision.number, revision.title, rebuilt),
+                    (2, note.title, text),
+                )
+
+    def test_full_batch_costs_as_much_as_small_one(self):
+        """Порция в NOTES_BULK_MAX_NOTES заметок не добавляет запросов."""
+        counts = []
+        for size in (2, settings.NOTES_BULK_MAX_NOTES):
+            slugs = [
+                note.slug
+                for note in make_notes(self.author, size, slug=f'n{size}')
+            ]
+            counts.append([
+                self.post(url, {'slugs': slugs, **data})[1]
+                for url, data in (
+                    (self.update_url, {'prefix': 'Архив: '}),
+                    (self.delete_url, {}),
+                )
+            ])
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(Note.objects.exists())
+
+    def test_invalid_requests_are_rejected(self):
+        """Без заметок, с заголовком и приставкой сразу — ошибка."""
+        slugs = self.create_notes('note', 1)
+        for url, data in (
+            (self.delete_url, {}),
+            (self.delete_url, {'slugs': ['не slug']}),
+            (self.update_url, {'slugs': slugs}),
+            (self.update_url, {'slugs': slugs, 'title': 'А', 'prefix': 'Б'}),
+        ):
+            with self.subTest(url=url, data=data):
+                response, _ = self.post(url, data)
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        with override_settings(NOTES_BULK_MAX_NOTES=1):
+            response, _ = self.post(
+                self.delete_url, {'slugs': [*slugs, 'other']}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertTrue(Note.objects.exists())
+
+
+class TestChangeFeed(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = make_users('Автор заметки', 'Читатель')
+        cls.author_client = login(cls.author)
+        cls.url = reverse('notes:api-changes')
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+
+    def read(self, **params):
+        response = self.author_client.get(self.url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json()
+
+    def actions(self, feed):
+        return [(change['action'], change['slug']) for change in feed]
+
+    def test_views_record_changes(self):
+        """Создание, правка и удаление через страницы попадают в журнал."""
+        self.author_client.post(
+            reverse('notes:add'),
+            data={'title': 'Заметка', 'text': 'Текст', 'slug': 'note'},
+        )
+        feed = self.read()
+        self.assertEqual(self.actions(feed['changes']), [('create', 'note')])
+        self.assertEqual(feed['changes'][0]['title'], 'Заметка')
+        self.author_client.post(
+            reverse('notes:edit', args=('note',)),
+            data={'title': 'Новое', 'text': 'Текст', 'slug': 'note'},
+        )
+        since = feed['next']
+        feed = self.read(since=since)
+        self.assertEqual(self.actions(feed['changes']), [('update', 'note')])
+        self.assertEqual(feed['changes'][0]['title'], 'Новое')
+        note_id = feed['changes'][0]['id']
+        self.author_client.post(reverse('notes:delete', args=('note',)))
+        feed = self.read(since=feed['next'])
+        self.assertEqual(feed['changes'], [{
+            'seq': feed['next'], 'action': 'delete', 'id': note_id,
+            'slug': 'note',
+        }])
+        self.assertEqual(self.read(since=feed['next'])['changes'], [])
+        # Из трёх записей одной заметки в порции остаётся последняя.
+        feed = self.read(since=since - 1)
+        self.assertEqual(self.actions(feed['changes']), [('delete', 'note')])
+
+    def test_bulk_operations_record_changes(self):
+        """Импорт, массовые правка и удаление пишут журнал порцией."""
+        self.author_client.post(
+            reverse('notes:import'),
+            data='\n'.join(
+                json.dumps({'title': f'Заметка {number}', 'text': 'Т'})
+                for number in range(3)
+            ),
+            content_type='application/x-ndjson',
+        )
+        feed = self.read()
+        slugs = [slug for _, slug in self.actions(feed['changes'])]
+        self.assertEqual(len(slugs), 3)
+        self.author_client.post(
+            reverse('notes:bulk-update'),
+            data={'slugs': slugs[:2], 'title': 'Архив'},
+        )
+        self.author_client.post(
+            reverse('notes:bulk-delete'), data={'slugs': slugs[2:]}
+        )
+        feed = self.read(since=feed['next'])
+        self.assertEqual(self.actions(feed['changes']), [
+            ('update', slugs[0]), ('update', slugs[1]), ('delete', slugs[2]),
+        ])
+        self.assertEqual(
+            {change.get('title') for change in feed['changes']},
+            {'Архив', None},
+        )
+        # Запись CREATE отдаётся с заметкой в текущем состоянии.
+        self.assertEqual(
+            self.read(limit=1)['changes'][0]['title'], 'Архив'
+        )
+
+    def test_batches_are_bounded(self):
+        """Журнал читается порциями по limit, more — есть ли ещё."""
+        make_notes(self.author, 5)
+        make_notes(self.reader, 2, slug='foreign')
+        seen = []
+        since = 0
+        while True:
+            feed = self.read(since=since, limit=2)
+            self.assertLessEqual(len(feed['changes']), 2)
+            seen += self.actions(feed['changes'])
+            since = feed['next']
+            if not feed['more']:
+                break
+        self.assertEqual(
+            seen, [('create', f'note-{number}') for number in range(5)]
+        )
+
+    def test_read_costs_do_not_depend_on_history(self):
+        """Чтение журнала — одно число запросов при любом числе заметок."""
+        counts = []
+        for size in (1, 50):
+            make_notes(self.author, size, slug=f'n{size}')
+            since = changes.read(self.author.pk, 0, 1000)[1] - size
+            with CaptureQueriesContext(connection) as context:
+                feed = self.read(since=since)
+            self.assertEqual(len(feed['changes']), size)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(NOTES_CHANGES_POLL_INTERVAL=0.01)
+    def test_long_poll(self):
+        """С wait ответ ждёт изменений и возвращает пустую порцию."""
+        self.assertEqual(self.read(wait=0.05)['changes'], [])
+
+        async def write(delay):
+            await sync_to_async(Note.objects.create)(
+                title='Поздняя', text='Текст', slug='late',
+                author=self.author,
+            )
+
+        with mock.patch('notes.api.asyncio.sleep', side_effect=write):
+            feed = self.read(wait=10)
+        self.assertEqual(self.actions(feed['changes']), [('create', 'late')])
+
+    def test_invalid_parameters(self):
+        """Неверные since, limit и wait дают 400."""
+        for params in ({'since': 'x'}, {'since': -1}, {'limit': 0},
+                       {'limit': settings.NOTES_CHANGES_BATCH + 1},
+                       {'wait': settings.NOTES_CHANGES_MAX_WAIT + 1}):
+            with self.subTest(params=params):
+                response = self.author_client.get(self.url, params)
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            self.client.get(self.url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+
+    def test_compaction(self):
+        """Сжатие оставляет последние записи, а старые удаления — 410."""
+        first, second = make_notes(self.author, 2)
+        second.title = 'Новое'
+        second.save()
+        start = self.read()['next']
+        first.delete()
+        call_command('compact_changes', days=0, stdout=StringIO())
+        self.assertEqual(NoteChange.objects.filter(
+            user=self.author
+        ).count(), 1)
+        feed = self.read()
+        self.assertEqual(
+            self.actions(feed['changes']), [('update', second.slug)]
+        )
+        response = self.author_client.get(self.url, {'since': start})
+        self.assertEqual(response.status_code, HTTPStatus.GONE)
+        self.assertIs(response.json()['reset'], True)
+        # Клиент, начавший с нуля после сжатия, границу уже видел.
+        self.assertEqual(self.read(
+            since=feed['next'], floor=feed['floor']
+        )['changes'], [])
+
+
+class TestChangeRecordIsAtomic(TransactionTestCase):
+    """Без общей транзакции теста: сохранение идёт в autocommit."""
+
+    def setUp(self):
+        self.author, = make_users('Автор заметки')
+
+    def test_note_is_not_saved_without_change(self):
+        """Ошибка записи в журнал откатывает и строку заметки."""
+        with mock.patch('notes.changes.record', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Note.objects.create(
+                    title='Заметка', text='Текст', author=self.author,
+                )
+        self.assertFalse(Note.objects.exists())
+        note = Note.objects.create(
+            title='Заметка', text='Текст', author=self.author,
+        )
+        self.assertEqual(
+            list(NoteChange.objects.values_list('note_id', 'action')),
+            [(note.pk, NoteChange.CREATE)],
+        )
+
+
+@override_settings(
+    NOTES_SHARDS=('default', 'shard1'), NOTES_SHARD_MOVE_GRACE=0,
+    NOTES_BODY_INLINE_LIMIT=100, NOTES_BODY_CHUNK_SIZE=64,
+)
+class TestShards(TestCase):
+    databases = {'default', 'shard1'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = make_users('Автор заметки', 'Читатель')
+        cls.author_client = login(cls.author)
+        cls.reader_client = login(cls.reader)
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+        cache.bump_generation(self.reader.pk)
+
+    def place(self, user, alias):
+        ShardPlacement.objects.create(user=user, alias=alias)
+        with routers.on_shard(alias):
+            NotesVersion.objects.create(user=user)
+
+    def notes_in(self, alias, user):
+        return Note.objects.using(alias).filter(author=user)
+
+    def test_new_user_gets_hashed_shard(self):
+        """Новый пользователь попадает в шард по хешу id."""
+        for number in range(4):
+            user = User.objects.create(username=f'Пользователь {number}')
+            alias = shards.hash_alias(user.pk)
+            self.assertEqual(shards.placement(user.pk), (alias, False))
+            self.assertTrue(
+                NotesVersion.objects.using(alias).filter(user=user).exists()
+            )
+
+    def test_requests_use_author_shard(self):
+        """Заметки автора из shard1 пишутся и читаются только там."""
+        self.place(self.reader, 'shard1')
+        response = self.reader_client.post(reverse('notes:add'), data={
+            'title': 'Заметка', 'text': 'Текст', 'slug': 'note',
+        })
+        self.assertRedirects(response, reverse('notes:success'))
+        self.assertEqual(self.notes_in('shard1', self.reader).count(), 1)
+        self.assertFalse(Note.objects.exists())
+        response = self.reader_client.get(reverse('notes:detail', args=(
+            'note',
+        )))
+        self.assertContains(response, 'Текст')
+        feed = self.reader_client.get(reverse('notes:api-changes')).json()
+        self.assertEqual(
+            [change['slug'] for change in feed['changes']], ['note']
+        )
+
+    def test_slug_is_unique_per_author(self):
+        """Одинаковый slug у разных авторов, но не у одного."""
+        data = {'title': 'Заметка', 'text': 'Текст', 'slug': 'note'}
+        for client in (self.author_client, self.reader_client):
+            response = client.post(reverse('notes:add'), data=data)
+            self.assertRedirects(response, reverse('notes:success'))
+        response = self.author_client.post(reverse('notes:add'), data=data)
+        self.assertFormError(
+            response, form='form', field='slug', errors='note' + WARNING
+        )
+
+    def test_moving_user_cannot_write(self):
+        """Во время переноса изменения получают 503, чтение работает."""
+        ShardPlacement.objects.create(
+            user=self.author, alias='default', moving=True
+        )
+        response = self.author_client.post(reverse('notes:add'), data={
+            'title': 'Заметка', 'text': 'Текст',
+        })
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        response = self.author_client.get(reverse('notes:list'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(MIDDLEWARE=settings_api.MIDDLEWARE)
+    async def test_async_api_uses_author_shard(self):
+        """Middleware API работают в цикле событий и видят шард автора."""
+        chain = ASGIHandler()._middleware_chain.__wrapped__
+        self.assertIsInstance(chain, MetricsMiddleware)
+        self.assertTrue(chain.is_async)
+        await sync_to_async(self.place)(self.reader, 'shard1')
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.reader)
+        url = reverse('notes:api-list')
+        response = await client.post(
+            url, data={'title': 'Заметка', 'text': 'Текст', 'slug': 'note'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        response = await client.get(url)
+        self.assertEqual(
+            [note['slug'] for note in response.json()['results']], ['note']
+        )
+        self.assertEqual(await sync_to_async(
+            self.notes_in('shard1', self.reader).count
+        )(), 1)
+        await sync_to_async(ShardPlacement.objects.filter(
+            user=self.reader
+        ).update)(moving=True)
+        response = await client.post(
+            url, data={'title': 'Заметка', 'text': 'Текст'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+
+    def test_move_user(self):
+        """Перенос копирует заметки, тексты и историю, журнал — заново."""
+        notes = make_notes(self.author, 3)
+        notes[0].text = 'Длинный текст ' * 20
+        notes[0].save()
+        feed = self.author_client.get(reverse('notes:api-changes')).json()
+        revisions_count = NoteRevision.objects.count()
+        moved = shards.move_user(self.author.pk, 'shard1')
+        self.assertEqual(moved, 3)
+        self.assertEqual(shards.placement(self.author.pk), ('shard1', False))
+        self.assertFalse(Note.objects.filter(author=self.author).exists())
+        self.assertFalse(NoteRevision.objects.exists())
+        copied = self.notes_in('shard1', self.author)
+        self.assertEqual(
+            sorted(copied.values_list('slug', flat=True)),
+            sorted(note.slug for note in notes),
+        )
+        with routers.on_shard('shard1'):
+            self.assertEqual(
+                copied.get(slug=notes[0].slug).text, 'Длинный текст ' * 20
+            )
+            self.assertEqual(NoteRevision.objects.count(), revisions_count)
+        url = reverse('notes:api-changes')
+        response = self.author_client.get(url, {'since': feed['next']})
+        self.assertEqual(response.status_code, HTTPStatus.GONE)
+        feed = self.author_client.get(url).json()
+        self.assertEqual(len(feed['changes']), 3)
+        self.assertEqual(self.author_client.get(url, {
+            'since': feed['next'], 'floor': feed['floor'],
+        }).json()['changes'], [])
+
+    def test_rebalance_command(self):
+        """Команда переносит пользователей в пустой шард."""
+        make_notes(self.author, 30)
+        make_notes(self.reader, 10)
+        out = StringIO()
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+        self.assertIn('-> shard1', out.getvalue())
+        self.assertFalse(Note.objects.using('shard1').exists())
+        call_command('rebalance_shards', stdout=StringIO())
+        counts = shards.note_counts()
+        self.assertEqual(
+            sum(len(users) for users in counts.values()), 2
+        )
+        self.assertTrue(counts['shard1'])
+        self.assertTrue(counts['default'])
+
+    def test_streamed_responses_read_author_shard(self):
+        """Выгрузка и текст большой заметки читаются потоком из шарда."""
+        self.place(self.reader, 'shard1')
+        text = ' '.join(f'слово{number}' for number in range(100))
+        self.reader_client.post(reverse('notes:add'), data={
+            'title': 'Большая заметка', 'text': text, 'slug': 'big',
+        })
+        with routers.on_shard('shard1'):
+            self.assertIsNotNone(Note.objects.get(slug='big').body_id)
+        response = self.reader_client.get(reverse('notes:export'))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['text'] for line in lines], [text])
+        response = self.reader_client.get(
+            reverse('notes:detail', args=('big',))
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn(text, b''.join(response.streaming_content).decode())
+
+    def test_deleted_user_notes_are_purged(self):
+        """Удаление пользователя удаляет его заметки в другом шарде."""
+        self.place(self.reader, 'shard1')
+        with routers.on_shard('shard1'):
+            make_notes(self.reader, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.delete()
+        self.assertFalse(Note.objects.using('shard1').exists())
+        self.assertFalse(NotesVersion.objects.using('shard1').exists())
+
+
+class TestStaticFiles(TestCase):
+
+    CSS = '.note { color: #333; }\n' * 200
+    DECOMPRESS = {'br': brotli.decompress, 'gzip': gzip.decompress}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = os.path.join(directory.name, 'source')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as file:
+            file.write(self.CSS)
+        self.root = os.path.join(directory.name, 'root')
+        overridden = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=self.root,
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder',
+            ],
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.url = static('css/site.css')
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """Имя с хешем содержимого, рядом сжатые копии .br и .gz."""
+        name = self.url[len(settings.STATIC_URL):]
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            with open(os.path.join(self.root, name + suffix), 'rb') as file:
+                self.assertEqual(
+                    self.DECOMPRESS[encoding](file.read()).decode(),
+                    self.CSS,
+                )
+
+    def test_serves_compressed_copy(self):
+        """Сжатая копия по Accept-Encoding, кеш на год."""
+        for accept, encoding in (
+            ('gzip, deflate, br', 'br'), ('gzip', 'gzip'),
+            ('br;q=0, gzip', 'gzip'), ('', None),
+        ):
+            with self.subTest(accept=accept):
+                response = self.client.get(
+                    self.url, HTTP_ACCEPT_ENCODING=accept
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertIn('immutable', response['Cache-Control'])
+                self.assertIn('Accept-Encoding', response['Vary'])
+                content = response.getvalue()
+                self.assertEqual(
+                    int(response['Content-Length']), len(content)
+                )
+                if encoding is not None:
+                    content = self.DECOMPRESS[encoding](content)
+                self.assertEqual(content.decode(), self.CSS)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304."""
+        etag = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br')['ETag']
+        response = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_name_without_hash_is_cached_briefly(self):
+        """Исходное имя кешируется на NOTES_STATIC_MAX_AGE секунд."""
+        response = self.client.get(settings.STATIC_URL + 'css/site.css')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.NOTES_STATIC_MAX_AGE}',
+        )
+
+    async def test_served_in_event_loop(self):
+        """Под ASGI статика отдаётся без перехода в синхронный поток."""
+        chain = ASGIHandler()._middleware_chain.__wrapped__
+        self.assertIsInstance(chain, StaticFilesMiddleware)
+        self.assertTrue(chain.is_async)
+        response = await self.async_client.get(
+            self.url, **{'accept-encoding': 'br'}
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(
+            brotli.decompress(b''.join(response.streaming_content)).decode(),
+            self.CSS,
+        )
+
+    def test_missing_file(self):
+        """Неизвестный файл статики — 404 от URLconf."""
+        response = self.client.get(settings.STATIC_URL + 'css/missing.css')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class TestCompression(TestCase):
+
+    DECOMPRESS = TestStaticFiles.DECOMPRESS
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, = make_users('Автор заметки')
+        make_notes(cls.author, 20)
+        cls.list_url = reverse('notes:list')
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+        cache.bump_generation(self.author.pk)
+        self.author_client = login(self.author)
+
+    def test_html_is_compressed(self):
+        """Страница сжимается кодировкой, которую принимает клиент."""
+        for encoding, decompress in self.DECOMPRESS.items():
+            with self.subTest(encoding=encoding):
+                response = self.author_client.get(
+                    self.list_url, HTTP_ACCEPT_ENCODING=encoding
+                )
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(
+                    int(response['Content-Length']), len(response.content)
+                )
+                self.assertIn(
+                    'Заметка 19', decompress(response.content).decode()
+                )
+
+    def test_not_compressed_when_not_accepted(self):
+        """Без Accept-Encoding и с q=0 ответ не сжимается."""
+        for accept in ('', 'gzip;q=0', 'identity'):
+            with self.subTest(accept=accept):
+                response = self.author_client.get(
+                    self.list_url, HTTP_ACCEPT_ENCODING=accept
+                )
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertContains(response, 'Заметка 19')
+
+    def test_json_is_not_compressed(self):
+        """Сжимаются только типы из NOTES_COMPRESS_TYPES."""
+        response = self.author_client.get(
+            reverse('notes:api-list'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_weak_etag_still_gives_not_modified(self):
+        """Слабый ETag сжатой страницы тоже даёт 304."""
+        etag = self.author_client.get(
+            self.list_url, HTTP_ACCEPT_ENCODING='gzip'
+        )['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        response = self.author_client.get(
+            self.list_url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    async def test_compressed_in_event_loop(self):
+        """Под ASGI страница сжимается без перехода в синхронный поток."""
+        chain = ASGIHandler()._middleware_chain.__wrapped__
+        self.assertIsInstance(chain, MetricsMiddleware)
+        self.assertTrue(chain.is_async)
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.author)
+        response = await client.get(
+            self.list_url, **{'accept-encoding': 'gzip'}
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(
+            'Заметка 19', gzip.decompress(response.content).decode()
+        )
+
+    @override_settings(NOTES_BODY_INLINE_LIMIT=100, NOTES_BODY_CHUNK_SIZE=64)
+    def test_streamed_page_is_compressed_by_chunks(self):
+        """Страница большой заметки сжимается потоком, кусок за куском."""
+        text = ' '.join(f'слово{number}' for number in range(100))
+        note = Note.objects.create(
+            title='Большая заметка', text=text, slug='big',
+            author=self.author,
+        )
+        response = self.author_client.get(
+            reverse('notes:detail', args=(note.slug,)),
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        self.assertIn(text, gzip.decompress(b''.join(chunks)).decode())
+
+
+class TestAutocomplete(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = make_users('Автор заметки', 'Читатель')
+        cls.author_client = login(cls.author)
+        cls.url = reverse('notes:api-autocomplete')
+        cls.note = Note.objects.create(
+            title='Список покупок', text='Текст', slug='groceries',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        caches['rate_limits'].clear()
+
+    def slugs(self, query, user=None, limit=10):
+        return [
+            slug for _, _, slug in autocomplete.complete(
+                (user or self.author).pk, query, limit
+            )
+        ]
+
+    def test_cyrillic_and_latin_queries_match(self):
+        """Начало любого слова на кириллице или латинице, любой регистр."""
+        for query in (
+            'Спис', 'спис', 'SPIS', 'spisok pok', 'Список-пок', 'покуп',
+            'pok', 'groc', '  Список  ',
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.slugs(query), ['groceries'])
+        for query in ('писок', 'купок', 'список продуктов', '', '!!'):
+            with self.subTest(query=query):
+                self.assertEqual(self.slugs(query), [])
+
+    def test_only_own_notes(self):
+        """Заметки другого автора не подсказываются."""
+        Note.objects.create(
+            title='Список дел', text='Текст', slug='todo', author=self.reader,
+        )
+        self.assertEqual(self.slugs('спис'), ['groceries'])
+        self.assertEqual(self.slugs('спис', user=self.reader), ['todo'])
+
+    def test_keys_follow_save_and_delete(self):
+        """Ключи меняются вместе с заголовком и удаляются с заметкой."""
+        self.note.title = 'План отпуска'
+        self.note.save()
+        self.assertEqual(self.slugs('спис'), [])
+        self.assertEqual(self.slugs('отп'), ['groceries'])
+        self.note.text = 'Другой текст'
+        self.note.save(update_fields=('text',))
+        self.assertEqual(self.slugs('plan'), ['groceries'])
+        self.note.delete()
+        self.assertFalse(NoteKey.objects.exists())
+
+    def test_bulk_operations_keep_keys(self):
+        """Импорт, пакетная смена заголовка и удаление обновляют ключи."""
+        notes = make_notes(self.author, 3, title='Черновик', slug='draft')
+        self.assertEqual(
+            self.slugs('chern'), [note.slug for note in notes]
+        )
+        bulk.retitle_notes(
+            self.author, [note.slug for note in notes], prefix='Архив: '
+        )
+        self.assertEqual(len(self.slugs('архив')), 3)
+        self.assertEqual(len(self.slugs('черн')), 3)
+        bulk.delete_notes(self.author, [note.slug for note in notes])
+        self.assertEqual(self.slugs('черн'), [])
+        self.assertEqual(
+            set(NoteKey.objects.values_list('note_id', flat=True)),
+            {self.note.pk},
+        )
+
+    def test_results_are_capped(self):
+        """Не больше limit заметок, каждая один раз."""
+        make_notes(self.author, 30, title='Заметка заметок', slug='z')
+        found = self.slugs('zamet', limit=5)
+        self.assertEqual(len(found), 5)
+        self.assertEqual(len(set(found)), 5)
+
+    def test_query_count_does_not_depend_on_notes(self):
+        """Один запрос по индексу при любом числе заметок."""
+        make_notes(self.author, 500, title='Заметка', slug='many')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(len(self.slugs('zam')), 10)
+        self.assertEqual(len(context.captured_queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN QUERY PLAN ' + context.captured_queries[0]['sql']
+            )
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('notekey_prefix_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_api(self):
+        """API отдаёт id, заголовок и slug; limit не больше настройки."""
+        response = self.author_client.get(self.url, {'q': 'spis'})
+        self.assertEqual(response.json(), {'results': [{
+            'id': self.note.pk, 'title': 'Список покупок',
+            'slug': 'groceries',
+        }]})
+        for limit in ('0', 'много', settings.NOTES_AUTOCOMPLETE_LIMIT + 1):
+            with self.subTest(limit=limit):
+                response = self.author_client.get(
+                    self.url, {'q': 'spis', 'limit': limit}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_jump(self):
+        """Переход к первой подсказке, без неё — к поиску."""
+        url = reverse('notes:jump')
+        response = self.author_client.get(url, {'q': 'покупок'})
+        self.assertRedirects(
+            response, reverse('notes:detail', args=('groceries',))
+        )
+        response = self.author_client.get(url, {'q': 'отпуск'})
+        self.assertRedirects(
+            response, reverse('notes:search') + '?' + urlencode({
+                'q': 'отпуск',
+            }),
+        )
+
+    def test_rebuild_command(self):
+        """Команда восстанавливает ключи всех заметок."""
+        NoteKey.objects.all().delete()
+        call_command('rebuild_note_keys', stdout=StringIO())
+        self.assertEqual(self.slugs('pokup'), ['groceries'])
@@ -1,7 +1,7 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from notes.models import Note
@@ -50,7 +50,8 @@ class TestRoutes(TestCase):
             (self.not_author_client, HTTPStatus.NOT_FOUND),
         )
         for user, status in users_statuses:
-            for name in ('notes:detail', 'notes:edit', 'notes:delete'):
+            for name in ('notes:detail', 'notes:edit', 'notes:delete',
+                         'notes:history'):
                 with self.subTest(user=user, name=name):
                     url = reverse(name, args=(self.note.slug,))
                     response = user.get(url)
@@ -62,11 +63,16 @@ class TestRoutes(TestCase):
 
         for name, args in (
             ('notes:list', None),
+            ('notes:search', None),
+            ('notes:export', None),
+            ('notes:jump', None),
             ('notes:success', None),
             ('notes:add', None),
             ('notes:detail', (self.note.slug,)),
             ('notes:edit', (self.note.slug,)),
             ('notes:delete', (self.note.slug,)),
+            ('notes:history', (self.note.slug,)),
+            ('notes:revision', (self.note.slug, 1)),
         ):
             with self.subTest(name=name):
                 url = reverse(name, args=args)
@@ -78,6 +84,7 @@ class TestRoutes(TestCase):
         """Проверка только авторизованному пользователю доступны страницы."""
         urls = (
             ('notes:list'),
+            ('notes:search'),
             ('notes:success'),
             ('notes:add'),
         )
@@ -86,3 +93,22 @@ class TestRoutes(TestCase):
                 url = reverse(name)
                 response = self.author_client.get(url)
                 self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_metrics_only_for_internal_ips(self):
+        """Метрики доступны только адресам из INTERNAL_IPS."""
+        url = reverse('notes:metrics')
+        for address, status in (
+            ('127.0.0.1', HTTPStatus.OK),
+            ('10.0.0.1', HTTPStatus.FORBIDDEN),
+        ):
+            with self.subTest(address=address):
+                response = self.client.get(url, REMOTE_ADDR=address)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(ROOT_URLCONF='yanote.urls_api')
+    def test_api_urlconf_serves_only_api(self):
+        """В облегчённом профиле доступен API, а HTML-страниц нет."""
+        response = self.author_client.get(reverse('notes:api-list'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.author_client.get('/add/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
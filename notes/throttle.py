@@ -0,0 +1,64 @@
+"""
+Ограничение частоты изменений заметок.
+
+На каждую пару (клиент, имя URL) из NOTES_RATE_LIMITS приходится ведро
+токенов: в нём до burst токенов, за period секунд набирается burst
+новых, каждый изменяющий запрос забирает один. Ведро хранится в кеше
+NOTES_RATE_LIMIT_CACHE одним числом — моментом в миллисекундах, когда
+оно снова будет полным (GCRA). Токен забирает атомарный incr, отказ
+возвращает его decr, поэтому при общем кеше (memcached) лимит один на
+все процессы, а параллельные запросы клиента не проходят сверх него.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'throttle'
+
+
+def client_key(request):
+    """Пользователь, а для анонимного запроса — адрес клиента."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    return f'ip{request.META.get("REMOTE_ADDR", "")}'
+
+
+def take(key, burst, period, now=None):
+    """
+    Забирает токен из ведра key.
+
+    Возвращает 0, если токен был, иначе число секунд до следующего
+    токена; при отказе ведро не меняется.
+    """
+    cache = caches[settings.NOTES_RATE_LIMIT_CACHE]
+    now = round((time.time() if now is None else now) * 1000)
+    interval = max(1, round(period * 1000 / burst))
+    try:
+        full_at = cache.incr(key, interval) - interval
+    except ValueError:
+        # Ключ без срока хранения: момент в прошлом — полное ведро.
+        if cache.add(key, now + interval, None):
+            return 0
+        full_at = cache.incr(key, interval) - interval
+    if full_at < now:
+        # Ведро было полным: отсчёт заново. Параллельный запрос здесь
+        # может пройти даром, но только пока ведро полно.
+        cache.set(key, now + interval, None)
+        return 0
+    wait = full_at - now - (burst - 1) * interval
+    if wait <= 0:
+        return 0
+    cache.decr(key, interval)
+    return wait / 1000
+
+
+def check(request, view_name):
+    """Секунды до следующего разрешённого запроса или 0 без лимита."""
+    limit = settings.NOTES_RATE_LIMITS.get(view_name)
+    if limit is None:
+        return 0
+    burst, period = limit
+    key = f'{KEY_PREFIX}:{view_name}:{client_key(request)}'
+    return take(key, burst, period)
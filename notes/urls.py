@@ -1,6 +1,6 @@
 from django.urls import path
 
-from notes import views
+from notes import api, metrics, views
 
 app_name = 'notes'
 
@@ -9,7 +9,34 @@ urlpatterns = [
     path('add/', views.NoteCreate.as_view(), name='add'),
     path('edit/<slug:slug>/', views.NoteUpdate.as_view(), name='edit'),
     path('note/<slug:slug>/', views.NoteDetail.as_view(), name='detail'),
+    path(
+        'note/<slug:slug>/history/',
+        views.NoteHistory.as_view(),
+        name='history',
+    ),
+    path(
+        'note/<slug:slug>/history/<int:number>/',
+        views.NoteRevisionDetail.as_view(),
+        name='revision',
+    ),
     path('delete/<slug:slug>/', views.NoteDelete.as_view(), name='delete'),
     path('notes/', views.NotesList.as_view(), name='list'),
+    path('search/', views.NoteSearch.as_view(), name='search'),
+    path('jump/', views.NoteJump.as_view(), name='jump'),
+    path('bulk/export/', views.NoteExport.as_view(), name='export'),
+    path('bulk/import/', views.NoteImport.as_view(), name='import'),
+    path(
+        'bulk/delete/', views.NoteBulkDelete.as_view(), name='bulk-delete'
+    ),
+    path(
+        'bulk/update/', views.NoteBulkUpdate.as_view(), name='bulk-update'
+    ),
+    path('api/notes/', api.note_list, name='api-list'),
+    path('api/notes/<slug:slug>/', api.note_detail, name='api-detail'),
+    path('api/changes/', api.note_changes, name='api-changes'),
+    path(
+        'api/autocomplete/', api.note_autocomplete, name='api-autocomplete'
+    ),
+    path('metrics/', metrics.Metrics.as_view(), name='metrics'),
     path('done/', views.NoteSuccess.as_view(), name='success'),
 ]
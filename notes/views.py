@@ -1,9 +1,25 @@
+import hashlib
+import secrets
+from http import HTTPStatus
+from itertools import chain
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.urls import reverse_lazy
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.html import escape
+from django.utils.http import http_date, quote_etag, urlencode
 from django.views import generic
 
-from .forms import NoteForm
-from .models import Note
+from . import autocomplete, bulk, cache, revisions
+from .forms import BulkDeleteForm, BulkUpdateForm, NoteForm
+from .models import Note, NoteBody, NotesVersion
+from .pagination import KeysetPaginator
+from .search import get_backend
 
 
 class Home(generic.TemplateView):
@@ -22,26 +38,74 @@ class NoteBase(LoginRequiredMixin):
     success_url = reverse_lazy('notes:success')
 
     def get_queryset(self):
-        """Пользователь может работать только со своими заметками."""
+        """
+        Пользователь может работать только со своими заметками.
+
+        Запрос идёт в шард автора, выбранный ShardMiddleware.
+        """
         return self.model.objects.filter(author=self.request.user)
 
 
-class NoteCreate(NoteBase, generic.CreateView):
-    """Добавление заметки."""
+class ConditionalMixin:
+    """
+    Ответ 304 по версии заметок пользователя.
+
+    Версия читается одним запросом по первичному ключу до загрузки
+    заметок и рендеринга шаблона; ETag зависит ещё и от адреса, то есть
+    от slug или курсора страницы.
+    """
+
+    def get_etag(self, version, updated):
+        key = ':'.join((
+            str(self.request.user.pk), str(version),
+            str(updated.timestamp()), self.request.get_full_path(),
+        ))
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        state = NotesVersion.objects.filter(
+            user_id=request.user.pk
+        ).values_list('version', 'updated').first()
+        if state is None:
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag(*state)
+        last_modified = int(state[1].timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class NoteFormMixin:
+    """Сохранение формы заметки без ошибки 500 на занятом slug."""
     template_name = 'notes/form.html'
     form_class = NoteForm
 
     def form_valid(self, form):
-        new_note = form.save(commit=False)
-        new_note.author = self.request.user
-        new_note.save()
+        try:
+            return super().form_valid(form)
+        except IntegrityError:
+            form.add_slug_taken_error()
+            return self.form_invalid(form)
+
+
+class NoteCreate(NoteBase, NoteFormMixin, generic.CreateView):
+    """Добавление заметки."""
+
+    def form_valid(self, form):
+        form.instance.author = self.request.user
         return super().form_valid(form)
 
 
-class NoteUpdate(NoteBase, generic.UpdateView):
+class NoteUpdate(NoteBase, NoteFormMixin, generic.UpdateView):
     """Редактирование заметки."""
-    template_name = 'notes/form.html'
-    form_class = NoteForm
 
 
 class NoteDelete(NoteBase, generic.DeleteView):
@@ -49,11 +113,179 @@ class NoteDelete(NoteBase, generic.DeleteView):
     template_name = 'notes/delete.html'
 
 
-class NotesList(NoteBase, generic.ListView):
+class NoteHistory(NoteBase, generic.DetailView):
+    """Список версий заметки без их содержимого."""
+    template_name = 'notes/history.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['revisions'] = self.object.revisions.order_by(
+            '-number'
+        ).only('number', 'title', 'size', 'created')
+        return context
+
+
+class NoteRevisionDetail(NoteBase, generic.DetailView):
+    """Версия заметки, собранная из ближайшего снимка и разниц."""
+    template_name = 'notes/revision.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        result = revisions.rebuild(self.object.pk, self.kwargs['number'])
+        if result is None:
+            raise Http404
+        context['revision'], context['text'] = result
+        return context
+
+
+class NotesList(NoteBase, ConditionalMixin, generic.ListView):
     """Список всех заметок пользователя."""
     template_name = 'notes/list.html'
+    read_only = True
+    paginator_class = KeysetPaginator
+    cursor_kwarg = 'cursor'
+
+    def get_queryset(self):
+        """Выводимые в шаблоне поля и версия для кеша строки."""
+        return super().get_queryset().only('id', 'title', 'slug', 'updated')
+
+    def get_paginate_by(self, queryset):
+        return settings.NOTES_PAGINATE_BY
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Страница выбирается по курсору, а не по номеру.
+
+        Ключ кеша — из разобранного курсора: битый курсор даёт 404 до
+        кеша, а строка клиента в ключ не попадает.
+        """
+        paginator = self.paginator_class(queryset, page_size)
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        direction, pivot = paginator.decode_cursor(cursor)
+        page = cache.get_or_set(
+            self.request.user.pk, 'list', (page_size, direction, pivot),
+            lambda: paginator.page(cursor),
+        )
+        return paginator, page, page.object_list, page.has_other_pages()
 
 
-class NoteDetail(NoteBase, generic.DetailView):
+class NoteDetail(NoteBase, ConditionalMixin, generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+    read_only = True
+
+    def get_object(self, queryset=None):
+        slug = self.kwargs[self.slug_url_kwarg]
+        return cache.get_or_set(
+            self.request.user.pk, 'detail', (slug,),
+            lambda: super(NoteDetail, self).get_object(queryset),
+        )
+
+    def render_to_response(self, context, **response_kwargs):
+        """
+        Текст из NoteBody отдаётся потоком по кускам.
+
+        Страница рендерится с меткой на месте текста, а текст подставляется
+        между частями страницы при отправке, не загружаясь целиком.
+        """
+        body_id = self.object.body_id
+        if body_id is None:
+            return super().render_to_response(context, **response_kwargs)
+        context['body_marker'] = marker = secrets.token_hex(16)
+        head, tail = render_to_string(
+            self.get_template_names(), context, self.request
+        ).split(marker)
+        return StreamingHttpResponse(
+            chain((head,), map(escape, NoteBody.stream(body_id)), (tail,)),
+            **response_kwargs,
+        )
+
+
+class NoteSearch(NoteBase, generic.ListView):
+    """Полнотекстовый поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+    query_kwarg = 'q'
+
+    def get_query(self):
+        return self.request.GET.get(self.query_kwarg, '').strip()
+
+    def get_queryset(self):
+        query = self.get_query()
+        queryset = super().get_queryset().only('id', 'title', 'slug')
+        if not query:
+            return queryset.none()
+        return get_backend().search(
+            queryset, query, settings.NOTES_SEARCH_LIMIT,
+            author_id=self.request.user.pk,
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.get_query()
+        return context
+
+
+class NoteJump(LoginRequiredMixin, generic.View):
+    """
+    Переход к заметке по началу слова её заголовка или slug.
+
+    Без совпадений — полнотекстовый поиск по тому же запросу.
+    """
+    read_only = True
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '')
+        found = autocomplete.complete(request.user.pk, query, 1)
+        if found:
+            _, _, slug = found[0]
+            return redirect('notes:detail', slug)
+        return redirect(f"{reverse('notes:search')}?{urlencode({'q': query})}")
+
+
+class NoteExport(LoginRequiredMixin, generic.View):
+    """Выгрузка всех заметок пользователя в NDJSON."""
+
+    def get(self, request, *args, **kwargs):
+        response = StreamingHttpResponse(
+            bulk.export_notes(request.user),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="notes.ndjson"'
+        )
+        return response
+
+
+class NoteBulkDelete(LoginRequiredMixin, generic.View):
+    """Удаление выбранных заметок пользователя одной транзакцией."""
+    form_class = BulkDeleteForm
+
+    def post(self, request, *args, **kwargs):
+        form = self.form_class(request.POST)
+        if not form.is_valid():
+            return JsonResponse(
+                {'errors': form.errors}, status=HTTPStatus.BAD_REQUEST
+            )
+        return JsonResponse(self.apply(form.cleaned_data))
+
+    def apply(self, data):
+        return {'deleted': bulk.delete_notes(self.request.user, data['slugs'])}
+
+
+class NoteBulkUpdate(NoteBulkDelete):
+    """Смена заголовка выбранных заметок пользователя."""
+    form_class = BulkUpdateForm
+
+    def apply(self, data):
+        return {'updated': bulk.retitle_notes(
+            self.request.user, data['slugs'],
+            title=data['title'] or None, prefix=data['prefix'] or None,
+        )}
+
+
+class NoteImport(LoginRequiredMixin, generic.View):
+    """Загрузка заметок пользователя из NDJSON в теле запроса."""
+
+    def post(self, request, *args, **kwargs):
+        result = bulk.import_notes(request.user, request)
+        return JsonResponse(result.as_dict())
@@ -11,8 +11,10 @@ DEBUG = False
 ALLOWED_HOSTS = ['*']
 
 
+# Админка регистрирует модели при загрузке URLconf (yanote/urls.py), а
+# не в django.setup(): команды manage.py её не импортируют.
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -22,11 +24,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'notes.middleware.StaticFilesMiddleware',
+    'notes.middleware.MetricsMiddleware',
+    'notes.middleware.CompressionMiddleware',
+    'notes.middleware.ReadOnlyMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'notes.middleware.ShardMiddleware',
+    'notes.middleware.ThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -37,6 +45,8 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
+        # При DEBUG = False Django сам оборачивает загрузчики в
+        # кеширующий: шаблоны компилируются один раз на процесс.
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -49,16 +59,69 @@ TEMPLATES = [
     },
 ]
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Фрагменты шаблонов ({% cache %}): ключи содержат версию данных,
+    # поэтому отдельный кеш нужен только чтобы не вытеснять данные.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Вёдра ограничения частоты: отдельно, чтобы страницы в кеше не
+    # вытесняли их, а поток запросов не вытеснял страницы. Здесь — на
+    # один процесс; yanote.settings_production держит их в memcached.
+    'rate_limits': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'rate-limits',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# ModelBackend — для сессий, открытых до CachedModelBackend: в сессии
+# записан путь бэкенда, который её открыл.
+AUTHENTICATION_BACKENDS = [
+    'notes.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 WSGI_APPLICATION = 'yanote.wsgi.application'
 
 
+# Рабочие серверы используют профиль yanote.settings_production: WAL,
+# постоянные соединения, reader и шарды заметок.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
 }
 
+DATABASE_ROUTERS = [
+    'notes.routers.ShardRouter',
+    'notes.routers.ReadReplicaRouter',
+]
+
+# Базы с заметками (notes.shards); новые пользователи делятся между
+# ними по хешу id. Пока база одна, шардирования нет. Каждая база
+# создаётся migrate --database <алиас>.
+NOTES_SHARDS = ('default',)
+# Сколько секунд перенос пользователя между шардами ждёт завершения
+# уже начатых запросов, прежде чем копировать заметки.
+NOTES_SHARD_MOVE_GRACE = 5
+
+
+# Новые пароли хешируются первым хешером, остальные проверяют старые
+# хеши, которые при входе пересчитываются первым (не чаще
+# NOTES_PASSWORD_UPGRADE_RATE). Хешеры notes.hashers считают хеш в
+# пуле процессов, см. NOTES_PASSWORD_HASH_*.
+PASSWORD_HASHERS = [
+    'notes.hashers.ScryptPasswordHasher',
+    'notes.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -82,8 +145,108 @@ USE_TZ = True
 
 
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+# Имена с хешем и сжатые копии .br и .gz (notes.staticfiles); отдаёт
+# их StaticFilesMiddleware после manage.py collectstatic.
+STATICFILES_STORAGE = 'notes.staticfiles.CompressedManifestStaticFilesStorage'
+# Кеширование статики без хеша в имени, в секундах.
+NOTES_STATIC_MAX_AGE = 60
+
+# Сжатие ответов (CompressionMiddleware): типы, наименьший размер в
+# байтах и уровни — quality для br и уровень для gzip.
+NOTES_COMPRESS_TYPES = ('text/html',)
+NOTES_COMPRESS_MIN_SIZE = 512
+NOTES_COMPRESS_LEVELS = {'br': 4, 'gzip': 6}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+NOTES_PAGINATE_BY = 50
+
+NOTES_SEARCH_BACKEND = None
+NOTES_SEARCH_LIMIT = 50
+# Наибольшее и по умолчанию число заметок в автодополнении.
+NOTES_AUTOCOMPLETE_LIMIT = 10
+
+NOTES_CACHE_ALIAS = 'default'
+NOTES_CACHE_TIMEOUT = 300
+
+NOTES_BULK_CHUNK_SIZE = 1000
+# Выбранные заметки — поля формы: держим ниже
+# DATA_UPLOAD_MAX_NUMBER_FIELDS (1000).
+NOTES_BULK_MAX_NOTES = 500
+# Сколько ошибок импорта хранить и отдавать; остальные только считаются.
+NOTES_BULK_MAX_ERRORS = 100
+
+# Админка заметок: предел точного подсчёта строк и число находок
+# полнотекстового поиска.
+NOTES_ADMIN_COUNT_LIMIT = 10000
+NOTES_ADMIN_SEARCH_LIMIT = 1000
+
+NOTES_REVISION_SNAPSHOT_EVERY = 20
+NOTES_REVISION_COMPRESS_LEVEL = 6
+# Версии текстов длиннее стольких строк хранятся снимками: построчная
+# разница (difflib) для них дороже, около 10 мс на 1000 строк.
+NOTES_REVISION_DELTA_MAX_LINES = 1000
+
+NOTES_BODY_INLINE_LIMIT = 64 * 1024
+NOTES_BODY_CHUNK_SIZE = 256 * 1024
+NOTES_BODY_COMPRESS_LEVEL = 6
+
+# Журнал изменений (notes.changes): записей в ответе, ожидание
+# long-poll в секундах и срок хранения записей об удалении в днях.
+NOTES_CHANGES_BATCH = 200
+NOTES_CHANGES_MAX_WAIT = 30
+NOTES_CHANGES_POLL_INTERVAL = 1.0
+NOTES_CHANGES_RETENTION_DAYS = 30
+
+NOTES_TASKS_EAGER = False
+NOTES_TASK_BATCH_SIZE = 100
+NOTES_TASK_LEASE = 300
+NOTES_TASK_MAX_ATTEMPTS = 5
+NOTES_TASK_RETRY_DELAY = 10
+NOTES_TASK_POLL_INTERVAL = 1.0
+
+# Изменения заметок: (burst, period) — не больше burst запросов подряд
+# и burst запросов за period секунд на пользователя и имя URL.
+NOTES_RATE_LIMITS = {
+    'notes:add': (30, 60),
+    'notes:edit': (60, 60),
+    'notes:delete': (30, 60),
+    'notes:import': (5, 60),
+    'notes:bulk-delete': (10, 60),
+    'notes:bulk-update': (10, 60),
+    'notes:api-list': (30, 60),
+    'notes:api-detail': (60, 60),
+}
+NOTES_RATE_LIMIT_CACHE = 'rate_limits'
+
+# scrypt: n, r, p. Память на хеш — 128 * n * r байт, 16 МБ.
+NOTES_SCRYPT_WORK_FACTOR = 2 ** 14
+NOTES_SCRYPT_BLOCK_SIZE = 8
+NOTES_SCRYPT_PARALLELISM = 1
+
+# Пул ограничивает долю процессора под хеши при волне входов; время
+# самого входа он не сокращает. 0 процессов — хеш считается в рабочем
+# потоке.
+NOTES_PASSWORD_HASH_WORKERS = 2
+NOTES_PASSWORD_HASH_QUEUE = 32
+NOTES_PASSWORD_HASH_NICE = 10
+# (burst, period) пересчётов устаревших хешей при входе на все входы.
+NOTES_PASSWORD_UPGRADE_RATE = (10, 60)
+
+NOTES_USER_CACHE_TTL = 30
+NOTES_USER_CACHE_SIZE = 10000
+
+INTERNAL_IPS = ['127.0.0.1']
+
+# Снимки тестовой базы (yanote.test_runner); None — база в памяти.
+TEST_RUNNER = 'yanote.test_runner.SnapshotRunner'
+NOTES_TEST_SNAPSHOT_DIR = BASE_DIR / '.test-snapshots'
+
+NOTES_PROFILE_THRESHOLD_MS = None
+NOTES_PROFILE_SAMPLE_RATE = 0.01
+NOTES_PROFILE_DIR = BASE_DIR / 'profiles'
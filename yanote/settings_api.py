@@ -0,0 +1,41 @@
+"""
+Облегчённый профиль для процессов, которые обслуживают только JSON API
+заметок и метрики. Строится на рабочем профиле
+yanote.settings_production.
+
+Без админки, сообщений и staticfiles, без страниц и авторизации через
+формы; сессии и пользователи те же, что у полного профиля, поэтому
+процессы обоих профилей можно держать за одним балансировщиком:
+
+    DJANGO_SETTINGS_MODULE=yanote.settings_api gunicorn yanote.wsgi
+"""
+import copy
+
+from yanote.settings_production import *  # noqa: F401,F403
+from yanote.settings_production import TEMPLATES
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'notes.apps.NotesConfig',
+]
+
+MIDDLEWARE = [
+    'notes.middleware.MetricsMiddleware',
+    'notes.middleware.ReadOnlyMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'notes.middleware.ShardMiddleware',
+    'notes.middleware.ThrottleMiddleware',
+]
+
+ROOT_URLCONF = 'yanote.urls_api'
+
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['OPTIONS']['context_processors'] = [
+    'django.template.context_processors.request',
+]
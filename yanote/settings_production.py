@@ -0,0 +1,57 @@
+"""
+Профиль рабочих серверов: настройки базы и сессий под нагрузку.
+
+Основные настройки (yanote.settings) остаются для разработки и
+manage.py; этот профиль включается переменной окружения:
+
+    DJANGO_SETTINGS_MODULE=yanote.settings_production gunicorn yanote.wsgi
+"""
+from yanote.settings import *  # noqa: F401,F403
+from yanote.settings import BASE_DIR, CACHES, NOTES_SHARDS
+
+# Общий memcached для всех процессов: вёдра NOTES_RATE_LIMITS должны
+# быть одни на все процессы, иначе лимит умножается на их число, а
+# сессии — чтобы выход действовал во всех процессах сразу.
+MEMCACHED = {
+    'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'LOCATION': '127.0.0.1:11211',
+}
+CACHES = {
+    **CACHES,
+    'rate_limits': {**MEMCACHED, 'KEY_PREFIX': 'rate-limits'},
+    'sessions': {**MEMCACHED, 'KEY_PREFIX': 'sessions'},
+}
+
+# Сессия читается из общего кеша, в базу идёт только запись. Без
+# записи в базу вообще: 'django.contrib.sessions.backends.signed_cookies'.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# WAL и PRAGMA из yanote.sqlite.base.DEFAULT_PRAGMAS на каждом
+# соединении. Запись идёт через default с BEGIN IMMEDIATE, чтение
+# представлений с read_only = True — через reader (notes.routers).
+# Базы шардов заметок — по одной на каждый алиас из NOTES_SHARDS,
+# кроме default.
+DATABASES = {
+    'default': {
+        'ENGINE': 'yanote.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    },
+    'reader': {
+        'ENGINE': 'yanote.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'pragmas': {'query_only': 'ON'}},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASES.update(
+    (alias, {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db-{alias}.sqlite3',
+    })
+    for alias in NOTES_SHARDS
+    if alias != 'default'
+)
@@ -0,0 +1,25 @@
+"""
+Профиль тестов: manage.py test выбирает его сам.
+
+Тесты проверяют рабочий профиль (yanote.settings_production) — тот же
+бэкенд базы, reader и сессии. Шарды включают в самих тестах через
+override_settings(NOTES_SHARDS=...), поэтому база shard1 есть всегда.
+Memcached в тестах не поднимается: кеши — из yanote.settings, а
+кеши, которых там нет, — locmem как default.
+"""
+from yanote import settings
+from yanote.settings_production import *  # noqa: F401,F403
+from yanote.settings_production import BASE_DIR, CACHES, DATABASES
+
+CACHES = {
+    alias: settings.CACHES.get(alias, settings.CACHES['default'])
+    for alias in CACHES
+}
+
+DATABASES = {
+    **DATABASES,
+    'shard1': {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'db-shard1.sqlite3',
+    },
+}
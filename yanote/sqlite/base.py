@@ -0,0 +1,78 @@
+"""
+SQLite с настройками для работы под нагрузкой.
+
+Поверх стандартного бэкенда django.db.backends.sqlite3 каждое новое
+соединение получает PRAGMA из OPTIONS['pragmas'] (по умолчанию
+DEFAULT_PRAGMAS), а OPTIONS['transaction_mode'] задаёт вид BEGIN для
+transaction.atomic(). С 'IMMEDIATE' транзакция сразу берёт блокировку
+записи и ждёт её busy_timeout, вместо того чтобы получить
+«database is locked» при попытке повысить блокировку чтения.
+
+Число параметров запроса берётся из лимита самой библиотеки SQLite
+(32766 с версии 3.32), а не из старых 999: bulk_create и IN по
+тысяче заметок укладываются в один запрос. Строки bulk_create идут
+списком VALUES, а не INSERT ... SELECT ... UNION ALL, как в Django 3.2:
+на составной SELECT у SQLite отдельный лимит в 500 частей, а на
+VALUES его нет с версии 3.8.8.
+"""
+import sqlite3
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base, features, operations
+from django.utils.functional import cached_property
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseFeatures(features.DatabaseFeatures):
+
+    @cached_property
+    def max_query_params(self):
+        with self.connection.temporary_connection():
+            connection = self.connection.connection
+            if not hasattr(connection, 'getlimit'):
+                return super().max_query_params
+            return connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+
+
+class DatabaseOperations(operations.DatabaseOperations):
+
+    def bulk_insert_sql(self, fields, placeholder_rows):
+        return 'VALUES ' + ', '.join(
+            '(%s)' % ', '.join(row) for row in placeholder_rows
+        )
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    features_class = DatabaseFeatures
+    ops_class = DatabaseOperations
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {
+            **DEFAULT_PRAGMAS, **params.pop('pragmas', {})
+        }
+        mode = params.pop('transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}.'
+            )
+        self.transaction_mode = mode
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
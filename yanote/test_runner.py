@@ -0,0 +1,122 @@
+"""
+Запуск тестов на снимке тестовой базы SQLite.
+
+Тестовая база SQLite живёт в памяти, но не собирается миграциями на
+каждом запуске: первый запуск сохраняет её в файл NOTES_TEST_SNAPSHOT_DIR,
+имя которого содержит хеш версии Django и всех файлов миграций, а
+следующие копируют файл в память через backup API и открывают базу как
+с --keepdb, так что migrate только убеждается, что применять нечего.
+Изменённая миграция даёт новый хеш, снимки со старым удаляются.
+
+С --parallel рабочие процессы получают копию базы в памяти при fork,
+как и без снимка. Данные тестов в снимок не попадают: он пишется сразу
+после миграций.
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.loader import MigrationLoader
+from django.test.runner import DiscoverRunner
+
+SNAPSHOT_PREFIX = 'test-'
+
+
+def migration_state():
+    """Хеш версии Django и содержимого всех файлов миграций."""
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    digest = hashlib.sha256(django.get_version().encode())
+    for key in sorted(loader.disk_migrations):
+        module = sys.modules[loader.disk_migrations[key].__module__]
+        digest.update(':'.join(key).encode())
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class SnapshotRunner(DiscoverRunner):
+    """DiscoverRunner, который берёт схему тестовой базы из снимка."""
+
+    def __init__(self, snapshot=True, **kwargs):
+        super().__init__(**kwargs)
+        self.snapshot = (
+            snapshot and settings.NOTES_TEST_SNAPSHOT_DIR is not None
+        )
+        # Базу в памяти держит открытой хотя бы одно соединение.
+        self.holders = []
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--no-snapshot', action='store_false', dest='snapshot',
+            help='Собрать тестовую базу миграциями, без снимка.',
+        )
+
+    def snapshot_databases(self, aliases):
+        """Алиасы нужных тестам баз SQLite в памяти и пути их снимков."""
+        directory = Path(settings.NOTES_TEST_SNAPSHOT_DIR)
+        state = migration_state()
+        paths = {}
+        for connection in connections.all():
+            if (connection.alias not in aliases
+                    or connection.vendor != 'sqlite'
+                    or connection.settings_dict['TEST'].get('MIRROR')
+                    or not connection.creation.is_in_memory_db(
+                        connection.creation._get_test_db_name()
+                    )):
+                continue
+            prefix = f'{SNAPSHOT_PREFIX}{connection.alias}-'
+            for path in directory.glob(f'{prefix}*'):
+                if path.name != f'{prefix}{state}.sqlite3':
+                    path.unlink()
+            paths[connection.alias] = directory / f'{prefix}{state}.sqlite3'
+        return paths
+
+    def setup_databases(self, **kwargs):
+        if not self.snapshot or self.keepdb:
+            return super().setup_databases(**kwargs)
+        Path(settings.NOTES_TEST_SNAPSHOT_DIR).mkdir(
+            parents=True, exist_ok=True
+        )
+        paths = self.snapshot_databases(kwargs['aliases'])
+        restored = all(path.exists() for path in paths.values())
+        if restored:
+            for alias, path in paths.items():
+                self.restore(alias, path)
+        self.keepdb = restored
+        try:
+            return super().setup_databases(**kwargs)
+        finally:
+            self.keepdb = False
+            if not restored:
+                for alias, path in paths.items():
+                    self.save(alias, path)
+
+    def restore(self, alias, path):
+        name = connections[alias].creation._get_test_db_name()
+        target = sqlite3.connect(name, uri=True)
+        with sqlite3.connect(path) as source:
+            source.backup(target)
+        self.holders.append(target)
+
+    @staticmethod
+    def save(alias, path):
+        """Атомарно записывает базу алиаса, чтобы запуски не мешали."""
+        connection = connections[alias]
+        connection.ensure_connection()
+        partial = path.with_name(f'{path.name}.{os.getpid()}')
+        with sqlite3.connect(partial) as target:
+            connection.connection.backup(target)
+        target.close()
+        os.replace(partial, path)
+
+    def teardown_databases(self, old_config, **kwargs):
+        super().teardown_databases(old_config, **kwargs)
+        for holder in self.holders:
+            holder.close()
+        self.holders = []
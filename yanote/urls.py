@@ -4,6 +4,8 @@ from django.contrib.auth.forms import UserCreationForm
 from django.urls import include, path
 from django.views.generic import CreateView
 
+admin.autodiscover()
+
 urlpatterns = [
     path('', include('notes.urls')),
     path('admin/', admin.site.urls),
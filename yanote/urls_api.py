@@ -0,0 +1,16 @@
+"""URL профиля yanote.settings_api: JSON API заметок и метрики."""
+from django.urls import include, path
+
+from notes import api, metrics
+
+notes_urls = ([
+    path('api/notes/', api.note_list, name='api-list'),
+    path('api/notes/<slug:slug>/', api.note_detail, name='api-detail'),
+    path('api/changes/', api.note_changes, name='api-changes'),
+    path(
+        'api/autocomplete/', api.note_autocomplete, name='api-autocomplete'
+    ),
+    path('metrics/', metrics.Metrics.as_view(), name='metrics'),
+], 'notes')
+
+urlpatterns = [path('', include(notes_urls))]